@@ -0,0 +1,105 @@
+import json
+import re
+from langchain_core.prompts import PromptTemplate
+from agents.rate_limiter import QuotaExceededError
+from agents.model_router import routed_invoke
+from agents.summarization_agent import is_valid_summary
+from utils.formatter import clean_text
+from utils.logger import get_logger
+from utils.token_budget import budget_body, record_prompt_tokens
+
+logger = get_logger(__name__)
+
+ALLOWED_CLASSIFICATIONS = ["positive", "neutral", "negative"]
+
+def classify_and_summarize(email: dict) -> dict:
+    """
+    Uses a single Gemini call to classify the email's sentiment and summarize it.
+    Replaces the separate filter_email + summarize_email round-trips in the fused workflow.
+    For a reply in a known thread (core/thread_index.py) only the new text is sent, with the
+    cached thread summary, and the summary covers the conversation so far.
+
+    Arguments:
+        email (dict): The email to process. Expected keys: "subject", "body"; optional "thread_summary" and "thread_delta".
+
+    Returns:
+        dict: {"classification": str, "summary": str}. The classification is one of
+              'positive', 'neutral', 'negative' or 'unknown' if the model's answer is unusable.
+    """
+    if email.get("thread_summary"):
+        prompt_template = PromptTemplate(
+            input_variables=["thread_summary", "subject", "content"],
+            template=(
+                "Summary of the conversation so far: {thread_summary}\n\n"
+                "Analyze the latest message of this conversation and respond with a single JSON object and nothing else, "
+                "using exactly these keys:\n"
+                "  \"classification\": the overall sentiment of the latest message, one of \"positive\", \"neutral\" or \"negative\"\n"
+                "  \"summary\": a summary of the conversation including the latest message in 2 to 3 sentences\n\n"
+                "Subject: {subject}\n"
+                "Latest message: {content}\n"
+                "JSON:"
+            )
+        )
+        prompt = prompt_template.format(
+            thread_summary=email["thread_summary"],
+            subject=email.get("subject", ""),
+            content=budget_body(email, "combined", body=email.get("thread_delta"))
+        )
+    else:
+        prompt_template = PromptTemplate(
+            input_variables=["subject", "content"],
+            template=(
+                "Analyze the following email and respond with a single JSON object and nothing else, "
+                "using exactly these keys:\n"
+                "  \"classification\": the overall sentiment, one of \"positive\", \"neutral\" or \"negative\"\n"
+                "  \"summary\": a summary of the email content in 2 to 3 sentences\n\n"
+                "Subject: {subject}\n"
+                "Content: {content}\n"
+                "JSON:"
+            )
+        )
+        prompt = prompt_template.format(
+            subject=email.get("subject", ""),
+            content=budget_body(email, "combined")
+        )
+    record_prompt_tokens(email, "combined", prompt)
+
+    try:
+        raw_output = routed_invoke("combined", prompt, temperature=0.0, validator=_is_valid_combined_output)
+        logger.debug("Raw combined output: %s", raw_output)
+    except QuotaExceededError:
+        logger.error("Gemini quota still exhausted after retries in classify_and_summarize.")
+        raise
+    except Exception as e:
+        error_message = str(e).lower()
+        logger.error("Gemini API error in classify_and_summarize: %s", error_message)
+        return {"classification": "unknown", "summary": f"Summary generation failed: {str(e)}"}
+
+    return parse_combined_output(raw_output)
+
+def _is_valid_combined_output(raw_output: str) -> bool:
+    parsed = parse_combined_output(raw_output)
+    return parsed["classification"] != "unknown" and is_valid_summary(parsed["summary"])
+
+def parse_combined_output(raw_output: str) -> dict:
+    """
+    Parses the model's JSON answer, tolerating ```json fences and surrounding text.
+    """
+    text = raw_output.strip() if isinstance(raw_output, str) else str(raw_output)
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        parsed = json.loads(match.group(0) if match else text)
+    except (json.JSONDecodeError, TypeError):
+        logger.warning("Gemini returned non-JSON output in classify_and_summarize: '%s'", text[:200])
+        return {"classification": "unknown", "summary": "Summary generation failed: invalid JSON from model."}
+
+    classification = clean_text(str(parsed.get("classification", ""))).lower()
+    if classification not in ALLOWED_CLASSIFICATIONS:
+        logger.warning("Gemini returned unexpected classification in classify_and_summarize: '%s'. Using 'unknown'.", classification)
+        classification = "unknown"
+
+    summary = clean_text(str(parsed.get("summary", "")))
+    if not summary:
+        summary = "Summary generation failed: empty summary from model."
+
+    return {"classification": classification, "summary": summary}
\ No newline at end of file
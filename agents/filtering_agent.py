@@ -1,11 +1,21 @@
+import json
+import re
+from typing import Dict, List, Optional
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from config import GEMINI_API_KEY
+from agents.rate_limiter import QuotaExceededError
+from agents.model_router import routed_invoke
 from utils.logger import get_logger
+from utils.token_budget import budget_body, record_prompt_tokens, record_batch_prompt_tokens
 from utils.formatter import clean_text
+from config import FILTER_BATCH_SIZE
 
 logger = get_logger(__name__)
 
+ALLOWED_SENTIMENTS = ["positive", "neutral", "negative"]
+
+def _is_valid_sentiment(raw_output: str) -> bool:
+    return clean_text(raw_output).strip().lower() in ALLOWED_SENTIMENTS
+
 def filter_email(email: dict) -> str:
     """
     Uses Gemini to analyze the email and classify its sentiment.
@@ -24,28 +34,98 @@ def filter_email(email: dict) -> str:
 
     prompt = prompt_template.format(
         subject=email.get("subject", ""),
-        content=email.get("body", "")
-    )
-
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.5-pro",
-        temperature=0.0,
-        google_api_key=GEMINI_API_KEY
+        content=budget_body(email, "filter")
     )
+    record_prompt_tokens(email, "filter", prompt)
 
     try:
-        sentiment_result = model.invoke(prompt)
-        sentiment_text = clean_text(sentiment_result.content).strip().lower()
+        raw_sentiment = routed_invoke("filter", prompt, temperature=0.0, validator=_is_valid_sentiment)
+        sentiment_text = clean_text(raw_sentiment).strip().lower()
         logger.debug("Raw sentiment output: %s", sentiment_text)
+    except QuotaExceededError:
+        logger.error("Gemini quota still exhausted after retries in filter_email.")
+        raise
     except Exception as e:
         error_message = str(e).lower()
         logger.error("Gemini API error in filter_email: %s", error_message)
-        if "quota" in error_message or "429" in error_message:
-            raise RuntimeError("Gemini quota exceeded")
         return "unknown"
 
-    if sentiment_text in ["positive", "neutral", "negative"]:
+    if sentiment_text in ALLOWED_SENTIMENTS:
         return sentiment_text
     else:
         logger.warning("Gemini returned unexpected sentiment in filter_email: '%s'. Returning 'unknown'.", sentiment_text)
-        return "unknown"
\ No newline at end of file
+        return "unknown"
+
+def _parse_batch_output(raw_output: str, item_ids: List[str]) -> Dict[str, str]:
+    """
+    Parses the JSON map of item id -> label, keeping only known ids with valid labels.
+    """
+    match = re.search(r"\{.*\}", raw_output or "", re.DOTALL)
+    try:
+        parsed = json.loads(match.group(0) if match else raw_output)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+
+    labels = {}
+    for item_id in item_ids:
+        label = clean_text(str(parsed.get(item_id, ""))).lower()
+        if label in ALLOWED_SENTIMENTS:
+            labels[item_id] = label
+    return labels
+
+def _classify_chunk(chunk: List[dict]) -> List[Optional[str]]:
+    item_ids = [f"e{i + 1}" for i in range(len(chunk))]
+    items = [
+        f"ID: {item_id}\nSubject: {clean_text(email.get('subject', ''))}\n"
+        f"Content: {clean_text(budget_body(email, 'filter_batch'))}"
+        for item_id, email in zip(item_ids, chunk)
+    ]
+    prompt = (
+        "For each of the following emails, classify its overall sentiment as 'positive', 'neutral', or 'negative'. "
+        "Respond with only a JSON object mapping every email ID to its sentiment label, "
+        "e.g. {\"e1\": \"neutral\", \"e2\": \"negative\"}, nothing else.\n\n"
+        + "\n\n".join(items) + "\n\nJSON:"
+    )
+    record_batch_prompt_tokens(chunk, "filter", prompt, items)
+
+    def is_complete(raw_output: str) -> bool:
+        return len(_parse_batch_output(raw_output, item_ids)) == len(item_ids)
+
+    try:
+        raw_output = routed_invoke("filter", prompt, temperature=0.0, validator=is_complete)
+    except QuotaExceededError:
+        logger.error("Gemini quota still exhausted after retries in filter_emails_batch.")
+        raise
+    except Exception as e:
+        logger.error("Gemini API error in filter_emails_batch: %s", str(e).lower())
+        return [None] * len(chunk)
+
+    labels = _parse_batch_output(raw_output, item_ids)
+    return [labels.get(item_id) for item_id in item_ids]
+
+def filter_emails_batch(emails: List[dict], batch_size: int = FILTER_BATCH_SIZE) -> List[str]:
+    """
+    Classifies many emails with one Gemini call per `batch_size` emails.
+    Each email is sent as (id, subject, body fitted to the "filter_batch" token budget) and the model answers with a JSON
+    map of id -> label. Emails missing from the answer, or with an invalid label, fall
+    back to an individual filter_email() call.
+
+    Arguments:
+        emails (List[dict]): The emails to classify.
+        batch_size (int): Maximum number of emails packed into one prompt.
+
+    Returns:
+        List[str]: One label per email, in input order.
+    """
+    results: List[str] = []
+    for start in range(0, len(emails), max(1, batch_size)):
+        chunk = emails[start:start + max(1, batch_size)]
+        labels = _classify_chunk(chunk) if len(chunk) > 1 else [None]
+
+        fallbacks = sum(1 for label in labels if label is None)
+        if fallbacks and len(chunk) > 1:
+            logger.warning(f"Batch classification missed {fallbacks} of {len(chunk)} emails; classifying them individually.")
+        results.extend(label if label is not None else filter_email(email) for email, label in zip(chunk, labels))
+    return results
\ No newline at end of file
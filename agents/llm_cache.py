@@ -0,0 +1,160 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from config import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+from agents.rate_limiter import invoke_with_rate_limit
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapses whitespace so re-wrapped or re-indented copies of the same email hit the same entry."""
+    return " ".join(prompt.split())
+
+
+def cache_key(prompt: str, model: str, temperature: float) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{model}\x00{float(temperature):.3f}\x00".encode("utf-8"))
+    digest.update(normalize_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def message_text(message) -> str:
+    """Returns the text of a chat model response (content may be a string or a list of parts)."""
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache of model outputs stored in SQLite.
+
+    Entries expire after `ttl_seconds`; once more than `max_entries` are stored the
+    least recently used ones are evicted. Safe to share between worker threads.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float, max_entries: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.conn.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.stats["hits"] += 1
+            return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            (count,) = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self.conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.stats["evicted"] += overflow
+            self.conn.commit()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.stats)
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+_enabled = LLM_CACHE_ENABLED
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Returns the process-wide cache, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not _enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES)
+            logger.info(f"LLM result cache opened at {LLM_CACHE_PATH}.")
+        return _cache
+
+
+def set_llm_cache_enabled(enabled: bool) -> None:
+    """Turns the cache on/off at runtime (harnesses running against stubbed models must not write to it)."""
+    global _enabled
+    _enabled = enabled
+
+
+def get_llm_cache_stats() -> Dict[str, int]:
+    cache = _cache
+    return cache.get_stats() if cache else {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+
+def cached_invoke(prompt: str, model: str, temperature: float,
+                  validator: Optional[Callable[[str], bool]] = None) -> Tuple[str, bool]:
+    """
+    Returns the model's text for this prompt, serving it from the cache when an identical
+    (normalized) prompt was already answered by the same model at the same temperature.
+    Misses go through the rate-limited invocation and are stored only if they pass `validator`,
+    so an output the caller rejects is never served again; cached entries it rejects are ignored.
+
+    Arguments:
+        prompt (str): The fully formatted prompt.
+        model (str): Gemini model name.
+        temperature (float): Sampling temperature.
+        validator (Callable): Returns True if the raw output is acceptable (None accepts everything).
+
+    Returns:
+        Tuple[str, bool]: The raw response text, and whether it was served from the cache.
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return message_text(invoke_with_rate_limit(prompt, model, temperature)), False
+
+    key = cache_key(prompt, model, temperature)
+    cached = cache.get(key)
+    if cached is not None and (validator is None or validator(cached)):
+        logger.debug("LLM cache hit for %s (key %s).", model, key[:12])
+        return cached, True
+
+    response = message_text(invoke_with_rate_limit(prompt, model, temperature))
+    if validator is None or validator(response):
+        cache.put(key, model, response)
+    return response, False
\ No newline at end of file
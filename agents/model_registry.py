@@ -0,0 +1,79 @@
+import threading
+from typing import Callable, Dict, Tuple, Any
+from langchain_google_genai import ChatGoogleGenerativeAI
+from config import GEMINI_API_KEY, GEMINI_TRANSPORT
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# One long-lived chat model per (model, temperature). Each ChatGoogleGenerativeAI owns its
+# own generative service client (gRPC channel / HTTP session), so reusing the instance keeps
+# the underlying connection, TLS session and auth alive across emails and worker threads.
+_models: Dict[Tuple[str, float], Any] = {}
+_lock = threading.Lock()
+_stats = {"created": 0, "reused": 0}
+
+
+def _default_factory(model: str, temperature: float):
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        google_api_key=GEMINI_API_KEY,
+        transport=GEMINI_TRANSPORT,
+        max_retries=1 # 429 backoff is handled by agents/rate_limiter.py
+    )
+
+
+_factory: Callable[[str, float], Any] = _default_factory
+
+
+def get_model(model: str, temperature: float):
+    """
+    Returns the shared chat model for (model, temperature), creating it on first use.
+    Safe to call from concurrent worker threads.
+
+    Arguments:
+        model (str): Gemini model name, e.g. "gemini-2.5-pro".
+        temperature (float): Sampling temperature.
+
+    Returns:
+        ChatGoogleGenerativeAI: The process-wide model instance.
+    """
+    key = (model, float(temperature))
+    with _lock:
+        instance = _models.get(key)
+        if instance is not None:
+            _stats["reused"] += 1
+            return instance
+
+        instance = _factory(model, float(temperature))
+        _models[key] = instance
+        _stats["created"] += 1
+    logger.info("Created shared model client for %s (temperature=%s).", model, temperature)
+    return instance
+
+
+def get_registry_stats() -> Dict[str, int]:
+    """
+    Returns how many model clients were created versus reused, plus the number currently held.
+    """
+    with _lock:
+        return {
+            "created": _stats["created"],
+            "reused": _stats["reused"],
+            "active_clients": len(_models)
+        }
+
+
+def set_model_factory(factory: Callable[[str, float], Any] = None) -> None:
+    """
+    Replaces the function used to build new model clients and clears the registry.
+    Passing None restores the default ChatGoogleGenerativeAI factory (used by benchmarks
+    and harnesses that run against a stubbed model).
+    """
+    global _factory
+    with _lock:
+        _factory = factory or _default_factory
+        _models.clear()
+        _stats["created"] = 0
+        _stats["reused"] = 0
\ No newline at end of file
@@ -0,0 +1,105 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+from config import AGENT_MODEL_ROUTES, DEFAULT_MODEL_ROUTE, LLM_CACHE_SKIP_AGENTS
+from agents.llm_cache import cached_invoke, message_text
+from agents.rate_limiter import invoke_with_rate_limit
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_model_stats: Dict[str, Dict[str, float]] = {}
+_agent_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _model_entry(model: str) -> Dict[str, float]:
+    return _model_stats.setdefault(model, {"calls": 0, "failures": 0, "total_seconds": 0.0, "cache_hits": 0})
+
+
+def _record_latency(model: str, seconds: float, failed: bool) -> None:
+    # Only calls that reached the model; cache hits are counted separately so they don't skew the average
+    with _lock:
+        stats = _model_entry(model)
+        stats["calls"] += 1
+        stats["total_seconds"] += seconds
+        if failed:
+            stats["failures"] += 1
+
+
+def _record_cache_hit(model: str) -> None:
+    with _lock:
+        _model_entry(model)["cache_hits"] += 1
+
+
+def _record_agent(agent: str, escalated: bool) -> None:
+    with _lock:
+        stats = _agent_stats.setdefault(agent, {"calls": 0, "escalations": 0})
+        stats["calls"] += 1
+        if escalated:
+            stats["escalations"] += 1
+
+
+def get_route(agent: str) -> list:
+    return AGENT_MODEL_ROUTES.get(agent) or DEFAULT_MODEL_ROUTE
+
+
+def routed_invoke(agent: str, prompt: str, temperature: float, validator: Optional[Callable[[str], bool]] = None) -> str:
+    """
+    Runs the prompt on the agent's model route (configured in config.AGENT_MODEL_ROUTES),
+    starting with the cheapest tier. The next tier is only tried when the output fails
+    `validator` or the call errors; the last tier's answer is returned as-is.
+    Only outputs that pass `validator` are cached, and agents in LLM_CACHE_SKIP_AGENTS bypass the cache.
+
+    Arguments:
+        agent (str): Route name, e.g. "filter", "summarize", "respond", "combined".
+        prompt (str): The fully formatted prompt.
+        temperature (float): Sampling temperature.
+        validator (Callable): Returns True if the raw output is acceptable.
+
+    Returns:
+        str: The raw response text from the first tier that produced a valid answer.
+    """
+    route = get_route(agent)
+    use_cache = agent not in LLM_CACHE_SKIP_AGENTS
+    for tier, model in enumerate(route):
+        is_last = tier == len(route) - 1
+        start = time.perf_counter()
+        try:
+            if use_cache:
+                output, from_cache = cached_invoke(prompt, model, temperature, validator)
+            else:
+                output, from_cache = message_text(invoke_with_rate_limit(prompt, model, temperature)), False
+        except Exception as e:
+            _record_latency(model, time.perf_counter() - start, failed=True)
+            if is_last:
+                _record_agent(agent, escalated=tier > 0)
+                raise
+            logger.warning(f"[Router] {agent} on {model} failed ({e}); escalating to {route[tier + 1]}.")
+            continue
+        if from_cache:
+            _record_cache_hit(model)
+        else:
+            _record_latency(model, time.perf_counter() - start, failed=False)
+
+        if is_last or validator is None or validator(output):
+            _record_agent(agent, escalated=tier > 0)
+            return output
+        logger.info(f"[Router] {agent} output from {model} failed validation; escalating to {route[tier + 1]}.")
+
+
+def get_router_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Returns per-model latency (calls that reached the model, failures, average seconds, plus
+    answers served from the LLM cache) and per-agent escalation rates.
+    """
+    with _lock:
+        models = {
+            model: dict(stats, avg_seconds=stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0)
+            for model, stats in _model_stats.items()
+        }
+        agents = {
+            agent: dict(stats, escalation_rate=stats["escalations"] / stats["calls"] if stats["calls"] else 0.0)
+            for agent, stats in _agent_stats.items()
+        }
+    return {"models": models, "agents": agents}
\ No newline at end of file
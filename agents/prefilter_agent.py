@@ -0,0 +1,208 @@
+import csv
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from config import PREFILTER_CONFIDENCE_THRESHOLD, PREFILTER_LOCAL_MODEL, PREFILTER_MIN_TRAINING_ROWS, PREFILTER_TRAINING_CSV
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Labels the pre-filter can assign; the supervisor ends the workflow for all of them.
+PREFILTER_LABELS = ("spam", "promotional", "auto_reply")
+
+NOREPLY_SENDER_PATTERN = re.compile(
+    r"^(no-?reply|do-?not-?reply|donotreply|mailer-daemon|postmaster|newsletters?|marketing|notifications?)[\w.+-]*@",
+    re.IGNORECASE
+)
+AUTO_REPLY_SUBJECT_PATTERN = re.compile(
+    r"^\s*(automatic reply|auto(matic)?[- ]?response|auto:|out of (the )?office|undeliverable|delivery status notification)",
+    re.IGNORECASE
+)
+PROMOTIONAL_KEYWORDS = (
+    "unsubscribe", "view in browser", "view this email in your browser", "limited time offer",
+    "special offer", "% off", "exclusive deal", "shop now", "promo code", "newsletter"
+)
+SPAM_KEYWORDS = (
+    "you have won", "claim your prize", "lottery", "wire the fee", "crypto investment",
+    "100% guaranteed", "act now", "risk-free", "winner", "inheritance"
+)
+
+_stats = {"checked": 0, "skipped": 0, "by_label": {}}
+_stats_lock = threading.Lock()
+
+
+def _sender_address(email: dict) -> str:
+    return (email.get("sender_email") or email.get("from") or "").strip().lower()
+
+
+def _header(email: dict, name: str) -> str:
+    headers = email.get("headers") or {}
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return str(value).strip().lower()
+    return ""
+
+
+def rule_based_prefilter(email: dict) -> Dict[str, object]:
+    """
+    Scores an email with deterministic header and keyword rules.
+
+    Returns:
+        dict: {"label": str or None, "confidence": float, "reason": str}
+    """
+    subject = (email.get("subject") or "").lower()
+    body = (email.get("body") or "").lower()
+    sender = _sender_address(email)
+
+    auto_submitted = _header(email, "Auto-Submitted")
+    if (auto_submitted and auto_submitted != "no") or _header(email, "X-Autoreply") or _header(email, "X-Autorespond"):
+        return {"label": "auto_reply", "confidence": 0.95, "reason": "auto-submitted header"}
+    if AUTO_REPLY_SUBJECT_PATTERN.match(subject):
+        confidence = 0.9 if NOREPLY_SENDER_PATTERN.match(sender) or "mailer-daemon" in sender else 0.8
+        return {"label": "auto_reply", "confidence": confidence, "reason": "auto-reply subject"}
+
+    spam_hits = [keyword for keyword in SPAM_KEYWORDS if keyword in subject or keyword in body]
+    if len(spam_hits) >= 2:
+        return {"label": "spam", "confidence": min(0.99, 0.6 + 0.15 * len(spam_hits)), "reason": f"spam keywords: {', '.join(spam_hits)}"}
+
+    score, reasons = 0.0, []
+    if _header(email, "List-Unsubscribe") or _header(email, "List-Id"):
+        score += 0.6
+        reasons.append("list headers")
+    if _header(email, "Precedence") in ("bulk", "list", "junk"):
+        score += 0.3
+        reasons.append("bulk precedence")
+    if NOREPLY_SENDER_PATTERN.match(sender):
+        score += 0.3
+        reasons.append("no-reply sender")
+    promo_hits = [keyword for keyword in PROMOTIONAL_KEYWORDS if keyword in subject or keyword in body]
+    if promo_hits:
+        score += min(0.4, 0.2 * len(promo_hits))
+        reasons.append(f"promotional keywords: {', '.join(promo_hits)}")
+
+    if score > 0:
+        return {"label": "promotional", "confidence": min(0.99, score), "reason": "; ".join(reasons)}
+    return {"label": None, "confidence": 0.0, "reason": "no rule matched"}
+
+
+class LocalClassifier:
+    """
+    Optional TF-IDF + logistic regression model trained on hand-labelled emails
+    (a CSV with subject, body and label columns). Requires scikit-learn.
+
+    The saved records are not used: their spam/promotional/auto_reply labels all come from the
+    rules above (the LLM classifier only assigns sentiments), so a model trained on them could
+    only relearn the rules. Labels other than PREFILTER_LABELS are treated as legitimate mail.
+    """
+
+    def __init__(self, csv_path: str = PREFILTER_TRAINING_CSV):
+        self.csv_path = csv_path
+        self.pipeline = None
+
+    def train(self) -> bool:
+        try:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            from sklearn.linear_model import LogisticRegression
+            from sklearn.pipeline import make_pipeline
+        except ImportError:
+            logger.warning("scikit-learn is not installed; the local pre-filter classifier is disabled.")
+            return False
+
+        if not self.csv_path or not Path(self.csv_path).exists():
+            logger.warning("PREFILTER_TRAINING_CSV is not set or missing; the local pre-filter classifier is disabled.")
+            return False
+
+        texts, labels = [], []
+        with open(self.csv_path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                label = (row.get("label") or "").strip().lower()
+                if not label:
+                    continue
+                texts.append(f"{row.get('subject') or ''}\n{row.get('body') or ''}")
+                labels.append(label if label in PREFILTER_LABELS else "legitimate")
+
+        if len(texts) < PREFILTER_MIN_TRAINING_ROWS or len(set(labels)) < 2:
+            logger.info(f"Only {len(texts)} labelled emails ({len(set(labels))} labels); local pre-filter classifier not trained.")
+            return False
+
+        self.pipeline = make_pipeline(TfidfVectorizer(min_df=2, ngram_range=(1, 2)), LogisticRegression(max_iter=1000))
+        self.pipeline.fit(texts, labels)
+        logger.info(f"Trained local pre-filter classifier on {len(texts)} labelled emails from {self.csv_path}.")
+        return True
+
+    def predict(self, email: dict) -> Optional[Dict[str, object]]:
+        if self.pipeline is None:
+            return None
+        text = f"{email.get('subject', '')}\n{email.get('body', '')}"
+        probabilities = self.pipeline.predict_proba([text])[0]
+        best = probabilities.argmax()
+        return {"label": self.pipeline.classes_[best], "confidence": float(probabilities[best]), "reason": "local classifier"}
+
+
+_local_classifier: Optional[LocalClassifier] = None
+_local_classifier_lock = threading.Lock()
+
+
+def _get_local_classifier() -> Optional[LocalClassifier]:
+    global _local_classifier
+    if not PREFILTER_LOCAL_MODEL:
+        return None
+    with _local_classifier_lock:
+        if _local_classifier is None:
+            _local_classifier = LocalClassifier()
+            _local_classifier.train()
+        return _local_classifier
+
+
+def prefilter_email(email: dict, record_stats: bool = True) -> Dict[str, object]:
+    """
+    Cheap local pre-filter run before the Gemini classifier.
+    Returns a label only when it is confident the email is spam, promotional or an
+    auto-reply; otherwise the label is None and the email goes on to the LLM.
+
+    A confident result already stored on the email under "prefilter" (set when the IMAP
+    fetch pre-filtered it from its headers alone, or by classify_batch) is reused as-is.
+
+    Arguments:
+        email (dict): Normalized email (subject, body, sender_email/from, optional headers).
+        record_stats (bool): Count this check in get_prefilter_stats().
+
+    Returns:
+        dict: {"label": str or None, "confidence": float, "reason": str}
+    """
+    preset = email.get("prefilter")
+    if preset and preset.get("label") in PREFILTER_LABELS:
+        result = preset
+    else:
+        result = rule_based_prefilter(email)
+
+        if result["label"] is None or result["confidence"] < PREFILTER_CONFIDENCE_THRESHOLD:
+            classifier = _get_local_classifier()
+            prediction = classifier.predict(email) if classifier else None
+            if prediction and prediction["label"] in PREFILTER_LABELS and prediction["confidence"] > result["confidence"]:
+                result = prediction
+
+    confident = result["label"] in PREFILTER_LABELS and result["confidence"] >= PREFILTER_CONFIDENCE_THRESHOLD
+    if not confident:
+        result = dict(result, label=None)
+
+    if not record_stats:
+        return result
+    with _stats_lock:
+        _stats["checked"] += 1
+        if confident:
+            _stats["skipped"] += 1
+            _stats["by_label"][result["label"]] = _stats["by_label"].get(result["label"], 0) + 1
+    return result
+
+
+def get_prefilter_stats() -> Dict[str, object]:
+    with _stats_lock:
+        checked = _stats["checked"]
+        return {
+            "checked": checked,
+            "skipped": _stats["skipped"],
+            "skipped_fraction": _stats["skipped"] / checked if checked else 0.0,
+            "by_label": dict(_stats["by_label"])
+        }
\ No newline at end of file
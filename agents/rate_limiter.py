@@ -0,0 +1,204 @@
+import random
+import re
+import threading
+import time
+from typing import Dict, Optional
+from config import (
+    GEMINI_RATE_LIMITS, GEMINI_DEFAULT_RATE_LIMIT,
+    GEMINI_MAX_RETRIES, GEMINI_BACKOFF_BASE_SECONDS, GEMINI_BACKOFF_MAX_SECONDS
+)
+from agents.model_registry import get_model
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from google.api_core.exceptions import ResourceExhausted
+except ImportError:  # google-api-core ships with langchain-google-genai, but don't hard-fail without it
+    ResourceExhausted = None
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised when Gemini keeps returning 429 / quota errors after all retries."""
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `rate_per_minute`.
+    A capacity of one minute's worth of tokens allows short bursts up to the quota.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = float(rate_per_minute)
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_minute / 60.0)
+
+    def set_rate(self, rate_per_minute: float) -> None:
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate_per_minute = float(rate_per_minute)
+            self.capacity = float(rate_per_minute)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Blocks until `amount` tokens are available and takes them.
+        Requests larger than the bucket are clamped so they can still go through.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                shortfall = amount - self.tokens
+                wait_for = shortfall * 60.0 / max(self.rate_per_minute, 1e-6)
+            time.sleep(wait_for)
+            waited += wait_for
+
+
+class ModelRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets for one Gemini model.
+
+    The RPM budget adapts (AIMD): every 429 halves the current rate, and every
+    successful call nudges it back up towards the configured ceiling. Throughput
+    therefore settles at whatever the quota actually allows.
+    """
+
+    def __init__(self, model: str, requests_per_minute: float, tokens_per_minute: float):
+        self.model = model
+        self.max_rpm = float(requests_per_minute)
+        self.min_rpm = max(1.0, self.max_rpm / 16)
+        self.current_rpm = self.max_rpm
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def acquire(self, estimated_tokens: int) -> None:
+        waited = self.requests.acquire(1)
+        waited += self.tokens.acquire(estimated_tokens)
+        with self.lock:
+            self.stats["calls"] += 1
+            self.stats["wait_seconds"] += waited
+
+    def on_success(self) -> None:
+        with self.lock:
+            if self.current_rpm < self.max_rpm:
+                self.current_rpm = min(self.max_rpm, self.current_rpm + 1.0)
+                self.requests.set_rate(self.current_rpm)
+
+    def on_throttled(self) -> None:
+        with self.lock:
+            self.stats["throttled"] += 1
+            self.current_rpm = max(self.min_rpm, self.current_rpm / 2)
+            self.requests.set_rate(self.current_rpm)
+        logger.warning(f"[RateLimiter] 429 from {self.model}; lowering to {self.current_rpm:.1f} requests/minute.")
+
+
+_limiters: Dict[str, ModelRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> ModelRateLimiter:
+    """
+    Returns the shared limiter for a model, created from GEMINI_RATE_LIMITS (or the default budget).
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            rpm, tpm = GEMINI_RATE_LIMITS.get(model, GEMINI_DEFAULT_RATE_LIMIT)
+            limiter = ModelRateLimiter(model, rpm, tpm)
+            _limiters[model] = limiter
+        return limiter
+
+
+def configure_rate_limit(model: str, requests_per_minute: float, tokens_per_minute: float) -> None:
+    """Overrides the budget for a model at runtime (e.g. a paid tier, or a stubbed model in benchmarks)."""
+    with _limiters_lock:
+        _limiters[model] = ModelRateLimiter(model, requests_per_minute, tokens_per_minute)
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, float]]:
+    with _limiters_lock:
+        return {
+            model: dict(limiter.stats, current_rpm=limiter.current_rpm)
+            for model, limiter in _limiters.items()
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for the TPM budget."""
+    return max(1, len(text) // 4)
+
+
+def is_quota_error(error: Exception) -> bool:
+    if ResourceExhausted is not None and isinstance(error, ResourceExhausted):
+        return True
+    message = str(error).lower()
+    return "quota" in message or "429" in message or "resource exhausted" in message
+
+
+def _retry_hint_seconds(error: Exception) -> Optional[float]:
+    """Extracts the server's suggested retry delay ("retry in 12.3s" / "retry_delay { seconds: 12 }"), if any."""
+    message = str(error)
+    match = re.search(r"retry in ([\d.]+)s", message) or re.search(r"seconds:\s*(\d+)", message)
+    return float(match.group(1)) if match else None
+
+
+def invoke_with_rate_limit(prompt: str, model: str, temperature: float):
+    """
+    Invokes the shared chat model for (model, temperature) behind the model's rate limiter.
+    429/quota errors are retried with jittered exponential backoff; other errors propagate.
+
+    Arguments:
+        prompt (str): The fully formatted prompt.
+        model (str): Gemini model name.
+        temperature (float): Sampling temperature.
+
+    Returns:
+        The model response message (with a `.content` attribute).
+
+    Raises:
+        QuotaExceededError: If the quota is still exhausted after GEMINI_MAX_RETRIES retries.
+    """
+    limiter = get_rate_limiter(model)
+    chat_model = get_model(model, temperature)
+    estimated = estimate_tokens(prompt)
+
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        limiter.acquire(estimated)
+        try:
+            result = chat_model.invoke(prompt)
+        except Exception as e:
+            if not is_quota_error(e):
+                raise
+            limiter.on_throttled()
+            if attempt == GEMINI_MAX_RETRIES:
+                raise QuotaExceededError(f"Gemini quota exceeded for {model} after {attempt + 1} attempts") from e
+
+            backoff = min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * (2 ** attempt))
+            hint = min(_retry_hint_seconds(e) or 0.0, GEMINI_BACKOFF_MAX_SECONDS)
+            delay = max(hint, random.uniform(backoff / 2, backoff))
+            with limiter.lock:
+                limiter.stats["retries"] += 1
+            logger.warning(f"[RateLimiter] Quota error on {model} (attempt {attempt + 1}); retrying in {delay:.1f}s.")
+            time.sleep(delay)
+            continue
+
+        limiter.on_success()
+        return result
\ No newline at end of file
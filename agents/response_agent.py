@@ -1,8 +1,9 @@
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from utils.logger import get_logger
+from utils.token_budget import budget_body, record_prompt_tokens
 from utils.formatter import clean_text, format_email
-from config import GEMINI_API_KEY
+from agents.rate_limiter import QuotaExceededError
+from agents.model_router import routed_invoke
 
 logger = get_logger(__name__)
 
@@ -10,6 +11,7 @@ def generate_response(email: dict, summary: str, recipient_name: str, your_name:
     """
     Generates a formal email response using Gemini.
     This function now expects Gemini to produce *only the body* of the email.
+    For a reply in a known thread, Content is only the new text; the summary covers the conversation.
     """
     prompt_template = PromptTemplate(
         input_variables=["recipient_name", "subject", "content", "summary", "your_name"],
@@ -31,26 +33,22 @@ def generate_response(email: dict, summary: str, recipient_name: str, your_name:
     prompt = prompt_template.format(
         recipient_name=recipient_name,
         subject=email.get("subject", ""),
-        content=email.get("body", ""),
+        content=budget_body(email, "respond", body=email.get("thread_delta")),
         summary=summary,
         your_name=your_name
     )
-
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.5-pro",
-        temperature=0.7,
-        google_api_key=GEMINI_API_KEY
-    )
+    record_prompt_tokens(email, "respond", prompt)
 
     try:
-        response_obj = model.invoke(prompt)
-        response_text = clean_text(response_obj.content).strip()
+        raw_response = routed_invoke("respond", prompt, temperature=0.7)
+        response_text = clean_text(raw_response).strip()
         logger.debug("Raw response output (body only from LLM): %s", response_text)
+    except QuotaExceededError:
+        logger.error("Gemini quota still exhausted after retries in generate_response.")
+        raise
     except Exception as e:
         error_message = str(e).lower()
         logger.error("Gemini API error in generate_response: %s", error_message)
-        if "quota" in error_message or "429" in error_message:
-            raise RuntimeError("Gemini quota exceeded")
         return "Error generating response."
 
     formatted_response = format_email(
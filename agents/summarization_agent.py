@@ -1,43 +1,64 @@
 from langchain_core.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
 from utils.formatter import clean_text
-from config import GEMINI_API_KEY
+from agents.rate_limiter import QuotaExceededError
+from agents.model_router import routed_invoke
 from utils.logger import get_logger
+from utils.token_budget import budget_body, record_prompt_tokens
 
 logger = get_logger(__name__)
 
+def is_valid_summary(raw_output: str) -> bool:
+    """
+    Rejects empty, truncated or refusal-style summaries so the router can escalate to a stronger model.
+    """
+    summary = clean_text(raw_output)
+    word_count = len(summary.split())
+    if word_count < 5 or word_count > 150:
+        return False
+    if summary.lower().startswith(("i cannot", "i can't", "i'm sorry", "sorry,", "as an ai")):
+        return False
+    return summary.endswith((".", "!", "?", '"', ")"))
+
 def summarize_email(email: dict) -> str:
     """
     Uses Gemini to generate a concise summary of the email content.
+    For a reply in a known thread (core/thread_index.py) only the new text is sent, with the
+    cached thread summary, and the result summarizes the conversation so far.
 
     Arguments:
-        email (dict): The email to be summarized. Expected key: "body".
+        email (dict): The email to be summarized. Expected key: "body"; optional "thread_summary" and "thread_delta".
 
     Returns:
         str: A cleaned summary string.
     """
-    prompt_template = PromptTemplate(
-        input_variables=["content"],
-        template="Summarize the following email content in 2 to 3 sentences: {content}"
-    )
-
-    prompt = prompt_template.format(content=email.get("body", ""))
-
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.5-pro",
-        temperature=0.5,
-        google_api_key=GEMINI_API_KEY
-    )
+    if email.get("thread_summary"):
+        prompt_template = PromptTemplate(
+            input_variables=["thread_summary", "content"],
+            template=(
+                "Summary of the conversation so far: {thread_summary}\n\n"
+                "Summarize the conversation in 2 to 3 sentences, including this latest message: {content}"
+            )
+        )
+        prompt = prompt_template.format(thread_summary=email["thread_summary"],
+                                        content=budget_body(email, "summarize", body=email.get("thread_delta")))
+    else:
+        prompt_template = PromptTemplate(
+            input_variables=["content"],
+            template="Summarize the following email content in 2 to 3 sentences: {content}"
+        )
+        prompt = prompt_template.format(content=budget_body(email, "summarize"))
+    record_prompt_tokens(email, "summarize", prompt)
 
     try:
-        summary_result_obj = model.invoke(prompt)
-        summary_text = clean_text(summary_result_obj.content).strip()
+        raw_summary = routed_invoke("summarize", prompt, temperature=0.5, validator=is_valid_summary)
+        summary_text = clean_text(raw_summary).strip()
         logger.debug("Raw summary output: %s", summary_text)
+    except QuotaExceededError:
+        logger.error("Gemini quota still exhausted after retries in summarize_email.")
+        raise
     except Exception as e:
         error_message = str(e).lower()
         logger.error("Gemini API error in summarize_email: %s", error_message)
-        if "quota" in error_message or "429" in error_message:
-            raise RuntimeError("Gemini quota exceeded")
         summary_text = f"Summary generation failed: {str(e)}"
 
     return summary_text
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Benchmark: IMAP round-trips and wall time for fetching unread mail.
+
+Compares the old loop (one FETCH (RFC822) plus one STORE per message) against the
+batched UID path in core.email_imap.fetch_imap_emails (one UID FETCH per chunk and a
+single UID STORE), downloading either full messages or, with lazy_body, headers first and
+then only the text parts of emails the pre-filter keeps. All run against an in-process
+IMAP stand-in that adds a fixed latency to every command, so no real mailbox is needed.
+With --parse-workers, the batched full fetch is also run with MIME parsing in a process
+pool (core/parse_pool.py), overlapping with the next chunk's download.
+
+Usage:
+    python -m benchmarks.bench_imap_fetch [--emails 200] [--latency-ms 20] [--chunk-size 500]
+                                          [--attachment-kb 512] [--bulk-every 4] [--parse-workers 4]
+"""
+import argparse
+import time
+
+from benchmarks.imap_standin import StandInIMAP
+from core import email_imap
+
+
+def legacy_fetch(mail, max_emails, mark_as_seen=True):
+    """The pre-batching fetch loop: sequence numbers, one FETCH and one STORE per message."""
+    mail.login("bench@example.com", "password")
+    mail.select("inbox")
+    _, messages = mail.search(None, "UNSEEN")
+    emails = []
+    for num in messages[0].split()[-max_emails:]:
+        _, msg_data = mail.fetch(num.decode(), "(RFC822)")
+        for part in msg_data:
+            if isinstance(part, tuple):
+                emails.append(email_imap.parse_email_message(part[1], num.decode()))
+        if mark_as_seen:
+            mail.store(num.decode(), "+FLAGS", "\\Seen")
+    mail.logout()
+    return emails
+
+
+def batched_fetch(mail, max_emails, chunk_size, lazy_body, parse_workers=1):
+    original = email_imap.imaplib.IMAP4_SSL
+    email_imap.imaplib.IMAP4_SSL = mail
+    try:
+        return email_imap.fetch_imap_emails(
+            "bench@example.com", "password", "imap.example.com", max_emails=max_emails,
+            mark_as_seen=True, chunk_size=chunk_size, sync_mode="unseen", lazy_body=lazy_body,
+            parse_workers=parse_workers
+        )
+    finally:
+        email_imap.imaplib.IMAP4_SSL = original
+
+
+def run(label, mail, fetch):
+    start = time.perf_counter()
+    emails = fetch(mail)
+    elapsed = time.perf_counter() - start
+    per_message = mail.round_trips / len(emails) if emails else 0.0
+    print(f"{label:<10} {len(emails):>6} emails  {mail.round_trips:>6} round-trips  "
+          f"{per_message:>5.2f}/email  {mail.bytes_sent / 1024:>10.1f} KiB  {elapsed:>7.3f}s")
+    return mail, emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--attachment-kb", type=int, default=0, help="PDF attachment size per email")
+    parser.add_argument("--bulk-every", type=int, default=0, help="Make every Nth email a newsletter")
+    parser.add_argument("--parse-workers", type=int, default=1, help="Also time the batched fetch parsing in N processes")
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    def mailbox():
+        mail = StandInIMAP(args.emails, latency, attachment_bytes=args.attachment_kb * 1024, bulk_every=args.bulk_every)
+        for uid in mail.mailbox:  # warm the stand-in's parse cache outside the timed section
+            mail._fetch_items(1, uid, "(BODYSTRUCTURE)")
+        return mail
+
+    print(f"{args.emails} unread emails, {args.latency_ms:.0f} ms per IMAP command, "
+          f"{args.attachment_kb} KiB attachments, " +
+          (f"every {args.bulk_every}th email a newsletter" if args.bulk_every else "no newsletters"))
+    legacy_mail, legacy_emails = run("legacy", mailbox(), lambda mail: legacy_fetch(mail, args.emails))
+    batched_mail, batched_emails = run("batched", mailbox(), lambda mail: batched_fetch(mail, args.emails, args.chunk_size, False))
+    if args.parse_workers > 1:
+        _, pooled_emails = run(f"pooled x{args.parse_workers}", mailbox(),
+                               lambda mail: batched_fetch(mail, args.emails, args.chunk_size, False, args.parse_workers))
+        print(f"Pooled parsing returns the same emails in the same order: {pooled_emails == batched_emails}")
+    lazy_mail, lazy_emails = run("lazy", mailbox(), lambda mail: batched_fetch(mail, args.emails, args.chunk_size, True))
+
+    same = [e["subject"] for e in legacy_emails] == [e["subject"] for e in batched_emails] == [e["subject"] for e in lazy_emails]
+    all_seen = all("\\Seen" in flags for _, flags in batched_mail.mailbox.values())
+    same_bodies = all(full["body"] == kept["body"] for full, kept in zip(batched_emails, lazy_emails) if not kept.get("prefilter"))
+    skipped = sum(1 for e in lazy_emails if e.get("prefilter"))
+    print(f"Same emails in the same order: {same}; all marked seen: {all_seen}")
+    print(f"Lazy fetch: {skipped} bodies skipped by the pre-filter; kept bodies identical to full fetch: {same_bodies}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
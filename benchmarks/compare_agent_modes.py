@@ -0,0 +1,87 @@
+"""
+Comparison harness: standard (filter -> summarize -> respond) vs fused
+(classify+summarize -> respond) workflows.
+
+Runs every email in sample_emails.json through both supervisor variants against a
+stubbed Gemini model and reports LLM round-trips and estimated input tokens per email.
+No API key or network access is needed.
+
+Usage:
+    python -m benchmarks.compare_agent_modes
+"""
+import json
+import threading
+from pathlib import Path
+
+from agents import model_registry, rate_limiter, llm_cache
+from core import supervisor
+from core.supervisor import supervisor_langgraph
+
+SAMPLE_EMAILS = Path(__file__).parent.parent / "sample_emails.json"
+MODELS = ("gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite")
+
+
+class _StubMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StubChatModel:
+    """Stands in for ChatGoogleGenerativeAI and records every prompt it receives."""
+
+    def __init__(self, usage: dict, lock: threading.Lock):
+        self.usage = usage
+        self.lock = lock
+
+    def invoke(self, prompt: str) -> _StubMessage:
+        with self.lock:
+            self.usage["calls"] += 1
+            self.usage["input_tokens"] += rate_limiter.estimate_tokens(prompt)
+
+        if "JSON" in prompt:
+            return _StubMessage('{"classification": "neutral", "summary": "The sender reports an issue and asks for follow-up."}')
+        if "Sentiment:" in prompt:
+            return _StubMessage("neutral")
+        if "Summarize" in prompt:
+            return _StubMessage("The sender reports an issue and asks for follow-up.")
+        return _StubMessage("Thank you for reaching out. We are looking into this and will update you shortly.")
+
+
+def run_mode(mode: str, emails: list) -> dict:
+    usage = {"calls": 0, "input_tokens": 0}
+    lock = threading.Lock()
+    model_registry.set_model_factory(lambda model, temperature: StubChatModel(usage, lock))
+
+    for email_data in emails:
+        supervisor_langgraph(email_data, your_name="Bench", recipient_name="Customer", mode=mode)
+
+    model_registry.set_model_factory(None)
+    return usage
+
+
+def main():
+    with open(SAMPLE_EMAILS, "r", encoding="utf-8") as f:
+        emails = json.load(f)
+
+    # Stub answers must never land in the persistent LLM cache, and would hide calls if served from it.
+    llm_cache.set_llm_cache_enabled(False)
+    # Both modes run the same emails; the second run must not be skipped as duplicates.
+    supervisor.DEDUP_ENABLED = False
+    # The stub answers instantly; lift the free-tier budgets so the limiter doesn't pace the run.
+    for model in MODELS:
+        rate_limiter.configure_rate_limit(model, 1_000_000, 1_000_000_000)
+
+    results = {mode: run_mode(mode, emails) for mode in ("standard", "fused")}
+
+    print(f"Emails: {len(emails)}")
+    print(f"{'mode':<10}{'calls/email':>14}{'input tokens/email':>22}")
+    for mode, usage in results.items():
+        print(f"{mode:<10}{usage['calls'] / len(emails):>14.2f}{usage['input_tokens'] / len(emails):>22.1f}")
+
+    standard, fused = results["standard"], results["fused"]
+    print(f"Round-trips saved: {1 - fused['calls'] / standard['calls']:.0%}")
+    print(f"Input tokens saved: {1 - fused['input_tokens'] / standard['input_tokens']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
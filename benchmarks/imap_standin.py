@@ -0,0 +1,229 @@
+"""
+In-process stand-in for imaplib.IMAP4_SSL used by the IMAP benchmarks.
+
+It keeps a mailbox of generated RFC822 messages, answers the subset of commands the
+fetchers use with imaplib-shaped responses, and counts round-trips. An optional
+per-command latency simulates the network so round-trip savings show up in wall time,
+and the bytes of every FETCH literal are counted to compare download volume.
+"""
+import re
+import time
+from email import message_from_bytes
+from email.message import EmailMessage
+from email.utils import format_datetime
+from datetime import datetime, timedelta
+
+
+def build_message(index: int, attachment_bytes: int = 0, bulk: bool = False) -> bytes:
+    msg = EmailMessage()
+    msg["Date"] = format_datetime(datetime(2025, 1, 1) + timedelta(minutes=index))
+    msg["Message-ID"] = f"<msg-{index}@example.com>"
+    msg["To"] = "support@example.com"
+    if bulk:
+        msg["From"] = f"Deals <newsletter@shop{index}.example.com>"
+        msg["Subject"] = f"Weekly deals #{index}"
+        msg["List-Unsubscribe"] = f"<mailto:unsubscribe@shop{index}.example.com>"
+        msg["Precedence"] = "bulk"
+        msg.set_content("Shop now: 20% off everything this week. Unsubscribe at any time.")
+    else:
+        msg["From"] = f"Supplier {index} <supplier{index}@example.com>"
+        msg["Subject"] = f"Shipment {70000 + index} status"
+        msg.set_content(f"Hello, could you confirm the delivery date for shipment {70000 + index}? Thanks.")
+    if attachment_bytes:
+        msg.add_attachment(b"\0" * attachment_bytes, maintype="application", subtype="pdf", filename=f"invoice-{index}.pdf")
+    return msg.as_bytes()
+
+
+def _quote(value) -> str:
+    return "NIL" if value is None else '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def bodystructure(msg) -> str:
+    """Renders the IMAP BODYSTRUCTURE of a parsed message (enough of RFC 3501 for the fetch code)."""
+    if msg.get_content_maintype() == "multipart":
+        return "(" + "".join(bodystructure(part) for part in msg.get_payload()) + f" {_quote(msg.get_content_subtype())})"
+    payload = msg.get_payload(decode=False)
+    payload = payload.encode() if isinstance(payload, str) else bytes(payload or b"")
+    params = msg.get_params()[1:] if msg.get_params() else []
+    param_list = "(" + " ".join(f"{_quote(k)} {_quote(v)}" for k, v in params) + ")" if params else "NIL"
+    encoding = msg.get("Content-Transfer-Encoding", "7bit")
+    fields = (f"{_quote(msg.get_content_maintype())} {_quote(msg.get_content_subtype())} {param_list} "
+              f"NIL NIL {_quote(encoding)} {len(payload)}")
+    if msg.get_content_maintype() == "text":
+        fields += f" {len(payload.splitlines())}"
+    disposition = msg.get_content_disposition()
+    filename = msg.get_filename()
+    if disposition:
+        fields += f" NIL ({_quote(disposition)} " + (f'("filename" {_quote(filename)})' if filename else "NIL") + ")"
+    return f"({fields})"
+
+
+def body_part(msg, part: str) -> bytes:
+    """Returns the still-encoded content of MIME part `part` ("1", "2.1", ...), as BODY[<part>] does."""
+    for number in part.split("."):
+        if msg.get_content_maintype() == "multipart":
+            msg = msg.get_payload()[int(number) - 1]
+    payload = msg.get_payload(decode=False)
+    return payload.encode() if isinstance(payload, str) else bytes(payload or b"")
+
+
+def parse_message_set(message_set: str, max_uid: int):
+    numbers = set()
+    for part in message_set.split(","):
+        start, _, end = part.partition(":")
+        low = max_uid if start == "*" else int(start)
+        high = low if not end else (max_uid if end == "*" else int(end))
+        numbers.update(range(min(low, high), max(low, high) + 1))
+    return numbers
+
+
+class StandInIMAP:
+    def __init__(self, messages=200, latency=0.0, attachment_bytes=0, uidvalidity=1, condstore=True, bulk_every=0):
+        self.latency = latency
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bulk_every = bulk_every
+        self._parsed = {}
+        self.uidvalidity = uidvalidity
+        self.attachment_bytes = attachment_bytes
+        self.capabilities = ("IMAP4REV1", "UIDPLUS") + (("CONDSTORE",) if condstore else ())
+        # uid -> [raw bytes, flags]
+        self.mailbox = {uid: [self._build(uid), set()] for uid in range(1, messages + 1)}
+        self.uidnext = messages + 1
+        self.modseq = messages
+        self.state = "NONAUTH"
+        self.untagged_responses = {}
+
+    def deliver(self, count=1):
+        """Appends new messages to the mailbox, as if mail had arrived."""
+        for _ in range(count):
+            self.mailbox[self.uidnext] = [self._build(self.uidnext), set()]
+            self.uidnext += 1
+            self.modseq += 1
+
+    def _build(self, uid):
+        bulk = bool(self.bulk_every) and uid % self.bulk_every == 0
+        return build_message(uid, self.attachment_bytes, bulk)
+
+    def _add_flag(self, uid, flag):
+        if flag not in self.mailbox[uid][1]:
+            self.mailbox[uid][1].add(flag)
+            self.modseq += 1
+
+    def __call__(self, host=None, port=None):
+        return self  # lets the instance stand in for the IMAP4_SSL class
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    # --- imaplib API subset ---
+
+    def login(self, user, password):
+        self._round_trip()
+        self.state = "AUTH"
+        return "OK", [b"LOGIN completed"]
+
+    def select(self, mailbox="INBOX", readonly=False):
+        self._round_trip()
+        self.state = "SELECTED"
+        # imaplib keeps the SELECT response codes (e.g. "* OK [UIDNEXT 201]") as untagged responses
+        self.untagged_responses = {
+            "EXISTS": [str(len(self.mailbox)).encode()],
+            "UIDVALIDITY": [str(self.uidvalidity).encode()],
+            "UIDNEXT": [str(self.uidnext).encode()],
+        }
+        if "CONDSTORE" in self.capabilities:
+            self.untagged_responses["HIGHESTMODSEQ"] = [str(self.modseq).encode()]
+        return "OK", [str(len(self.mailbox)).encode()]
+
+    def noop(self):
+        self._round_trip()
+        self.untagged_responses["EXISTS"] = [str(len(self.mailbox)).encode()]
+        return "OK", [b"NOOP completed"]
+
+    def logout(self):
+        self._round_trip()
+        return "BYE", [b"LOGOUT"]
+
+    def _unseen(self):
+        return [uid for uid, (_, flags) in sorted(self.mailbox.items()) if "\\Seen" not in flags]
+
+    def _sequence_uids(self):
+        return sorted(self.mailbox)
+
+    def search(self, charset, *criteria):
+        self._round_trip()
+        sequence = {uid: number for number, uid in enumerate(self._sequence_uids(), start=1)}
+        return "OK", [" ".join(str(sequence[uid]) for uid in self._unseen()).encode()]
+
+    def fetch(self, message_set, parts):
+        self._round_trip()
+        uids = self._sequence_uids()
+        number = int(message_set)
+        uid = uids[number - 1]
+        if "PEEK" not in parts:
+            self._add_flag(uid, "\\Seen")
+        raw = self.mailbox[uid][0]
+        self.bytes_sent += len(raw)
+        return "OK", [(f"{number} (RFC822 {{{len(raw)}}}".encode(), raw), b")"]
+
+    def store(self, message_set, command, flags):
+        self._round_trip()
+        uids = self._sequence_uids()
+        self._add_flag(uids[int(message_set) - 1], "\\Seen")
+        return "OK", [b"STORE completed"]
+
+    def _fetch_items(self, number, uid, parts):
+        raw = self.mailbox[uid][0]
+        if "BODY.PEEK[]" in parts or "RFC822)" in parts:
+            return [(f"{number} (UID {uid} BODY[] {{{len(raw)}}}".encode(), raw), b")"]
+        if uid not in self._parsed:  # parse once, so server-side MIME work doesn't skew timings
+            msg = message_from_bytes(raw)
+            self._parsed[uid] = (msg, bodystructure(msg))
+        msg, structure = self._parsed[uid]
+        prefix = f"{number} (UID {uid}"
+        if "RFC822.SIZE" in parts:
+            prefix += f" RFC822.SIZE {len(raw)}"
+        if "BODYSTRUCTURE" in parts:
+            prefix += f" BODYSTRUCTURE {structure}"
+        literals = []
+        if "BODY.PEEK[HEADER]" in parts:
+            literals.append(("BODY[HEADER]", raw.split(b"\n\n", 1)[0] + b"\n\n"))
+        for part in re.findall(r"BODY\.PEEK\[([\d.]+)\]", parts):
+            literals.append((f"BODY[{part}]", body_part(msg, part)))
+        if not literals:
+            return [(prefix + ")").encode()]
+        items = []
+        for name, data in literals:
+            items.append((f"{prefix} {name} {{{len(data)}}}".encode(), data))
+            prefix = ""
+        items.append(b")")
+        return items
+
+    def uid(self, command, *args):
+        self._round_trip()
+        command = command.upper()
+        max_uid = max(self.mailbox) if self.mailbox else 0
+        if command == "SEARCH":
+            criteria = [arg for arg in args if arg is not None]
+            if criteria and criteria[0].upper() == "UID":
+                matched = sorted(parse_message_set(criteria[1], max_uid) & set(self.mailbox))
+            else:
+                matched = self._unseen()
+            return "OK", [" ".join(str(uid) for uid in matched).encode()]
+        if command == "FETCH":
+            message_set, parts = args[0], args[1]
+            wanted = sorted(parse_message_set(message_set, max_uid) & set(self.mailbox))
+            response = []
+            for number, uid in enumerate(wanted, start=1):
+                response.extend(self._fetch_items(number, uid, parts))
+            self.bytes_sent += sum(len(item[1]) for item in response if isinstance(item, tuple))
+            return "OK", response
+        if command == "STORE":
+            message_set = args[0]
+            for uid in parse_message_set(message_set, max_uid) & set(self.mailbox):
+                self._add_flag(uid, "\\Seen")
+            return "OK", [b"STORE completed"]
+        return "BAD", [f"Unsupported command {command}".encode()]
\ No newline at end of file
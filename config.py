@@ -7,18 +7,109 @@ load_dotenv()
 
 # Gemini API Key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc") # "grpc" or "rest"; the shared client keeps this connection alive
+
+def _parse_rate_limits(raw: str) -> dict:
+    # Format: "model=requests_per_minute/tokens_per_minute,..." e.g. "gemini-2.5-pro=5/250000"
+    limits = {}
+    for entry in filter(None, (item.strip() for item in raw.split(","))):
+        model, _, budget = entry.partition("=")
+        rpm, _, tpm = budget.partition("/")
+        limits[model.strip()] = (float(rpm), float(tpm or 1_000_000))
+    return limits
+
+# Per-model Gemini budgets used by agents/rate_limiter.py (defaults match the free tier)
+GEMINI_RATE_LIMITS = _parse_rate_limits(os.getenv(
+    "GEMINI_RATE_LIMITS",
+    "gemini-2.5-pro=5/250000,gemini-2.5-flash=10/250000,gemini-2.5-flash-lite=15/250000"
+))
+GEMINI_DEFAULT_RATE_LIMIT = (10.0, 250000.0) # For models not listed above
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 5)) # Retries on 429 before giving up on a call
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", 2))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", 60))
+
+# Model routing per agent (agents/model_router.py): comma-separated tiers, cheapest first.
+# A later tier is only used when the earlier one errors or its output fails validation.
+DEFAULT_MODEL_ROUTE = ["gemini-2.5-pro"]
+AGENT_MODEL_ROUTES = {
+    agent: [model.strip() for model in os.getenv(f"MODEL_ROUTE_{agent.upper()}", default).split(",") if model.strip()]
+    for agent, default in {
+        "filter": "gemini-2.5-flash,gemini-2.5-pro",
+        "summarize": "gemini-2.5-flash,gemini-2.5-pro",
+        "combined": "gemini-2.5-flash,gemini-2.5-pro",
+        "respond": "gemini-2.5-pro",
+    }.items()
+}
+
+# Content-addressed cache of LLM outputs (agents/llm_cache.py)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600)) # Entries older than this are ignored
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000)) # Least recently used entries are evicted beyond this
+LLM_CACHE_SKIP_AGENTS = [agent.strip() for agent in os.getenv("LLM_CACHE_SKIP_AGENTS", "respond").split(",") if agent.strip()] # Routes never cached (replies are sampled at 0.7)
+
+# Duplicate detection before the agent workflow (core/dedup_index.py)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes") # Skip exact duplicates, reuse results for near-duplicates
+DEDUP_WINDOW_SECONDS = float(os.getenv("DEDUP_WINDOW_SECONDS", 7 * 24 * 3600)) # How long a processed email is remembered
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", 3)) # SimHash bits two near-duplicates may differ by (0 disables, at most 3)
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "dedup_index.sqlite3"))
+
+# Conversation threads (core/thread_index.py): replies are summarized/answered from their new text plus the thread summary
+THREAD_INDEX_ENABLED = os.getenv("THREAD_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+THREAD_MAX_AGE_SECONDS = float(os.getenv("THREAD_MAX_AGE_SECONDS", 30 * 24 * 3600)) # Threads idle this long are forgotten
+THREAD_DB_PATH = os.getenv("THREAD_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "thread_index.sqlite3"))
+
+# Local pre-filter before the Gemini classifier (agents/prefilter_agent.py)
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFILTER_CONFIDENCE_THRESHOLD = float(os.getenv("PREFILTER_CONFIDENCE_THRESHOLD", 0.8)) # Only skip the LLM above this confidence
+PREFILTER_LOCAL_MODEL = os.getenv("PREFILTER_LOCAL_MODEL", "false").lower() in ("1", "true", "yes") # Train a scikit-learn model from PREFILTER_TRAINING_CSV
+PREFILTER_TRAINING_CSV = os.getenv("PREFILTER_TRAINING_CSV", "") # Hand-labelled emails (subject, body, label: spam/promotional/auto_reply or anything else for legitimate mail)
+PREFILTER_MIN_TRAINING_ROWS = int(os.getenv("PREFILTER_MIN_TRAINING_ROWS", 50))
 
 # SMTP Email Configuration (for sending replies)
 EMAIL_SERVER = os.getenv("EMAIL_SERVER", "smtp.gmail.com") # Added default
 EMAIL_USERNAME = os.getenv("EMAIL_USERNAME")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD") # This might be an App Password for SMTP as well
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))  # Default to 587 if not set
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2)) # Authenticated SMTP sessions kept open and shared by the send functions (core/smtp_pool.py)
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.getenv("SMTP_MAX_MESSAGES_PER_SESSION", 50)) # A session is closed after this many messages (servers limit messages per connection)
+SMTP_IDLE_TIMEOUT_SECONDS = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", 240)) # Idle sessions older than this are closed instead of reused
+SMTP_NOOP_AFTER_SECONDS = float(os.getenv("SMTP_NOOP_AFTER_SECONDS", 15)) # Idle sessions older than this are checked with NOOP before reuse
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 30)) # Socket timeout for SMTP commands
+
+# Outbound send queue (core/outbound_queue.py): replies and drafts are sent on background threads
+OUTBOUND_QUEUE_ENABLED = os.getenv("OUTBOUND_QUEUE_ENABLED", "true").lower() in ("1", "true", "yes") # false sends inline, as before
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", 100)) # Queued sends; processing blocks when full
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", SMTP_POOL_SIZE)) # Sender threads (one SMTP session each)
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", 5))
+OUTBOUND_RETRY_BASE_SECONDS = float(os.getenv("OUTBOUND_RETRY_BASE_SECONDS", 2)) # Backoff doubles per attempt, with jitter
+OUTBOUND_RETRY_MAX_SECONDS = float(os.getenv("OUTBOUND_RETRY_MAX_SECONDS", 120))
+OUTBOUND_SPOOL_DIR = os.getenv("OUTBOUND_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "outbound_spool")) # Unsent jobs survive a crash here
 
 # IMAP Configuration (for fetching emails)
 IMAP_USERNAME = os.getenv("IMAP_USERNAME", EMAIL_USERNAME) # Default to EMAIL_USERNAME
 IMAP_PASSWORD = os.getenv("IMAP_PASSWORD", EMAIL_PASSWORD) # Default to EMAIL_PASSWORD, but will be overridden by EMAIL_APP_PASSWORD if set
 IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
 IMAP_PORT = int(os.getenv("IMAP_PORT", 993))  # Default to 993 for SSL
+IMAP_FETCH_CHUNK_SIZE = int(os.getenv("IMAP_FETCH_CHUNK_SIZE", 500)) # Messages per batched UID FETCH round-trip
+IMAP_STREAM_CHUNK_SIZE = int(os.getenv("IMAP_STREAM_CHUNK_SIZE", 50)) # Smaller chunks for the streaming fetch, so the first email arrives sooner
+IMAP_SYNC_MODE = os.getenv("IMAP_SYNC_MODE", "unseen").lower() # "unseen" (newest unread) or "incremental" (new UIDs since the last run)
+IMAP_SYNC_STATE_PATH = os.getenv("IMAP_SYNC_STATE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "imap_sync_state.json"))
+IMAP_LAZY_BODY = os.getenv("IMAP_LAZY_BODY", "true").lower() in ("1", "true", "yes") # Fetch headers/BODYSTRUCTURE first, text parts only for emails the pre-filter keeps
+HTML_TEXT_BACKEND = os.getenv("HTML_TEXT_BACKEND", "auto").lower() # HTML-only bodies: "auto" (lxml if installed, else "stream"), "lxml", "stream" or "bs4"
+HTML_MAX_INPUT_CHARS = int(os.getenv("HTML_MAX_INPUT_CHARS", 300000)) # HTML characters converted per body; the rest is ignored (0 = no cap)
+
+# MIME parsing in worker processes (core/parse_pool.py): archive ingestion and full-message IMAP fetches
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", min(4, os.cpu_count() or 1))) # Processes parsing MIME messages (1 parses inline)
+PARSE_INLINE_MAX = int(os.getenv("PARSE_INLINE_MAX", 64)) # Fetches of fewer messages than this are parsed inline, without the process pool
+PARSE_CHUNK_SIZE = int(os.getenv("PARSE_CHUNK_SIZE", 64)) # Messages sent to a parser process at a time
+
+# Daemon mode (daemon.py): one long-lived IMAP connection woken by IDLE
+DAEMON_QUEUE_SIZE = int(os.getenv("DAEMON_QUEUE_SIZE", 100)) # Fetched emails waiting to be processed; the IMAP watcher blocks when full
+DAEMON_MAX_EMAILS_PER_POLL = int(os.getenv("DAEMON_MAX_EMAILS_PER_POLL", 50))
+IMAP_IDLE_TIMEOUT_SECONDS = float(os.getenv("IMAP_IDLE_TIMEOUT_SECONDS", 300)) # Re-issue IDLE this often (servers drop it after ~30 minutes)
+IMAP_POLL_INTERVAL_SECONDS = float(os.getenv("IMAP_POLL_INTERVAL_SECONDS", 60)) # NOOP polling interval for servers without IDLE
+DAEMON_RECONNECT_MAX_SECONDS = float(os.getenv("DAEMON_RECONNECT_MAX_SECONDS", 300)) # Cap on the reconnect backoff
 
 # Gmail App Password (This is often specifically used for IMAP and SMTP when 2FA is on)
 # Make sure this variable is used consistently for IMAP/SMTP authentication in core/email_sender and core/email_imap
@@ -28,5 +119,29 @@ EMAIL_APP_PASSWORD = os.getenv("EMAIL_APP_PASSWORD")
 YOUR_NAME = os.getenv("YOUR_NAME", "AI Agent") # Provide a default if not set
 YOUR_GMAIL_ADDRESS_FOR_DRAFTS = os.getenv("YOUR_GMAIL_ADDRESS_FOR_DRAFTS", EMAIL_USERNAME)
 
+# Processing engine
+MAX_CONCURRENT_EMAILS = int(os.getenv("MAX_CONCURRENT_EMAILS", 4)) # Emails run through the workflow at the same time
+PREFETCH_BUFFER_SIZE = int(os.getenv("PREFETCH_BUFFER_SIZE", 16)) # Fetched emails buffered ahead of processing in main.py
+AGENT_PIPELINE_MODE = os.getenv("AGENT_PIPELINE_MODE", "standard") # "standard" (filter, summarize, respond) or "fused" (one classify+summarize call, then respond)
+FILTER_BATCH_SIZE = int(os.getenv("FILTER_BATCH_SIZE", 20)) # Emails classified per Gemini call in standard mode (1 disables batching)
+FILTER_BATCH_WAIT_SECONDS = float(os.getenv("FILTER_BATCH_WAIT_SECONDS", 0.5)) # Longest a partial batch waits for the next fetched email before it is classified
+
+# Token budget for the email body in each agent's prompt (utils/token_budget.py).
+# Over-budget bodies lose quoted replies, signatures and disclaimers first, then get truncated.
+AGENT_TOKEN_BUDGETS = {
+    agent: int(os.getenv(f"TOKEN_BUDGET_{agent.upper()}", default))
+    for agent, default in {"filter": 1000, "filter_batch": 150, "summarize": 3000, "combined": 3000, "respond": 2000}.items()
+}
+
+# Processing records (utils/records_manager.py)
+RECORDS_BACKEND = os.getenv("RECORDS_BACKEND", "sqlite").lower() # "sqlite" (indexed records/records.sqlite3) or "csv" (append-only records/records.csv)
+RECORDS_FLUSH_ROWS = int(os.getenv("RECORDS_FLUSH_ROWS", 50)) # Records buffered before the background writer flushes them (utils/records_writer.py)
+RECORDS_FLUSH_SECONDS = float(os.getenv("RECORDS_FLUSH_SECONDS", 2)) # Longest a record waits in the buffer
+RECORDS_FSYNC = os.getenv("RECORDS_FSYNC", "false").lower() in ("1", "true", "yes") # fsync each CSV batch / synchronous=FULL for SQLite
+RECORDS_ARCHIVE_ENABLED = os.getenv("RECORDS_ARCHIVE_ENABLED", "false").lower() in ("1", "true", "yes") # Also append records to the Parquet archive (utils/records_archive.py, needs pyarrow)
+RECORDS_ARCHIVE_DIR = os.getenv("RECORDS_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "records", "archive")) # Day-partitioned records/ and bodies/ datasets
+RECORDS_ARCHIVE_ROW_GROUP_ROWS = int(os.getenv("RECORDS_ARCHIVE_ROW_GROUP_ROWS", 10000)) # Most records per Parquet row group (and per archive batch)
+RECORDS_ARCHIVE_FLUSH_SECONDS = float(os.getenv("RECORDS_ARCHIVE_FLUSH_SECONDS", 60)) # Archive rows are written to a closed, queryable part file at least this often
+
 # # Path for CSV records
 # RECORDS_CSV_PATH = "emails_records.csv"
\ No newline at end of file
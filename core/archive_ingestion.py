@@ -0,0 +1,169 @@
+"""
+Offline ingestion from mail archives: mbox files, Maildir folders and directories of .eml
+files. Messages are read from disk one at a time (mbox files are memory-mapped and split
+in place) and parsed into the same normalized email dictionaries the IMAP fetch produces,
+using core.email_imap.parse_email_message, optionally across worker processes.
+
+Usage:
+    python -m core.archive_ingestion PATH [--format auto|mbox|maildir|eml] [--limit N]
+                                          [--workers N] [--chunk-size N] [--output emails.jsonl]
+"""
+import argparse
+import itertools
+import json
+import mmap
+import os
+import re
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from config import PARSE_WORKERS, PARSE_CHUNK_SIZE
+from core.email_imap import parse_email_message
+from core.parse_pool import parse_messages
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_FORMATS = ("mbox", "maildir", "eml")
+
+# mboxo/mboxrd writers quote body lines starting with "From " as ">From ", ">>From ", ...
+FROM_QUOTE_PATTERN = re.compile(rb"^>(>*From )", re.MULTILINE)
+
+
+def detect_format(path) -> str:
+    """A Maildir has cur/ and new/ subdirectories, other directories hold .eml files, any other file is an mbox."""
+    path = Path(path)
+    if path.is_dir():
+        return "maildir" if (path / "cur").is_dir() and (path / "new").is_dir() else "eml"
+    return "eml" if path.suffix.lower() == ".eml" else "mbox"
+
+
+def iter_mbox_messages(path) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields (id, raw RFC822 bytes) for each message of an mbox file. The file is memory-mapped
+    and split on "From " separator lines, so only the current message is copied into memory.
+    Ids are "<file name>:<byte offset>", which stay stable while the file is only appended to.
+    """
+    path = Path(path)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0 if mm[:5] == b"From " else mm.find(b"\nFrom ") + 1
+            if start == 0 and mm[:5] != b"From ":
+                logger.warning(f"{path} has no 'From ' separator lines; is it an mbox file?")
+                return
+            while start < len(mm):
+                body_start = mm.find(b"\n", start) + 1 or len(mm)
+                end = mm.find(b"\nFrom ", body_start)
+                end = len(mm) if end == -1 else end + 1
+                raw = mm[body_start:end]
+                if b">From " in raw:
+                    raw = FROM_QUOTE_PATTERN.sub(rb"\1", raw)
+                yield f"{path.name}:{start}", raw
+                start = end
+
+
+def iter_maildir_messages(path) -> Iterator[Tuple[str, bytes]]:
+    """Yields (id, raw bytes) for the messages in a Maildir's new/ and cur/; ids are the unique file names without flags."""
+    path = Path(path)
+    for folder in ("new", "cur"):
+        try:
+            entries = sorted((entry for entry in os.scandir(path / folder) if entry.is_file()), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            try:
+                with open(entry.path, "rb") as f:
+                    yield entry.name.split(":", 1)[0], f.read()
+            except OSError as e:
+                logger.warning(f"Could not read {entry.path}: {e}")
+
+
+def iter_eml_messages(path) -> Iterator[Tuple[str, bytes]]:
+    """Yields (id, raw bytes) for a single .eml file or every .eml file under a directory; ids are relative paths."""
+    path = Path(path)
+    files = [path] if path.is_file() else sorted(path.rglob("*.eml"))
+    for file in files:
+        try:
+            yield (file.name if file == path else str(file.relative_to(path))), file.read_bytes()
+        except OSError as e:
+            logger.warning(f"Could not read {file}: {e}")
+
+
+def iter_archive_messages(path, archive_format: str = "auto") -> Iterator[Tuple[str, bytes]]:
+    """Yields (id, raw RFC822 bytes) from an archive; `archive_format` is "auto" or one of ARCHIVE_FORMATS."""
+    archive_format = detect_format(path) if archive_format == "auto" else archive_format
+    if archive_format == "mbox":
+        return iter_mbox_messages(path)
+    if archive_format == "maildir":
+        return iter_maildir_messages(path)
+    if archive_format == "eml":
+        return iter_eml_messages(path)
+    raise ValueError(f"Unknown archive format '{archive_format}'; expected 'auto' or one of {ARCHIVE_FORMATS}")
+
+
+def iter_archive_emails(path, archive_format: str = "auto", limit: Optional[int] = None,
+                        workers: int = PARSE_WORKERS, chunk_size: int = PARSE_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Streams normalized email dictionaries from an mbox file, Maildir or .eml directory, in
+    archive order. Parsing runs in the shared process pool (core/parse_pool.py), which
+    keeps at most 2 * `workers` batches of `chunk_size` messages in flight, so memory stays
+    bounded however large the archive is.
+
+    Arguments:
+        path: The archive file or directory.
+        archive_format (str): "auto", "mbox", "maildir" or "eml".
+        limit (int): Stop after this many messages (None for all).
+        workers (int): Parser processes (1 parses inline).
+        chunk_size (int): Messages per batch sent to a worker.
+
+    Yields:
+        dict: Normalized email dictionaries ("id" identifies the message within the archive).
+    """
+    messages = iter_archive_messages(path, archive_format)
+    if limit is not None:
+        messages = itertools.islice(messages, limit)
+
+    parsed = 0
+    start = time.perf_counter()
+    try:
+        for email_data in parse_messages(messages, parse_email_message, workers, chunk_size):
+            if email_data is not None:
+                parsed += 1
+                yield email_data
+    finally:
+        elapsed = time.perf_counter() - start
+        rate = parsed / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Parsed {parsed} emails from {path} in {elapsed:.2f}s ({rate:.0f} messages/sec, {workers} workers).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="mbox file, Maildir folder, .eml file or directory of .eml files")
+    parser.add_argument("--format", default="auto", choices=("auto",) + ARCHIVE_FORMATS)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=PARSE_CHUNK_SIZE)
+    parser.add_argument("--output", help="Write the normalized emails to this JSON Lines file")
+    args = parser.parse_args()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    count = 0
+    start = time.perf_counter()
+    try:
+        for email_data in iter_archive_emails(args.path, args.format, args.limit, args.workers, args.chunk_size):
+            count += 1
+            if output:
+                output.write(json.dumps(email_data, ensure_ascii=False) + "\n")
+    finally:
+        if output:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print(f"{count} messages in {elapsed:.2f}s: {count / elapsed if elapsed > 0 else 0.0:.0f} messages/sec "
+          f"({args.workers} workers, chunk size {args.chunk_size})")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,268 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from config import DEDUP_DB_PATH, DEDUP_WINDOW_SECONDS, DEDUP_MAX_DISTANCE
+from utils.logger import get_logger
+from utils.token_budget import strip_quoted_text, strip_signature, strip_disclaimers
+
+logger = get_logger(__name__)
+
+# Emails already seen within the time window, checked before the agent workflow runs:
+#   - exact duplicates (same Message-ID, or same sender + subject + normalized body in reply to the same
+#     messages, both with a Message-ID) are not processed again; the same text without Message-IDs or sent
+#     again later in a thread ("Any update?") only reuses the earlier classification, like a near-duplicate;
+#   - near-duplicates (same sender, 64-bit SimHash of the normalized text within DEDUP_MAX_DISTANCE bits)
+#     reuse the earlier classification, and its summary too when both mention the same order/shipment numbers.
+# The index is keyed on the sender, so the same template from two customers is never treated as a duplicate.
+# SimHash candidates are found through four 16-bit bands: two signatures at most 3 bits apart share a band.
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+SUBJECT_PREFIX_PATTERN = re.compile(r"^\s*((re|fwd?|aw|sv)\s*:\s*)+", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"\w+")
+IDENTIFIER_PATTERN = re.compile(r"\b\w*\d\w*\b")
+DIGITS_PATTERN = re.compile(r"\d+")
+SIMHASH_MAX_WORDS = 1000  # long emails are compared on their first words
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_id TEXT,
+    message_id TEXT,
+    sender TEXT,
+    content_hash TEXT,
+    identifiers_hash TEXT,
+    parents_hash TEXT,
+    simhash INTEGER,
+    band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER,
+    classification TEXT,
+    summary TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_seen_message_id ON seen_emails(message_id);
+CREATE INDEX IF NOT EXISTS idx_seen_content ON seen_emails(content_hash);
+CREATE INDEX IF NOT EXISTS idx_seen_band0 ON seen_emails(band0);
+CREATE INDEX IF NOT EXISTS idx_seen_band1 ON seen_emails(band1);
+CREATE INDEX IF NOT EXISTS idx_seen_band2 ON seen_emails(band2);
+CREATE INDEX IF NOT EXISTS idx_seen_band3 ON seen_emails(band3);
+CREATE INDEX IF NOT EXISTS idx_seen_created ON seen_emails(created_at);
+"""
+
+
+def normalize_text(email: dict) -> str:
+    """Subject (without Re:/Fwd:) and body without quoted history, signature or disclaimers, lowercased with whitespace collapsed."""
+    subject = SUBJECT_PREFIX_PATTERN.sub("", email.get("subject") or "")
+    body = strip_disclaimers(strip_signature(strip_quoted_text(email.get("body") or "")))
+    return " ".join(f"{subject}\n{body}".lower().split())
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over the distinct word bigrams of `text`, with numbers masked so templated emails that only differ in them match."""
+    words = WORD_PATTERN.findall(DIGITS_PATTERN.sub("0", text))[:SIMHASH_MAX_WORDS]
+    features = {" ".join(words[i:i + 2]) for i in range(max(1, len(words) - 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big") for feature in features]
+    threshold = len(hashes) / 2
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if sum((h >> bit) & 1 for h in hashes) > threshold:
+            value |= 1 << bit
+    return value
+
+
+def email_signature(email: dict) -> dict:
+    """Message-ID, sender and content signatures of an email, in the form stored in the index."""
+    text = normalize_text(email)
+    signature = simhash(text)
+    identifiers = " ".join(sorted(set(IDENTIFIER_PATTERN.findall(text))))
+    parents = " ".join([(email.get("in_reply_to") or "").strip()] + list(email.get("references") or []))
+    return {
+        "message_id": (email.get("message_id") or "").strip() or None,
+        "sender": (email.get("sender_email") or email.get("from") or "").strip().lower(),
+        "content_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        "identifiers_hash": hashlib.sha256(identifiers.encode("utf-8")).hexdigest(),
+        "parents_hash": hashlib.sha256(parents.encode("utf-8")).hexdigest(),
+        "simhash": signature,
+        "bands": [(signature >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1) for band in range(BANDS)],
+    }
+
+
+def _to_signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+class DedupIndex:
+    """
+    Persistent index of recently processed emails (SQLite, WAL). check() registers each new
+    email as soon as it is seen, so a copy arriving while the first is still being processed
+    is caught too; complete() then stores the first email's classification and summary, and
+    forget() drops it again if processing failed, so a later copy is processed normally.
+    Both act on the row check() registered, whose id is kept on the email under "dedup_row"
+    (email ids repeat across mailboxes, UIDVALIDITY resets and simulated runs).
+    """
+
+    def __init__(self, path: str = DEDUP_DB_PATH, window_seconds: float = DEDUP_WINDOW_SECONDS,
+                 max_distance: int = DEDUP_MAX_DISTANCE):
+        self.path = path
+        self.window_seconds = window_seconds
+        self.max_distance = max(0, min(max_distance, BANDS - 1))
+        self.lock = threading.Lock()
+        self._last_prune = 0.0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(seen_emails)")}
+        if "parents_hash" not in columns:  # index created before In-Reply-To/References were compared
+            self.conn.execute("ALTER TABLE seen_emails ADD COLUMN parents_hash TEXT")
+        self.conn.commit()
+
+    def check(self, email: dict) -> Optional[Dict[str, object]]:
+        """
+        Looks an email up and registers it if it is not an exact duplicate; the new row's id is
+        stored on the email as "dedup_row" for complete() and forget().
+
+        Returns:
+            dict or None: None for a new email, otherwise {"kind": "exact" or "near", "email_id":
+            the earlier email, "classification", "summary" (None unless it can be reused), "distance"}.
+        """
+        signature = email_signature(email)
+        now = time.time()
+        cutoff = now - self.window_seconds
+        with self.lock:
+            self._prune(now)
+            match = self._find_exact(signature, cutoff)
+            if match is None or match["kind"] != "exact":
+                match = match or self._find_near(signature, cutoff)
+                cursor = self.conn.execute(
+                    "INSERT INTO seen_emails (email_id, message_id, sender, content_hash, identifiers_hash, parents_hash, "
+                    "simhash, band0, band1, band2, band3, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (str(email.get("id")), signature["message_id"], signature["sender"], signature["content_hash"],
+                     signature["identifiers_hash"], signature["parents_hash"], _to_signed(signature["simhash"]),
+                     *signature["bands"], now)
+                )
+                self.conn.commit()
+                email["dedup_row"] = cursor.lastrowid
+        return match
+
+    def complete(self, email: dict, classification: str, summary: Optional[str]) -> None:
+        """Stores the results of an email registered by check(), for near-duplicates that come later."""
+        if email.get("dedup_row") is None:
+            return
+        with self.lock:
+            self.conn.execute("UPDATE seen_emails SET classification = ?, summary = ? WHERE id = ? AND classification IS NULL",
+                              (classification, summary, email["dedup_row"]))
+            self.conn.commit()
+
+    def forget(self, email: dict) -> None:
+        """Drops an email registered by check() whose processing failed."""
+        if email.get("dedup_row") is None:
+            return
+        with self.lock:
+            self.conn.execute("DELETE FROM seen_emails WHERE id = ? AND classification IS NULL", (email["dedup_row"],))
+            self.conn.commit()
+
+    def _find_exact(self, signature: dict, cutoff: float) -> Optional[Dict[str, object]]:
+        if signature["message_id"]:
+            row = self.conn.execute(
+                "SELECT email_id, classification, summary FROM seen_emails WHERE message_id = ? AND created_at >= ? LIMIT 1",
+                (signature["message_id"], cutoff)
+            ).fetchone()
+            if row:
+                return {"kind": "exact", "email_id": row[0], "classification": row[1], "summary": row[2], "distance": 0}
+
+        # Same text from the same sender: a resend only if both carry (different) Message-IDs and reply to
+        # the same messages; otherwise possibly a new message that reads the same ("Thanks", "Any update?"),
+        # which only reuses the classification and still gets its own reply
+        rows = self.conn.execute(
+            "SELECT email_id, classification, summary, parents_hash, message_id FROM seen_emails "
+            "WHERE content_hash = ? AND sender = ? AND created_at >= ? ORDER BY id DESC",
+            (signature["content_hash"], signature["sender"], cutoff)
+        ).fetchall()
+        for email_id, classification, summary, parents_hash, message_id in rows:
+            if signature["message_id"] and message_id and parents_hash == signature["parents_hash"]:
+                return {"kind": "exact", "email_id": email_id, "classification": classification, "summary": summary, "distance": 0}
+        for email_id, classification, summary, parents_hash, message_id in rows:
+            if classification is not None:
+                return {"kind": "near", "email_id": email_id, "classification": classification, "summary": None, "distance": 0}
+        return None
+
+    def _find_near(self, signature: dict, cutoff: float) -> Optional[Dict[str, object]]:
+        if not self.max_distance:
+            return None
+        bands = " OR ".join(f"band{band} = ?" for band in range(BANDS))
+        rows = self.conn.execute(
+            f"SELECT email_id, classification, summary, simhash, identifiers_hash FROM seen_emails "
+            f"WHERE ({bands}) AND sender = ? AND created_at >= ? AND classification IS NOT NULL",
+            (*signature["bands"], signature["sender"], cutoff)
+        ).fetchall()
+        best = None
+        for email_id, classification, summary, other, identifiers_hash in rows:
+            distance = bin((other & ((1 << SIMHASH_BITS) - 1)) ^ signature["simhash"]).count("1")
+            if distance <= self.max_distance and (best is None or distance < best["distance"]):
+                # Templated complaints differ only in their order/shipment numbers; those need their own summary
+                reusable_summary = summary if identifiers_hash == signature["identifiers_hash"] else None
+                best = {"kind": "near", "email_id": email_id, "classification": classification,
+                        "summary": reusable_summary, "distance": distance}
+        return best
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        deleted = self.conn.execute("DELETE FROM seen_emails WHERE created_at < ?", (now - self.window_seconds,)).rowcount
+        self.conn.commit()
+        if deleted:
+            logger.debug(f"Dedup index: pruned {deleted} entries older than the window.")
+
+
+_index: Optional[DedupIndex] = None
+_index_lock = threading.Lock()
+_stats = {"checked": 0, "exact": 0, "near": 0, "summaries_reused": 0}
+_stats_lock = threading.Lock()
+
+
+def get_dedup_index() -> DedupIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DedupIndex()
+        return _index
+
+
+def check_duplicate(email: dict) -> Optional[Dict[str, object]]:
+    """check() on the shared index, counted in get_dedup_stats(). Index errors are logged and the email treated as new."""
+    try:
+        match = get_dedup_index().check(email)
+    except Exception as e:
+        logger.warning(f"Dedup index lookup failed for email ID {email.get('id', 'N/A')}: {e}", exc_info=True)
+        return None
+    with _stats_lock:
+        _stats["checked"] += 1
+        if match:
+            _stats[match["kind"]] += 1
+            if match["kind"] == "near" and match["summary"]:
+                _stats["summaries_reused"] += 1
+    return match
+
+
+def record_result(email: dict, classification: Optional[str], summary: Optional[str], failed: bool) -> None:
+    """Stores a processed email's results in the shared index, or forgets the email if processing failed."""
+    try:
+        if failed or not classification:
+            get_dedup_index().forget(email)
+        else:
+            get_dedup_index().complete(email, classification, summary)
+    except Exception as e:
+        logger.warning(f"Could not update the dedup index for email ID {email.get('id', 'N/A')}: {e}", exc_info=True)
+
+
+def get_dedup_stats() -> Dict[str, int]:
+    """Emails checked, exact duplicates skipped, near-duplicates found and near-duplicate summaries reused."""
+    with _stats_lock:
+        return dict(_stats)
\ No newline at end of file
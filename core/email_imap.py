@@ -1,16 +1,47 @@
 import imaplib
 import email
+import base64
+import quopri
+import re
 from email.header import decode_header
 from email.utils import parseaddr, parsedate_to_datetime
-from bs4 import BeautifulSoup
 from utils.logger import get_logger
+from config import IMAP_FETCH_CHUNK_SIZE, IMAP_STREAM_CHUNK_SIZE, IMAP_SYNC_MODE, IMAP_LAZY_BODY, PREFILTER_ENABLED, PARSE_WORKERS
+from core.imap_sync import sync_key, selected_mailbox_info, SyncStateFile
+from core.imap_bodystructure import iter_fetch_items, parse_bodystructure, select_text_parts, is_attachment
+from core.html_text import html_to_text
+from core.parse_pool import parse_messages
+from agents import prefilter_agent
 
 logger = get_logger(__name__, log_to_file=True)
 logger.info("Logger initialized successfully.")
 
-def fetch_imap_emails(email_address, app_password, imap_server, imap_port=993, max_emails=1, mark_as_seen=False):
+# Headers kept on the normalized email so the local pre-filter can spot bulk mail and auto-replies
+PREFILTER_HEADERS = (
+    "List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted",
+    "X-Autoreply", "X-Autorespond", "X-Auto-Response-Suppress"
+)
+
+UID_PATTERN = re.compile(rb"UID (\d+)")
+
+# Phase one of the lazy fetch: everything needed to pre-filter, but no body bytes
+HEADER_FETCH_ITEMS = "(UID RFC822.SIZE BODYSTRUCTURE BODY.PEEK[HEADER])"
+
+def fetch_imap_emails(email_address, app_password, imap_server, imap_port=993, max_emails=1, mark_as_seen=False,
+                      chunk_size=IMAP_FETCH_CHUNK_SIZE, sync_mode=IMAP_SYNC_MODE, lazy_body=IMAP_LAZY_BODY,
+                      parse_workers=PARSE_WORKERS):
     """
     Fetches recent unread emails from the IMAP inbox and returns structured data.
+    Messages are addressed by UID and downloaded with one batched UID FETCH per
+    `chunk_size` messages; marking as seen is a single UID STORE for the whole set.
+
+    With sync_mode="incremental" the selection is not "UNSEEN" but every message newer than
+    the last UID fetched on the previous run (see select_incremental_uids), oldest first.
+
+    With lazy_body=True only headers and BODYSTRUCTURE are downloaded first; the text parts
+    are then fetched just for emails the local pre-filter doesn't skip, and attachment bytes
+    are never downloaded (see fetch_attachment). Without it, full messages are parsed in a
+    process pool while the next chunk downloads.
 
     Arguments:
         email_address (str): Email address used for login.
@@ -19,151 +50,530 @@ def fetch_imap_emails(email_address, app_password, imap_server, imap_port=993, m
         imap_port (int): IMAP port (default 993).
         max_emails (int): Number of recent emails to fetch.
         mark_as_seen (bool): If True, mark fetched emails as 'seen'.
+        chunk_size (int): Messages per UID FETCH round-trip.
+        sync_mode (str): "unseen" (newest unread emails) or "incremental" (new UIDs since the last run).
+        lazy_body (bool): Fetch headers first and download text parts only for kept emails.
+        parse_workers (int): Processes parsing full messages (core/parse_pool.py); 1 parses inline.
 
     Returns:
-        List[dict]: A list of normalized email dictionaries.
+        List[dict]: A list of normalized email dictionaries ("id" is the message UID).
+    """
+    return list(iter_imap_emails(email_address, app_password, imap_server, imap_port, max_emails, mark_as_seen,
+                                 chunk_size, sync_mode, lazy_body, parse_workers))
+
+def iter_imap_emails(email_address, app_password, imap_server, imap_port=993, max_emails=1, mark_as_seen=False,
+                     chunk_size=IMAP_STREAM_CHUNK_SIZE, sync_mode=IMAP_SYNC_MODE, lazy_body=IMAP_LAZY_BODY,
+                     parse_workers=PARSE_WORKERS):
+    """
+    Streaming variant of fetch_imap_emails: yields each normalized email as soon as its
+    chunk is downloaded and parsed, so processing can start before the fetch finishes.
+    Takes the same arguments; the smaller default chunk size gets the first email out sooner.
+
+    The connection stays open while the generator is consumed. Marking as seen and saving
+    the sync position happen after the last email is yielded; a generator closed early
+    leaves both untouched, so the remaining emails are fetched again next time. Errors are
+    logged and end the stream (emails yielded before the error stay valid).
     """
     mail = None
     try:
         mail = imaplib.IMAP4_SSL(imap_server, imap_port)
         mail.login(email_address, app_password)
+        yield from iter_mailbox(mail, email_address, max_emails, mark_as_seen, chunk_size, sync_mode, lazy_body, parse_workers)
+    except imaplib.IMAP4.error as e:
+        logger.error(f"IMAP login or server error: {e}")
+    except Exception as e:
+        logger.error(f"An unexpected error occurred in iter_imap_emails: {e}", exc_info=True)
+    finally:
+        if mail:
+            try:
+                mail.logout()
+            except imaplib.IMAP4.error as e:
+                logger.warning(f"Error during IMAP logout: {e}")
+            except Exception as e:
+                logger.warning(f"Unexpected error during IMAP logout: {e}")
+
+def fetch_from_mailbox(mail, email_address, max_emails=1, mark_as_seen=False,
+                       chunk_size=IMAP_FETCH_CHUNK_SIZE, sync_mode=IMAP_SYNC_MODE, lazy_body=IMAP_LAZY_BODY,
+                       parse_workers=PARSE_WORKERS, sync_store=None):
+    """
+    Does the work of fetch_imap_emails on an already authenticated connection, so a
+    long-lived connection (daemon.py) can poll repeatedly. IMAP errors are raised to the caller.
+    `sync_store` replaces the sync state file (see core.imap_sync.DeferredSyncState).
+
+    Returns:
+        List[dict]: A list of normalized email dictionaries ("id" is the message UID).
+    """
+    return list(iter_mailbox(mail, email_address, max_emails, mark_as_seen, chunk_size, sync_mode, lazy_body,
+                             parse_workers, sync_store))
+
+def iter_mailbox(mail, email_address, max_emails=1, mark_as_seen=False,
+                 chunk_size=IMAP_FETCH_CHUNK_SIZE, sync_mode=IMAP_SYNC_MODE, lazy_body=IMAP_LAZY_BODY,
+                 parse_workers=PARSE_WORKERS, sync_store=None):
+    """
+    Generator behind fetch_from_mailbox/iter_imap_emails: selects the UIDs, then fetches
+    and yields them chunk by chunk, in UID order.
+    """
+    sync_store = sync_store or SyncStateFile()
+    sync_state = None
+    if sync_mode == "incremental":
+        email_uids, sync_state = select_incremental_uids(mail, email_address, max_emails, sync_store=sync_store)
+        if not email_uids:
+            if sync_state:
+                sync_store.save(sync_key(email_address, "inbox"), sync_state)
+            return
+    else:
         mail.select("inbox")
 
-        status, messages = mail.search(None, "UNSEEN")
+        status, messages = mail.uid("SEARCH", None, "UNSEEN")
         if status != 'OK':
             logger.error(f"Failed to search for unread emails: {messages}")
-            return []
+            return
 
-        email_ids = messages[0].split()
-        if not email_ids:
+        email_uids = messages[0].split()
+        if not email_uids:
             logger.info("No unread emails found.")
-            return []
+            return
 
-        email_ids = email_ids[-max_emails:]
+        email_uids = email_uids[-max_emails:]
 
-        emails = []
-        for num in email_ids:
-            try:
-                status, msg_data = mail.fetch(num, "(RFC822)")
-                if status != 'OK':
-                    logger.warning(f"Failed to fetch email ID {num.decode()}: {msg_data}")
-                    continue
+    fetched_uids = []
+    failed_uids = []  # lowest UID of every chunk or email that failed to download
+    if lazy_body:
+        emails = iter_lazy_emails(mail, email_uids, chunk_size, failed_uids)
+    else:
+        # Raw messages are parsed in worker processes while the next chunk downloads
+        raw_emails = (
+            fetched for _, msg_data in fetch_uid_chunks(mail, email_uids, chunk_size, "(UID BODY.PEEK[])", failed_uids)
+            for fetched in iter_fetch_response(msg_data)
+        )
+        emails = parse_messages(raw_emails, parse_email_message, parse_workers)
 
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-
-                # Decode subject
-                subject_decoded = "(no subject)"
-                try:
-                    decoded_headers = decode_header(msg.get("Subject", "(no subject)"))
-                    subject_parts = []
-                    for s, encoding in decoded_headers:
-                        if isinstance(s, bytes):
-                            subject_parts.append(s.decode(encoding if encoding else "utf-8", errors="replace"))
-                        else:
-                            subject_parts.append(s)
-                    subject_decoded = "".join(subject_parts)
-                except Exception as e:
-                    logger.warning(f"Could not decode subject for email ID {num.decode()}: {e}")
-
-                # Parse sender name and email
-                sender_name, sender_email = "Unknown", "unknown@example.com"
-                sender_raw = msg.get("From", "Unknown <unknown@example.com>")
-                try:
-                    sender_name, sender_email = parseaddr(sender_raw)
-                    if not sender_email:
-                        sender_email = "unknown@example.com"
-                except Exception as e:
-                    logger.warning(f"Could not parse sender for email ID {num.decode()}: {e}")
-
-                # Extract timestamp
-                timestamp = None
-                date_raw = msg.get("Date")
-                if date_raw:
-                    try:
-                        timestamp = parsedate_to_datetime(date_raw).isoformat()
-                    except Exception as e:
-                        logger.warning(f"Could not parse date for email ID {num.decode()}: {e}")
-
-                body = extract_email_body(msg)
-
-                emails.append({
-                    "id": num.decode(),
-                    "subject": subject_decoded,
-                    "body": body,
-                    "sender_name": sender_name,
-                    "sender_email": sender_email,
-                    "timestamp": timestamp
-                })
-
-                if mark_as_seen:
-                    mail.store(num, '+FLAGS', '\\Seen')
-                    logger.debug(f"Marked email ID {num.decode()} as seen.")
+    for email_data in emails:
+        if email_data is None:
+            continue
+        fetched_uids.append(email_data["id"])
+        yield email_data
+    first_failed_uid = min(failed_uids) if failed_uids else None
 
-            except Exception as e:
-                logger.error(f"Error processing email ID {num.decode()}: {e}", exc_info=True)
-                continue
+    if mark_as_seen and fetched_uids:
+        uid_set = compress_uid_set(fetched_uids)
+        status, _ = mail.uid("STORE", uid_set, "+FLAGS", "(\\Seen)")
+        if status == 'OK':
+            logger.debug(f"Marked {len(fetched_uids)} emails as seen ({uid_set}).")
+        else:
+            logger.warning(f"Failed to mark UID set {uid_set} as seen.")
 
-    except imaplib.IMAP4.error as e:
-        logger.error(f"IMAP login or server error: {e}")
-        return []
-    except Exception as e:
-        logger.error(f"An unexpected error occurred in fetch_imap_emails: {e}", exc_info=True)
-        return []
-    finally:
-        if mail:
+    if sync_state:
+        if first_failed_uid is not None and first_failed_uid <= sync_state["last_uid"]:
+            # Don't advance past a chunk that failed to download; it is retried on the next run.
+            sync_state = dict(sync_state, last_uid=first_failed_uid - 1, highestmodseq=None)
+        sync_store.save(sync_key(email_address, "inbox"), sync_state)
+
+def fetch_uid_chunks(mail, email_uids, chunk_size, items, failed_uids):
+    """
+    Runs one UID FETCH of `items` per chunk of `email_uids` and yields (uid_chunk, msg_data)
+    for the chunks that succeed. The lowest UID of a failed chunk is appended to `failed_uids`.
+    """
+    for uid_chunk in chunked(email_uids, chunk_size):
+        uid_set = compress_uid_set(uid_chunk)
+        # The .PEEK variants leave \Seen alone; flags are only changed by the explicit STORE.
+        status, msg_data = mail.uid("FETCH", uid_set, items)
+        if status != 'OK':
+            logger.warning(f"Failed to fetch UID set {uid_set}: {msg_data}")
+            failed_uids.append(min(int(uid) for uid in uid_chunk))
+            continue
+        yield uid_chunk, msg_data
+
+def iter_lazy_emails(mail, email_uids, chunk_size, failed_uids):
+    """
+    Lazy fetch: headers and BODYSTRUCTURE per chunk, then the text parts of the emails the
+    pre-filter keeps. Emails whose parts fail to download are dropped and their UIDs added
+    to `failed_uids`, like a failed chunk, so they are fetched again on the next run.
+    """
+    for _, msg_data in fetch_uid_chunks(mail, email_uids, chunk_size, HEADER_FETCH_ITEMS, failed_uids):
+        chunk_emails = []
+        for uid, data, parse in iter_header_response(msg_data):
             try:
-                mail.logout()
-            except imaplib.IMAP4.error as e:
-                logger.warning(f"Error during IMAP logout: {e}")
+                chunk_emails.append(parse(data, uid))
             except Exception as e:
-                logger.warning(f"Unexpected error during IMAP logout: {e}")
+                logger.error(f"Error processing email UID {uid}: {e}", exc_info=True)
+
+        if chunk_emails:
+            body_failures = set(load_email_bodies(mail, [e for e in chunk_emails if not prefilter_skips(e)], chunk_size))
+            if body_failures:
+                chunk_emails = [e for e in chunk_emails if e["id"] not in body_failures]
+                failed_uids.append(min(int(uid) for uid in body_failures))
+
+        yield from chunk_emails
+
+def select_incremental_uids(mail, email_address, max_emails, mailbox="inbox", sync_store=None):
+    """
+    Picks the UIDs to fetch in incremental sync mode and selects the mailbox.
+
+    The SELECT response carries UIDVALIDITY, UIDNEXT and (on CONDSTORE servers)
+    HIGHESTMODSEQ, which are compared with the position saved by the previous run
+    (core/imap_sync.py):
+      - same UIDVALIDITY and HIGHESTMODSEQ, or UIDNEXT not past the last UID: nothing is
+        searched or fetched;
+      - same UIDVALIDITY: only "UID <last_uid + 1>:*" is searched and the oldest
+        `max_emails` new UIDs are returned, so a backlog is worked through across polls;
+      - no saved state or a changed UIDVALIDITY (old UIDs are meaningless): a full resync
+        that fetches the newest unread emails, as the "unseen" mode does, and restarts the
+        position from the current end of the mailbox.
+
+    A connection that already has the mailbox selected (daemon.py keeps it selected
+    between polls) gets a NOOP instead, as STATUS must not be used on the selected mailbox.
+    Its SELECT-time UIDNEXT and HIGHESTMODSEQ are stale by then, so only UIDVALIDITY is
+    compared and the new UIDs are always searched.
+
+    Returns:
+        Tuple[List[bytes], dict or None]: UIDs to fetch, and the sync state to persist once they are fetched.
+    """
+    saved = (sync_store or SyncStateFile()).load(sync_key(email_address, mailbox))
+    if getattr(mail, "state", None) == "SELECTED":
+        status, data = mail.noop()
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"NOOP failed: {data}")
+        info = {"UIDVALIDITY": selected_mailbox_info(mail).get("UIDVALIDITY")}
+    else:
+        status, data = mail.select(mailbox)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"SELECT {mailbox} failed: {data}")
+        info = selected_mailbox_info(mail)
+    uidvalidity = info.get("UIDVALIDITY")
+    uidnext = info.get("UIDNEXT")
+    modseq = info.get("HIGHESTMODSEQ")
 
-    return emails
+    if saved and saved.get("uidvalidity") == uidvalidity:
+        last_uid = saved.get("last_uid", 0)
+        if modseq is not None and modseq == saved.get("highestmodseq"):
+            logger.debug(f"Mailbox {mailbox} unchanged since the last sync (HIGHESTMODSEQ {modseq}).")
+            return [], None
+        if uidnext is not None and uidnext - 1 <= last_uid:
+            logger.debug(f"No new emails in {mailbox} since UID {last_uid}.")
+            return [], dict(saved, highestmodseq=modseq)
+
+        status, messages = mail.uid("SEARCH", None, "UID", f"{last_uid + 1}:*")
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"UID SEARCH failed: {messages}")
+        # "n:*" always matches the highest UID, even when it is below n
+        new_uids = sorted((uid for uid in messages[0].split() if int(uid) > last_uid), key=int)
+        email_uids = new_uids[:max_emails]
+        caught_up = len(email_uids) == len(new_uids)
+        logger.info(f"Incremental sync of {mailbox}: {len(new_uids)} new emails since UID {last_uid}, fetching {len(email_uids)}.")
+        return email_uids, {
+            "uidvalidity": uidvalidity,
+            "last_uid": int(email_uids[-1]) if email_uids else last_uid,
+            # Only remember HIGHESTMODSEQ once every new email was fetched, otherwise the next poll would skip the rest
+            "highestmodseq": modseq if caught_up else None
+        }
+
+    if saved:
+        logger.warning(f"UIDVALIDITY of {mailbox} changed ({saved.get('uidvalidity')} -> {uidvalidity}); running a full resync.")
+    else:
+        logger.info(f"No sync state for {mailbox}; running a full resync.")
+    status, messages = mail.uid("SEARCH", None, "UNSEEN")
+    if status != 'OK':
+        raise imaplib.IMAP4.error(f"Failed to search for unread emails: {messages}")
+    email_uids = messages[0].split()[-max_emails:]
+    highest_uid = max([uidnext - 1 if uidnext else 0] + [int(uid) for uid in email_uids])
+    return email_uids, {"uidvalidity": uidvalidity, "last_uid": highest_uid, "highestmodseq": modseq}
+
+def chunked(items, size):
+    """Yields consecutive slices of `items` with at most `size` elements."""
+    size = max(1, int(size))
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def compress_uid_set(uids) -> str:
+    """
+    Builds a compact IMAP message set from UIDs, collapsing consecutive runs into ranges,
+    e.g. [1, 2, 3, 5, 7, 8] -> "1:3,5,7:8".
+    """
+    numbers = sorted({int(uid) for uid in uids})
+    parts = []
+    start = previous = None
+    for number in numbers:
+        if start is None:
+            start = previous = number
+        elif number == previous + 1:
+            previous = number
+        else:
+            parts.append(f"{start}:{previous}" if previous != start else str(start))
+            start = previous = number
+    if start is not None:
+        parts.append(f"{start}:{previous}" if previous != start else str(start))
+    return ",".join(parts)
+
+def iter_fetch_response(msg_data):
+    """
+    Yields (uid, literal_bytes) pairs from an imaplib FETCH response. Each message comes back
+    as a (b'<seq> (UID <uid> BODY[] {<size>}', b'<literal>') tuple followed by b')'; servers
+    that send the UID after the literal put it in that trailing element instead (b' UID <uid>)').
+    """
+    pending = None  # literal whose UID has not been seen yet
+    for item in msg_data:
+        if isinstance(item, tuple) and len(item) >= 2:
+            if pending is not None:
+                logger.warning("FETCH response item without a UID; skipping it.")
+            match = UID_PATTERN.search(item[0])
+            if match:
+                yield match.group(1).decode(), item[1]
+                pending = None
+            else:
+                pending = item[1]
+        elif pending is not None and isinstance(item, bytes):
+            match = UID_PATTERN.search(item)
+            if match:
+                yield match.group(1).decode(), pending
+            else:
+                logger.warning("FETCH response item without a UID; skipping it.")
+            pending = None
+    if pending is not None:
+        logger.warning("FETCH response item without a UID; skipping it.")
+
+def parse_email_message(raw_email: bytes, email_id: str) -> dict:
+    """
+    Parses raw RFC822 bytes into the normalized email dictionary used by the pipeline.
+    """
+    msg = email.message_from_bytes(raw_email)
+    email_data = normalize_headers(msg, email_id)
+    email_data["body"] = extract_email_body(msg)
+    email_data["attachments"] = [
+        attachment_info(part, number) for part, number in iter_leaf_parts(msg)
+        if part.get_content_disposition() == "attachment" or part.get_content_type() not in ("text/plain", "text/html")
+    ]
+    return email_data
+
+def normalize_headers(msg, email_id: str) -> dict:
+    """
+    Builds the normalized email dictionary from a message's headers (subject, sender,
+    timestamp, threading and pre-filter headers); "body" is left empty for the caller to fill.
+    """
+    # Decode subject
+    subject_decoded = "(no subject)"
+    try:
+        decoded_headers = decode_header(msg.get("Subject", "(no subject)"))
+        subject_parts = []
+        for s, encoding in decoded_headers:
+            if isinstance(s, bytes):
+                subject_parts.append(s.decode(encoding if encoding else "utf-8", errors="replace"))
+            else:
+                subject_parts.append(s)
+        subject_decoded = "".join(subject_parts)
+    except Exception as e:
+        logger.warning(f"Could not decode subject for email ID {email_id}: {e}")
+
+    # Parse sender name and email
+    sender_name, sender_email = "Unknown", "unknown@example.com"
+    sender_raw = msg.get("From", "Unknown <unknown@example.com>")
+    try:
+        sender_name, sender_email = parseaddr(sender_raw)
+        if not sender_email:
+            sender_email = "unknown@example.com"
+    except Exception as e:
+        logger.warning(f"Could not parse sender for email ID {email_id}: {e}")
+
+    # Extract timestamp
+    timestamp = None
+    date_raw = msg.get("Date")
+    if date_raw:
+        try:
+            timestamp = parsedate_to_datetime(date_raw).isoformat()
+        except Exception as e:
+            logger.warning(f"Could not parse date for email ID {email_id}: {e}")
+
+    headers = {name: str(msg[name]) for name in PREFILTER_HEADERS if msg[name] is not None}
+
+    return {
+        "id": email_id,
+        "subject": subject_decoded,
+        "body": "",
+        "sender_name": sender_name,
+        "sender_email": sender_email,
+        "timestamp": timestamp,
+        "message_id": (msg.get("Message-ID") or "").strip(),
+        "in_reply_to": (msg.get("In-Reply-To") or "").strip(),
+        "references": (msg.get("References") or "").split(),
+        "headers": headers
+    }
+
+def iter_leaf_parts(msg, prefix=""):
+    """Yields (part, IMAP part number) for the non-multipart parts of a parsed message."""
+    if msg.get_content_maintype() != "multipart":
+        yield msg, prefix or "1"
+        return
+    for number, part in enumerate(msg.get_payload(), start=1):
+        yield from iter_leaf_parts(part, f"{prefix}.{number}" if prefix else str(number))
+
+def attachment_info(part, number: str) -> dict:
+    payload = part.get_payload(decode=False)
+    return {
+        "part": number,
+        "filename": part.get_filename(),
+        "content_type": part.get_content_type(),
+        "size": len(payload) if isinstance(payload, (str, bytes)) else 0
+    }
+
+def iter_header_response(msg_data):
+    """
+    Yields (uid, fetch_items, parse_header_response) for each message of a HEADER_FETCH_ITEMS
+    response, in the same shape the fetch loop uses for full messages.
+    """
+    for items in iter_fetch_items(msg_data):
+        uid = items.get(b"UID")
+        if uid is not None:
+            yield bytes(uid).decode(), items, parse_header_response
+
+def parse_header_response(items: dict, email_id: str) -> dict:
+    """
+    Builds a header-only normalized email from phase one of the lazy fetch. The MIME parts
+    from BODYSTRUCTURE are kept: "text_parts" for load_email_bodies and "attachments"
+    (metadata only) for fetch_attachment.
+    """
+    msg = email.message_from_bytes(bytes(items.get(b"BODY[HEADER]") or b""))
+    email_data = normalize_headers(msg, email_id)
+    parts = parse_bodystructure(items.get(b"BODYSTRUCTURE"))
+    email_data["text_parts"] = select_text_parts(parts)
+    email_data["attachments"] = [
+        {key: part[key] for key in ("part", "filename", "content_type", "size", "encoding")}
+        for part in parts if is_attachment(part)
+    ]
+    email_data["size"] = int(items.get(b"RFC822.SIZE") or 0)
+    return email_data
+
+def prefilter_skips(email_data: dict) -> bool:
+    """
+    Runs the local pre-filter on a header-only email. A confident label is stored on the
+    email (the pipeline reuses it) and its body is never downloaded.
+    """
+    if not PREFILTER_ENABLED:
+        return False
+    try:
+        result = prefilter_agent.prefilter_email(email_data, record_stats=False)
+    except Exception as e:
+        logger.warning(f"[Pre-filter] Error for email ID {email_data.get('id', 'N/A')}: {e}", exc_info=True)
+        return False
+    if result["label"]:
+        email_data["prefilter"] = result
+        logger.debug(f"Email UID {email_data['id']} pre-filtered as {result['label']} from its headers; body not downloaded.")
+        return True
+    return False
+
+def decode_part(data: bytes, part: dict) -> bytes:
+    """Undoes the part's Content-Transfer-Encoding (base64 / quoted-printable)."""
+    encoding = (part.get("encoding") or "").lower()
+    if encoding == "base64":
+        return base64.b64decode(data)
+    if encoding == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+def load_email_bodies(mail, emails, chunk_size=IMAP_FETCH_CHUNK_SIZE):
+    """
+    Phase two of the lazy fetch: downloads only the text parts chosen from BODYSTRUCTURE
+    with BODY.PEEK[<part>] and fills in each email's "body". Emails with the same part
+    layout (e.g. all "1" or all "1.1") share one UID FETCH per chunk.
+
+    Returns:
+        List[str]: UIDs whose body could not be downloaded.
+    """
+    groups = {}
+    for email_data in emails:
+        part_numbers = tuple(part["part"] for part in email_data.get("text_parts") or [])
+        if part_numbers:
+            groups.setdefault(part_numbers, []).append(email_data)
+
+    failed = []
+    for part_numbers, group in groups.items():
+        items = "(UID " + " ".join(f"BODY.PEEK[{number}]" for number in part_numbers) + ")"
+        for email_chunk in chunked(group, chunk_size):
+            by_uid = {email_data["id"]: email_data for email_data in email_chunk}
+            uid_set = compress_uid_set(by_uid)
+            status, msg_data = mail.uid("FETCH", uid_set, items)
+            if status != 'OK':
+                logger.warning(f"Failed to fetch text parts {part_numbers} for UID set {uid_set}: {msg_data}")
+                failed.extend(by_uid)
+                continue
+            for fetched in iter_fetch_items(msg_data):
+                email_data = by_uid.pop(bytes(fetched.get(b"UID") or b"").decode(), None)
+                if email_data is None:
+                    continue
+                texts = {number: fetched.get(f"BODY[{number}]".encode()) for number in part_numbers}
+                email_data["body"] = assemble_body(email_data["text_parts"], texts)
+            failed.extend(by_uid)  # asked for but missing from the response
+    return failed
+
+def assemble_body(text_parts, texts) -> str:
+    """Joins downloaded text/plain parts, or converts the first non-empty text/html part."""
+    plain, html = [], []
+    for part in text_parts:
+        data = texts.get(part["part"])
+        if not data:
+            continue
+        try:
+            text = decode_part(bytes(data), part).decode(part.get("charset") or "utf-8", errors="replace")
+        except Exception as e:
+            logger.warning(f"Failed to decode text part {part['part']}: {e}")
+            continue
+        (plain if part["content_type"] == "text/plain" else html).append(text)
+    if any(text.strip() for text in plain):
+        return "\n".join(text for text in plain if text.strip()).strip()
+    for text in html:
+        text_body = html_to_text(text)
+        if text_body:
+            return text_body
+    return ""
+
+def fetch_attachment(mail, uid, attachment: dict) -> bytes:
+    """
+    Downloads one attachment on demand (an entry of a lazily fetched email's "attachments")
+    and returns its decoded bytes. The mailbox must be selected on `mail`.
+    """
+    number = attachment["part"]
+    status, msg_data = mail.uid("FETCH", str(uid), f"(UID BODY.PEEK[{number}])")
+    if status != 'OK':
+        raise imaplib.IMAP4.error(f"Failed to fetch part {number} of UID {uid}: {msg_data}")
+    for fetched in iter_fetch_items(msg_data):
+        data = fetched.get(f"BODY[{number}]".encode())
+        if data is not None:
+            return decode_part(bytes(data), attachment)
+    raise imaplib.IMAP4.error(f"Part {number} of UID {uid} missing from the FETCH response")
 
 def extract_email_body(msg):
     """
     Extracts the plain text body from an email message.
     Prioritizes text/plain, falls back to text/html (converting to plain text).
+    The message is walked once; HTML parts are only decoded when there is no plain text.
     """
-    body_content = []
-
+    plain_parts, html_parts = [], []
     for part in msg.walk():
         content_type = part.get_content_type()
-        content_disposition = str(part.get("Content-Disposition"))
+        if content_type not in ("text/plain", "text/html") or "attachment" in str(part.get("Content-Disposition")):
+            continue
+        (plain_parts if content_type == "text/plain" else html_parts).append(part)
 
-        if content_type == "text/plain" and "attachment" not in content_disposition:
-            charset = part.get_content_charset() or "utf-8"
-            try:
-                payload = part.get_payload(decode=True).decode(charset, errors="replace")
-                if payload.strip():
-                    body_content.append(payload)
-            except Exception as e:
-                logger.warning(f"Failed to decode plain text part: {e}")
+    body_content = []
+    for part in plain_parts:
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            payload = part.get_payload(decode=True).decode(charset, errors="replace")
+            if payload.strip():
+                body_content.append(payload)
+        except Exception as e:
+            logger.warning(f"Failed to decode plain text part: {e}")
 
     if body_content:
         return "\n".join(body_content).strip()
 
-    for part in msg.walk():
-        content_type = part.get_content_type()
-        content_disposition = str(part.get("Content-Disposition"))
-        if content_type == "text/html" and "attachment" not in content_disposition:
-            charset = part.get_content_charset() or "utf-8"
-            try:
-                html_payload = part.get_payload(decode=True).decode(charset, errors="replace")
-                soup = BeautifulSoup(html_payload, "html.parser")
-                for script_or_style in soup(["script", "style"]):
-                    script_or_style.decompose()
-                text = soup.get_text()
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for phrase in lines if phrase.strip())
-                text_body = '\n'.join(chunks)
-                if text_body:
-                    return text_body
-            except ImportError:
-                logger.warning("BeautifulSoup not installed. Cannot convert HTML to plain text.")
-                return "HTML content present but not processed (BeautifulSoup missing)."
-            except Exception as e:
-                logger.warning(f"Failed to decode or convert HTML part: {e}")
+    for part in html_parts:
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            html_payload = part.get_payload(decode=True).decode(charset, errors="replace")
+            text_body = html_to_text(html_payload)
+            if text_body:
+                return text_body
+        except Exception as e:
+            logger.warning(f"Failed to decode or convert HTML part: {e}")
 
     return ""
\ No newline at end of file
@@ -12,7 +12,8 @@ logger.info("Logger initialized successfully.")
 # Correct the import statement to match your filename
 try:
     # Assuming core/email_imap.py exists and contains fetch_imap_emails
-    from core.email_imap import fetch_imap_emails
+    from core.email_imap import fetch_imap_emails, iter_imap_emails
+    from core.archive_ingestion import iter_archive_emails
     # Also, if email_imap.py uses BeautifulSoup, the import should be within that file
     # and beautifulsoup4 must be pip installed.
 except ImportError as e:
@@ -22,13 +23,13 @@ except ImportError as e:
     logger = get_logger(__name__)
     logger.error(f"ERROR: Could not import fetch_imap_emails from core.email_imap: {e}. IMAP fetching will be unavailable. "
                  f"Ensure core/email_imap.py exists and `beautifulsoup4` is installed if HTML parsing is involved.")
-    fetch_imap_emails = None
+    fetch_imap_emails = iter_imap_emails = iter_archive_emails = None
 except ModuleNotFoundError as e:
     from utils.logger import get_logger
     logger = get_logger(__name__)
     logger.error(f"ERROR: A module required by fetch_imap_emails is missing: {e}. IMAP fetching will be unavailable. "
                  f"Ensure all dependencies (e.g., `beautifulsoup4`) are installed.")
-    fetch_imap_emails = None
+    fetch_imap_emails = iter_imap_emails = iter_archive_emails = None
 
 
 def is_running_locally(port: int = 8000) -> bool:
@@ -86,3 +87,39 @@ def fetch_email(simulate: bool = True, limit: int = 10, mark_as_seen: bool = Fal
             max_emails=limit,
             mark_as_seen=mark_as_seen
         )
+
+
+def iter_emails(simulate: bool = True, limit: int = 10, mark_as_seen: bool = False, archive_path: str = None):
+    """
+    Streaming counterpart of fetch_email: yields each email as soon as it is available, so
+    processing overlaps with the IMAP fetch (wrap it in core.engine.prefetch to buffer ahead).
+
+    Arguments:
+        simulate (bool): Whether to simulate email ingestion from a local file.
+        limit (int): Number of emails to fetch if using IMAP or an archive.
+        mark_as_seen (bool): If True, mark fetched emails as 'seen' on the IMAP server.
+        archive_path (str): An mbox file, Maildir or .eml directory to read instead of IMAP.
+
+    Yields:
+        dict: Normalized email dictionaries.
+    """
+    if simulate:
+        yield from fetch_email(simulate=True)
+        return
+    if archive_path:
+        if not iter_archive_emails:
+            raise ImportError("Archive ingestion is not available. Please ensure core/email_imap.py is correct and dependencies are met.")
+        logger.info(f"Reading up to {limit} emails from the archive {archive_path}...")
+        yield from iter_archive_emails(archive_path, limit=limit)
+        return
+    if not iter_imap_emails:
+        raise ImportError("IMAP fetching is not available. Please ensure core/email_imap.py is correct and dependencies are met.")
+    logger.info(f"Streaming up to {limit} emails from {IMAP_SERVER}:{IMAP_PORT} for {EMAIL_USERNAME}...")
+    yield from iter_imap_emails(
+        email_address=EMAIL_USERNAME,
+        app_password=EMAIL_APP_PASSWORD,
+        imap_server=IMAP_SERVER,
+        imap_port=IMAP_PORT,
+        max_emails=limit,
+        mark_as_seen=mark_as_seen
+    )
@@ -1,6 +1,6 @@
-import smtplib
 from email.message import EmailMessage
-from config import EMAIL_SERVER, EMAIL_PASSWORD, EMAIL_USERNAME, EMAIL_PORT
+from config import EMAIL_USERNAME
+from core.smtp_pool import send_message
 from utils.logger import get_logger
 from utils.formatter import clean_text, format_email
 import email.utils # For robust name extraction
@@ -20,7 +20,7 @@ def extract_name_from_email(email_address: str) -> str:
 
 def send_draft_to_gmail(email_data: dict, user_name: str, gmail_address: str) -> bool:
     """
-    Sends a draft email to a specified Gmail address using SMTP.
+    Sends a draft email to a specified Gmail address over a pooled SMTP session.
 
     Arguments:
         email_data (dict): Email data with keys "subject", "response", "from".
@@ -46,12 +46,8 @@ def send_draft_to_gmail(email_data: dict, user_name: str, gmail_address: str) ->
         msg["To"] = gmail_address # The Gmail account to send the draft to
         msg.set_content(response_content)
 
-        logger.debug("Connecting to SMTP server %s:%s for sending draft", EMAIL_SERVER, EMAIL_PORT)
-        with smtplib.SMTP(EMAIL_SERVER, int(EMAIL_PORT)) as server:
-            server.starttls()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(msg)
-            logger.info("Draft sent to Gmail account at %s for review.", gmail_address)
+        send_message(msg)
+        logger.info("Draft sent to Gmail account at %s for review.", gmail_address)
 
         return True
     except Exception as e:
@@ -60,7 +56,7 @@ def send_draft_to_gmail(email_data: dict, user_name: str, gmail_address: str) ->
 
 def send_email(email_data: dict, user_name: str) -> bool:
     """
-    Sends an email reply via SMTP using the generated response.
+    Sends an email reply over a pooled SMTP session using the generated response.
 
     Arguments:
         email_data (dict): Email data with keys "subject", "response", "from".
@@ -85,12 +81,8 @@ def send_email(email_data: dict, user_name: str) -> bool:
         msg["To"] = recipient_email
         msg.set_content(response_content)
 
-        logger.debug("Connecting to SMTP server %s:%s", EMAIL_SERVER, EMAIL_PORT)
-        with smtplib.SMTP(EMAIL_SERVER, int(EMAIL_PORT)) as server:
-            server.starttls()
-            server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
-            server.send_message(msg)
-            logger.info("Email sent to %s", recipient_email)
+        send_message(msg)
+        logger.info("Email sent to %s", recipient_email)
 
         return True
     except Exception as e:
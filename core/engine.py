@@ -0,0 +1,137 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def process_concurrently(items: Iterable[T], worker: Callable[[T], R], max_workers: int = 4) -> Iterator[R]:
+    """
+    Runs worker(item) for many items at once on a thread pool and yields the results
+    in the same order as the input, so callers can number/log them deterministically.
+
+    The LLM and SMTP calls made by the workers are I/O bound, so threads give real
+    concurrency here. A worker that raises does not stop the batch: the exception is
+    re-raised to the caller when its (in-order) result is reached.
+
+    `items` is consumed lazily: at most 2 * max_workers items are in flight, so a streaming
+    source (see prefetch) keeps flowing while results are yielded.
+
+    Arguments:
+        items (Iterable): The inputs to process (e.g. normalized email dicts).
+        worker (Callable): Function applied to each item.
+        max_workers (int): Maximum number of items processed at the same time.
+
+    Returns:
+        Iterator: Results in input order.
+    """
+    max_workers = max(1, int(max_workers))
+    if max_workers == 1:
+        for item in items:
+            yield worker(item)
+        return
+
+    logger.info(f"Processing with up to {max_workers} concurrent workers.")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="email-worker") as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(worker, item))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+_END = object()
+
+
+class Prefetch(Iterator[T]):
+    """
+    Iterator returned by prefetch(). Besides plain iteration, wait() tells a consumer that
+    groups items (e.g. classify_stream) whether another item is ready, so it doesn't have
+    to block on a slow producer with a partial group in hand.
+    """
+
+    def __init__(self, items: Iterable[T], buffer_size: int):
+        self._items = items
+        self._buffer = queue.Queue(maxsize=max(1, int(buffer_size)))
+        self._stop = threading.Event()
+        self._next = None  # entry taken from the buffer by wait() but not yet returned
+        self._done = False
+        self._producer = threading.Thread(target=self._produce, name="prefetch", daemon=True)
+        self._producer.start()
+
+    def __next__(self) -> T:
+        if self._done:
+            raise StopIteration
+        entry, self._next = self._next or self._buffer.get(), None
+        item, error = entry
+        if item is _END:
+            self.close()
+            if error is not None:
+                raise error
+            raise StopIteration
+        return item
+
+    def wait(self, timeout: float) -> bool:
+        """True once the next item (or the end of the stream) is available, waiting at most `timeout` seconds."""
+        if self._done or self._next is not None:
+            return True
+        try:
+            self._next = self._buffer.get(timeout=max(0.0, timeout))
+            return True
+        except queue.Empty:
+            return False
+
+    def close(self) -> None:
+        """Stops the producer (also done when the iterator is garbage collected)."""
+        self._done = True
+        self._stop.set()
+
+    def __del__(self):
+        self._stop.set()
+
+    def _put(self, entry) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._buffer.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self) -> None:
+        try:
+            for item in self._items:
+                if not self._put((item, None)):
+                    return
+            self._put((_END, None))
+        except BaseException as e:
+            self._put((_END, e))
+        finally:
+            close = getattr(self._items, "close", None)
+            if self._stop.is_set() and close:
+                close()  # let a generator source clean up (e.g. log out of IMAP)
+
+
+def prefetch(items: Iterable[T], buffer_size: int = 16) -> Prefetch:
+    """
+    Runs the `items` iterator on a background thread and buffers up to `buffer_size`
+    results, so a slow producer (e.g. the IMAP fetch) works ahead of the consumer without
+    holding the whole backlog in memory. An exception in the producer is re-raised to the
+    consumer after the items produced before it.
+
+    Arguments:
+        items (Iterable): The source iterator (e.g. core.email_ingestion.iter_emails()).
+        buffer_size (int): Maximum number of produced items waiting to be consumed.
+
+    Returns:
+        Prefetch: An iterator over the same items, in order.
+    """
+    return Prefetch(items, buffer_size)
\ No newline at end of file
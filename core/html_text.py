@@ -0,0 +1,137 @@
+import threading
+from html.parser import HTMLParser
+from typing import Callable, Dict, Optional
+from config import HTML_TEXT_BACKEND, HTML_MAX_INPUT_CHARS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Elements whose content is never text
+SKIP_TAGS = frozenset(("script", "style"))
+# Elements that start a new line, so minified HTML doesn't glue words together
+BLOCK_TAGS = frozenset((
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+    "section", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul"
+))
+
+
+class _TextExtractor(HTMLParser):
+    """Collects text while the document streams through; no tree is built."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.chunks.append(data)
+
+
+def stream_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.chunks)
+
+
+def lxml_to_text(html: str) -> str:
+    from lxml import etree, html as lxml_html
+    try:
+        root = lxml_html.document_fromstring(html)
+    except (etree.ParserError, ValueError):  # empty document, or an XML encoding declaration in a str
+        return stream_to_text(html)
+    etree.strip_elements(root, etree.Comment, *SKIP_TAGS, with_tail=False)
+    for element in root.iter(*BLOCK_TAGS):
+        if element.tag != "br":
+            element.text = "\n" + (element.text or "")
+        element.tail = "\n" + (element.tail or "")
+    return root.text_content()
+
+
+def bs4_to_text(html: str) -> str:
+    """The original BeautifulSoup conversion, kept for comparison."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for script_or_style in soup(["script", "style"]):
+        script_or_style.decompose()
+    return soup.get_text()
+
+
+_backends: Dict[str, Callable[[str], str]] = {"lxml": lxml_to_text, "stream": stream_to_text, "bs4": bs4_to_text}
+_available: Dict[str, bool] = {"stream": True}
+_warned = set()
+_lock = threading.Lock()
+
+
+def register_backend(name: str, convert: Callable[[str], str]) -> None:
+    """Adds or replaces an HTML-to-text backend; `convert` takes HTML and returns raw text."""
+    with _lock:
+        _backends[name] = convert
+        _available[name] = True
+
+
+def is_available(name: str) -> bool:
+    with _lock:
+        if name not in _available:
+            module = {"lxml": "lxml.html", "bs4": "bs4"}.get(name)
+            try:
+                if module:
+                    __import__(module)
+                _available[name] = name in _backends
+            except ImportError:
+                _available[name] = False
+        return _available[name]
+
+
+def get_backend(name: Optional[str] = None) -> Callable[[str], str]:
+    """
+    Resolves a backend name ("auto", "lxml", "stream", "bs4" or a registered one).
+    "auto" prefers lxml when it is installed and otherwise uses the streaming parser;
+    an unavailable backend also falls back to the streaming parser.
+    """
+    name = (name or HTML_TEXT_BACKEND).lower()
+    if name == "auto":
+        name = "lxml" if is_available("lxml") else "stream"
+    if not is_available(name):
+        if name not in _warned:
+            _warned.add(name)
+            logger.warning(f"HTML-to-text backend '{name}' is not available; using the streaming parser.")
+        name = "stream"
+    return _backends[name]
+
+
+def html_to_text(html: str, backend: Optional[str] = None, max_chars: int = HTML_MAX_INPUT_CHARS) -> str:
+    """
+    Converts an HTML body to plain text, dropping scripts, styles and blank lines.
+
+    Arguments:
+        html (str): The decoded HTML.
+        backend (str): Backend name; defaults to config.HTML_TEXT_BACKEND.
+        max_chars (int): Only the first `max_chars` characters are parsed (0 disables the cap).
+
+    Returns:
+        str: One stripped line per non-empty line of text.
+    """
+    if max_chars and len(html) > max_chars:
+        html = html[:max_chars]
+    text = get_backend(backend)(html)
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
\ No newline at end of file
@@ -0,0 +1,169 @@
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Start of one message's data in a FETCH response: b'12 (UID 57 ...'
+FETCH_START_PATTERN = re.compile(rb"^\d+ \(")
+LITERAL_PATTERN = re.compile(rb"\{(\d+)\}$")
+TOKEN_PATTERN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+
+class _Literal(bytes):
+    """Marks a value that arrived as an IMAP literal, so it is never mistaken for an atom."""
+
+
+def _tokenize(segments: List[bytes], literals: List[bytes]) -> Iterator[object]:
+    """
+    Tokenizes one message's FETCH response. `segments[i]` is response text and, when it
+    ends with a literal marker {n}, `literals[i]` holds the n bytes that followed it.
+    """
+    for index, text in enumerate(segments):
+        marker = LITERAL_PATTERN.search(text.rstrip())
+        if marker:
+            text = text.rstrip()[:marker.start()]
+        position = 0
+        while position < len(text):
+            match = TOKEN_PATTERN.match(text, position)
+            if not match or match.end() == position:
+                break
+            position = match.end()
+            opening, closing, quoted, atom = match.groups()
+            if opening:
+                yield "("
+            elif closing:
+                yield ")"
+            elif quoted is not None:
+                yield re.sub(rb"\\(.)", rb"\1", quoted)
+            elif atom is not None:
+                yield None if atom.upper() == b"NIL" else atom
+        if marker and index < len(literals) and literals[index] is not None:
+            yield _Literal(literals[index])
+
+
+def _nest(tokens: Iterator[object]) -> list:
+    stack = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) > 1:
+                finished = stack.pop()
+                stack[-1].append(finished)
+        else:
+            stack[-1].append(token)
+    while len(stack) > 1:  # tolerate a missing closing parenthesis
+        finished = stack.pop()
+        stack[-1].append(finished)
+    return stack[0]
+
+
+def iter_fetch_items(msg_data) -> Iterator[Dict[str, object]]:
+    """
+    Parses an imaplib FETCH response into one dict per message, mapping data item names
+    (b"UID", b"BODYSTRUCTURE", b"BODY[HEADER]", b"BODY[1.2]", ...) to their values. Lists
+    become nested Python lists, NIL becomes None and literals are returned as bytes.
+    """
+    messages: List[Tuple[List[bytes], List[bytes]]] = []
+    for item in msg_data:
+        text, literal = (item[0], item[1]) if isinstance(item, tuple) else (item, None)
+        if not isinstance(text, bytes):
+            continue
+        if FETCH_START_PATTERN.match(text) or not messages:
+            messages.append(([], []))
+        segments, literals = messages[-1]
+        segments.append(text)
+        literals.append(literal)
+
+    for segments, literals in messages:
+        parsed = _nest(_tokenize(segments, literals))
+        # parsed = [b"<seq>", [name, value, name, value, ...]]
+        values = next((entry for entry in parsed if isinstance(entry, list)), [])
+        items = {}
+        for position in range(0, len(values) - 1, 2):
+            name = values[position]
+            if isinstance(name, bytes):
+                items[bytes(name).upper()] = values[position + 1]
+        yield items
+
+
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    return bytes(value).decode("utf-8", errors="replace")
+
+
+def _params(value) -> Dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {(_text(value[i]) or "").lower(): _text(value[i + 1]) or "" for i in range(0, len(value) - 1, 2)}
+
+
+def _disposition(value) -> Tuple[Optional[str], Dict[str, str]]:
+    # body-fld-dsp: ("attachment" ("filename" "invoice.pdf")) or NIL
+    if isinstance(value, list) and value and isinstance(value[0], bytes):
+        return (_text(value[0]) or "").lower(), _params(value[1] if len(value) > 1 else None)
+    return None, {}
+
+
+def parse_bodystructure(structure: list, prefix: str = "") -> List[Dict[str, object]]:
+    """
+    Flattens a parsed BODYSTRUCTURE into its leaf MIME parts with IMAP part numbers
+    ("1", "1.2", ...) for BODY.PEEK[<part>]. Attached messages (message/rfc822) are kept
+    as single leaves.
+
+    Returns:
+        List[dict]: {"part", "content_type", "charset", "encoding", "size", "disposition", "filename"}
+    """
+    if not isinstance(structure, list) or not structure:
+        return []
+
+    if isinstance(structure[0], list):  # multipart: child bodies, then the subtype
+        parts = []
+        children = []
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            children.append(child)
+        for number, child in enumerate(children, start=1):
+            parts.extend(parse_bodystructure(child, f"{prefix}.{number}" if prefix else str(number)))
+        return parts
+
+    main_type = (_text(structure[0]) or "text").lower()
+    sub_type = (_text(structure[1]) or "plain").lower() if len(structure) > 1 else "plain"
+    params = _params(structure[2]) if len(structure) > 2 else {}
+    encoding = (_text(structure[5]) or "7bit").lower() if len(structure) > 5 else "7bit"
+    try:
+        size = int(structure[6]) if len(structure) > 6 and structure[6] is not None else 0
+    except (TypeError, ValueError):
+        size = 0
+
+    # Extension data (MD5, disposition, language, location) follows the basic fields:
+    # text parts have a line count, message/rfc822 has envelope, body and line count.
+    basic_fields = 8 if main_type == "text" else 10 if (main_type, sub_type) == ("message", "rfc822") else 7
+    disposition_index = basic_fields + 1
+    disposition, disposition_params = _disposition(structure[disposition_index] if len(structure) > disposition_index else None)
+    filename = disposition_params.get("filename") or params.get("name")
+
+    return [{
+        "part": prefix or "1",
+        "content_type": f"{main_type}/{sub_type}",
+        "charset": params.get("charset"),
+        "encoding": encoding,
+        "size": size,
+        "disposition": disposition,
+        "filename": filename
+    }]
+
+
+def is_attachment(part: Dict[str, object]) -> bool:
+    """Anything that is not an inline text/plain or text/html part (those make up the body)."""
+    return part.get("disposition") == "attachment" or part.get("content_type") not in ("text/plain", "text/html")
+
+
+def select_text_parts(parts: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """
+    Picks the parts needed for the body, mirroring extract_email_body: every inline
+    text/plain part, or the text/html parts when there is no text/plain.
+    """
+    inline = [part for part in parts if part.get("disposition") != "attachment"]
+    plain = [part for part in inline if part["content_type"] == "text/plain"]
+    return plain or [part for part in inline if part["content_type"] == "text/html"]
\ No newline at end of file
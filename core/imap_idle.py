@@ -0,0 +1,112 @@
+import imaplib
+import itertools
+import re
+import select
+import threading
+import time
+from typing import Optional
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Untagged responses that mean the mailbox gained messages
+NEW_MAIL_PATTERN = re.compile(rb"^\* \d+ (EXISTS|RECENT)")
+
+_idle_tags = itertools.count(1)
+
+
+def supports_idle(mail) -> bool:
+    return "IDLE" in getattr(mail, "capabilities", ())
+
+
+def _stopped(stop_event: Optional[threading.Event]) -> bool:
+    return stop_event is not None and stop_event.is_set()
+
+
+def _readable(mail, timeout: float) -> bool:
+    sock = mail.sock
+    pending = getattr(sock, "pending", None)  # bytes already decrypted by the SSL layer
+    if pending and pending():
+        return True
+    readable, _, _ = select.select([sock], [], [], timeout)
+    return bool(readable)
+
+
+def idle_wait(mail, timeout: float, stop_event: Optional[threading.Event] = None) -> bool:
+    """
+    Runs one IMAP IDLE (RFC 2177) cycle on a selected mailbox. imaplib has no IDLE support
+    before Python 3.14, so the command is written to the connection directly and the
+    untagged responses are read until new mail is announced, `timeout` passes or
+    `stop_event` is set; DONE then ends the command.
+
+    Servers drop IDLE after about 30 minutes, so `timeout` should stay below that. Any data
+    the server sends in the same packet as the "+ idling" continuation is only noticed when
+    the cycle ends, which is another reason to keep cycles to a few minutes.
+
+    Returns:
+        bool: True if the server reported new messages (EXISTS/RECENT).
+    """
+    tag = f"IDLE{next(_idle_tags)}".encode()
+    mail.send(tag + b" IDLE\r\n")
+    line = mail.readline()
+    if not line.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip()!r}")
+
+    new_mail = False
+    deadline = time.monotonic() + timeout
+    while not new_mail and not _stopped(stop_event):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if not _readable(mail, min(1.0, remaining)):
+            continue
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed during IDLE")
+        if line.startswith(b"* BYE"):
+            raise imaplib.IMAP4.abort(f"Server ended the session during IDLE: {line.strip()!r}")
+        if NEW_MAIL_PATTERN.match(line):
+            new_mail = True
+
+    mail.send(b"DONE\r\n")
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+        if line.startswith(tag + b" "):
+            if not line[len(tag) + 1:].startswith(b"OK"):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line.strip()!r}")
+            return new_mail
+        if NEW_MAIL_PATTERN.match(line):
+            new_mail = True
+
+
+def noop_wait(mail, interval: float, stop_event: Optional[threading.Event] = None) -> bool:
+    """
+    Polling fallback for servers without IDLE: waits `interval` seconds, then sends NOOP,
+    which keeps the session alive, surfaces a dropped connection and returns any pending
+    EXISTS updates.
+
+    Returns:
+        bool: True if the NOOP response reported new messages.
+    """
+    deadline = time.monotonic() + interval
+    while not _stopped(stop_event) and time.monotonic() < deadline:
+        time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+    if _stopped(stop_event):
+        return False
+    status, data = mail.noop()
+    if status != 'OK':
+        raise imaplib.IMAP4.abort(f"NOOP failed: {data}")
+    return bool(mail.untagged_responses.pop("EXISTS", None))
+
+
+def wait_for_new_mail(mail, idle_timeout: float, poll_interval: float, stop_event: Optional[threading.Event] = None) -> bool:
+    """
+    Blocks until the selected mailbox may have new mail, using IDLE when the server
+    advertises it and NOOP polling otherwise. A False return just means the wait timed
+    out; callers should poll the mailbox either way.
+    """
+    if supports_idle(mail):
+        return idle_wait(mail, idle_timeout, stop_event)
+    return noop_wait(mail, poll_interval, stop_event)
\ No newline at end of file
@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional
+from config import IMAP_SYNC_STATE_PATH
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Response codes sent with SELECT/EXAMINE, e.g. "* OK [UIDNEXT 201] Predicted next UID"
+SELECT_RESPONSE_CODES = ("UIDVALIDITY", "UIDNEXT", "HIGHESTMODSEQ")
+
+_state_lock = threading.Lock()
+
+
+def sync_key(email_address: str, mailbox: str) -> str:
+    return f"{(email_address or '').lower()}:{mailbox.lower()}"
+
+
+def _read_all(path: Path) -> Dict[str, dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read IMAP sync state from {path} ({e}); starting with a full resync.")
+        return {}
+
+
+def load_sync_state(key: str, path: str = IMAP_SYNC_STATE_PATH) -> Optional[dict]:
+    """
+    Returns the persisted sync position for a mailbox:
+    {"uidvalidity": int, "last_uid": int, "highestmodseq": int or None}, or None if it was never synced.
+    """
+    with _state_lock:
+        return _read_all(Path(path)).get(key)
+
+
+def save_sync_state(key: str, state: dict, path: str = IMAP_SYNC_STATE_PATH) -> None:
+    """Persists the sync position for a mailbox. The file is replaced atomically."""
+    path = Path(path)
+    with _state_lock:
+        states = _read_all(path)
+        states[key] = state
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(states, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+def selected_mailbox_info(mail) -> Dict[str, int]:
+    """
+    Reads UIDVALIDITY, UIDNEXT and HIGHESTMODSEQ from the response codes the server sent
+    with SELECT/EXAMINE, which imaplib keeps in mail.untagged_responses, e.g.
+    {"UIDVALIDITY": [b'7'], "UIDNEXT": [b'201']} -> {"UIDVALIDITY": 7, "UIDNEXT": 201}.
+    The entries are left in place, so later polls on the same connection still see them.
+    """
+    items = {}
+    for name in SELECT_RESPONSE_CODES:
+        values = getattr(mail, "untagged_responses", {}).get(name) or []
+        try:
+            items[name] = int(values[-1])
+        except (IndexError, TypeError, ValueError):
+            continue
+    return items
+
+
+class SyncStateFile:
+    """The default sync store: load_sync_state/save_sync_state on the JSON file at `path`."""
+
+    def __init__(self, path: str = IMAP_SYNC_STATE_PATH):
+        self.path = path
+
+    def load(self, key: str) -> Optional[dict]:
+        return load_sync_state(key, self.path)
+
+    def save(self, key: str, state: dict) -> None:
+        save_sync_state(key, state, self.path)
+
+
+class DeferredSyncState:
+    """
+    Sync store for callers that process fetched emails later (daemon.py queues them).
+    save() only holds the new position; it is written to `store` once every email fetched
+    up to it has been marked done(), so a crash or restart fetches queued-but-unprocessed
+    emails again instead of skipping them. load() returns the newest held position, so
+    the next poll continues after the queued emails rather than fetching them twice.
+
+    After each fetch, call track() with the fetched UIDs (also when there were none), then
+    done() for each UID once it is processed and recorded.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or SyncStateFile()
+        self._lock = threading.Lock()
+        self._latest = {}  # key -> newest held state
+        self._held = deque()  # (key, state) not yet written, in fetch order
+        self._pending = {}  # key -> UIDs fetched but not done
+
+    def load(self, key: str) -> Optional[dict]:
+        with self._lock:
+            if key in self._latest:
+                return self._latest[key]
+        return self.store.load(key)
+
+    def save(self, key: str, state: dict) -> None:
+        with self._lock:
+            self._latest[key] = state
+            self._held.append((key, state))
+
+    def track(self, key: str, uids) -> None:
+        with self._lock:
+            self._pending.setdefault(key, set()).update(int(uid) for uid in uids)
+        self._write_ready()
+
+    def done(self, key: str, uid) -> None:
+        with self._lock:
+            self._pending.get(key, set()).discard(int(uid))
+        self._write_ready()
+
+    def _write_ready(self) -> None:
+        with self._lock:
+            while self._held:
+                key, state = self._held[0]
+                if any(uid <= state["last_uid"] for uid in self._pending.get(key, ())):
+                    return
+                self.store.save(key, state)
+                self._held.popleft()
+                if not any(held_key == key for held_key, _ in self._held):
+                    del self._latest[key]
\ No newline at end of file
@@ -0,0 +1,179 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict
+from config import (
+    OUTBOUND_QUEUE_SIZE, OUTBOUND_WORKERS, OUTBOUND_MAX_ATTEMPTS,
+    OUTBOUND_RETRY_BASE_SECONDS, OUTBOUND_RETRY_MAX_SECONDS, OUTBOUND_SPOOL_DIR
+)
+from core.email_sender import send_email, send_draft_to_gmail
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_STOP = object()
+
+
+def send_job(job: dict) -> bool:
+    """
+    Sends one outbound job: {"kind": "draft" or "reply", "email": {"subject", "response", "from"},
+    "user_name": str, "draft_address": str}. Returns True if the SMTP send succeeded.
+    """
+    if job["kind"] == "draft":
+        return send_draft_to_gmail(job["email"], job["user_name"], job["draft_address"])
+    return send_email(job["email"], job["user_name"])
+
+
+def job_status(job: dict, sent: bool) -> str:
+    """The 'Response Status' recorded for a job once it is sent or has given up."""
+    if job["kind"] == "draft":
+        return "Drafted" if sent else "Draft Failed"
+    return "Sent Directly" if sent else "Send Failed"
+
+
+class OutboundQueue:
+    """
+    Sends replies and drafts on background threads, so the LLM workflow never waits on SMTP.
+
+    Each submitted job is first written to the spool directory (one JSON file per job,
+    replaced atomically) and only removed once its final status has been recorded. Jobs
+    left in the spool by a crash or an early stop are sent again by the next start(), so
+    delivery is at-least-once: a crash between the SMTP send and writing its status to the
+    spool repeats that one message.
+
+    Failed sends are retried up to `max_attempts` times with jittered exponential backoff;
+    `on_done(job, status)` is then called on the sender thread with the final status
+    (job_status), e.g. to write the email's record.
+    """
+
+    def __init__(self, on_done: Callable[[dict, str], None], send: Callable[[dict], bool] = send_job,
+                 spool_dir: str = OUTBOUND_SPOOL_DIR, maxsize: int = OUTBOUND_QUEUE_SIZE,
+                 workers: int = OUTBOUND_WORKERS, max_attempts: int = OUTBOUND_MAX_ATTEMPTS,
+                 retry_base_seconds: float = OUTBOUND_RETRY_BASE_SECONDS,
+                 retry_max_seconds: float = OUTBOUND_RETRY_MAX_SECONDS):
+        self.on_done = on_done
+        self.send = send
+        self.spool_dir = Path(spool_dir)
+        self.jobs = queue.Queue(maxsize=max(1, maxsize))
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.stop_event = threading.Event()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self._stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "recovered": 0}
+
+    def start(self) -> "OutboundQueue":
+        """Starts the sender threads and re-queues any jobs left in the spool by an earlier run."""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbound-sender-{number + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for path in sorted(self.spool_dir.glob("*.json")):
+            try:
+                job = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Could not read spooled outbound job {path}: {e}")
+                continue
+            self._count("recovered")
+            self.jobs.put(job)
+        recovered = self.get_stats()["recovered"]
+        if recovered:
+            logger.info(f"Re-queued {recovered} outbound emails left in {self.spool_dir} by an earlier run.")
+        return self
+
+    def submit(self, job: dict) -> None:
+        """Spools a job and queues it for sending; blocks while the queue is full."""
+        job = dict(job, id=job.get("id") or f"{time.time_ns()}-{uuid.uuid4().hex[:8]}", attempts=0)
+        self._spool(job)
+        self._count("queued")
+        self.jobs.put(job)
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Stops the senders. With wait=True every queued job is finished first; otherwise only
+        the jobs in progress complete and the rest stay in the spool for the next start().
+        """
+        if wait:
+            self.jobs.join()
+        else:
+            self.stop_event.set()
+        for _ in self._threads:
+            self.jobs.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats, pending=self.jobs.qsize())
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def _spool_path(self, job: dict) -> Path:
+        return self.spool_dir / f"{job['id']}.json"
+
+    def _spool(self, job: dict) -> None:
+        path = self._spool_path(job)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _run(self) -> None:
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is _STOP:
+                    return
+                if not self.stop_event.is_set():
+                    self._deliver(job)
+            except Exception as e:
+                logger.critical(f"Unexpected error in the outbound sender for job {job.get('id')}: {e}", exc_info=True)
+            finally:
+                self.jobs.task_done()
+
+    def _deliver(self, job: dict) -> None:
+        if "status" in job:  # sent by an earlier run that stopped before recording the status
+            self._finish(job)
+            return
+        sent = False
+        while True:
+            job["attempts"] += 1
+            try:
+                sent = self.send(job)
+            except Exception as e:
+                logger.error(f"Outbound job {job['id']} raised: {e}", exc_info=True)
+            if sent or job["attempts"] >= self.max_attempts:
+                break
+            delay = min(self.retry_base_seconds * 2 ** (job["attempts"] - 1), self.retry_max_seconds) * random.uniform(0.5, 1.0)
+            logger.warning(f"Outbound job {job['id']} failed (attempt {job['attempts']} of {self.max_attempts}); retrying in {delay:.1f}s.")
+            self._count("retries")
+            self._spool(job)
+            if self.stop_event.wait(delay):
+                return  # stopping: the job stays in the spool
+
+        self._count("sent" if sent else "failed")
+        job["status"] = job_status(job, sent)
+        self._spool(job)
+        self._finish(job)
+
+    def _finish(self, job: dict) -> None:
+        try:
+            self.on_done(job, job["status"])
+        except Exception as e:
+            logger.error(f"Could not record the status of outbound job {job['id']}: {e}", exc_info=True)
+            return  # keep the spool file so the status is recorded on the next run
+        try:
+            self._spool_path(job).unlink()
+        except FileNotFoundError:
+            pass
\ No newline at end of file
@@ -0,0 +1,110 @@
+import atexit
+import itertools
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config import PARSE_WORKERS, PARSE_CHUNK_SIZE, PARSE_INLINE_MAX
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# The pool is first started from the prefetch thread while worker, flusher and IMAP threads are running;
+# forking then could copy a lock another thread holds (logging, sqlite3), so workers come from a forkserver.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_executors: Dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """Returns the shared process pool with `workers` processes, so repeated fetches don't pay for process start-up."""
+    with _executors_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD))
+            logger.debug(f"Started a MIME parsing pool with {workers} processes.")
+        return executor
+
+
+def _discard_executor(workers: int, executor: ProcessPoolExecutor) -> None:
+    with _executors_lock:
+        if _executors.get(workers) is executor:
+            del _executors[workers]
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_executors() -> None:
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_batch(parse: Callable[[bytes, str], dict], messages: List[Tuple[str, bytes]]) -> List[Optional[dict]]:
+    """Runs `parse(raw_bytes, id)` over (id, raw bytes) pairs in a worker process. Unparseable messages become None."""
+    emails = []
+    for email_id, raw_email in messages:
+        try:
+            emails.append(parse(raw_email, email_id))
+        except Exception as e:
+            logger.error(f"Error parsing email {email_id}: {e}", exc_info=True)
+            emails.append(None)
+    return emails
+
+
+def parse_messages(messages: Iterable[Tuple[str, bytes]], parse: Callable[[bytes, str], dict],
+                   workers: int = PARSE_WORKERS, chunk_size: int = PARSE_CHUNK_SIZE,
+                   inline_max: int = PARSE_INLINE_MAX) -> Iterator[Optional[dict]]:
+    """
+    Parses raw RFC822 messages in a process pool and yields the results in input order.
+
+    `messages` is consumed lazily in batches of `chunk_size`, and each batch is handed to a
+    worker as soon as it is complete, so a source that reads from the network keeps reading
+    while earlier batches are parsed. Finished batches at the head are yielded as soon as
+    they are ready; the source is only paused once 2 * `workers` batches are in flight.
+
+    A source that ends within its first `inline_max` messages is parsed inline: the IPC (and,
+    on first use, the pool start-up) would cost more than parallel parsing saves.
+
+    Arguments:
+        messages: (id, raw bytes) pairs.
+        parse: A module-level function (it is pickled by name), e.g. core.email_imap.parse_email_message.
+        workers (int): Parser processes; 1 parses inline on the calling thread.
+        chunk_size (int): Messages per batch. Larger batches cost less IPC, smaller ones return sooner.
+        inline_max (int): Sources shorter than this are parsed inline.
+
+    Yields:
+        dict or None: One result per message; None where parsing failed (already logged).
+    """
+    messages = iter(messages)
+    head = list(itertools.islice(messages, max(0, inline_max))) if workers > 1 else []
+    if len(head) < inline_max:
+        workers = 1  # the whole source is already in hand and small
+    messages = itertools.chain(head, messages)
+    batches = iter(lambda: list(itertools.islice(messages, max(1, chunk_size))), [])
+    if workers <= 1:
+        for batch in batches:
+            yield from parse_batch(parse, batch)
+        return
+
+    executor = get_executor(workers)
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(parse_batch, parse, batch))
+            while pending and (pending[0].done() or len(pending) >= 2 * workers):
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        logger.error("A MIME parsing process died; the pool will be restarted on next use.")
+        _discard_executor(workers, executor)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
\ No newline at end of file
@@ -0,0 +1,177 @@
+import atexit
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Callable, Dict
+from config import (
+    EMAIL_SERVER, EMAIL_PORT, EMAIL_USERNAME, EMAIL_PASSWORD,
+    SMTP_POOL_SIZE, SMTP_MAX_MESSAGES_PER_SESSION, SMTP_IDLE_TIMEOUT_SECONDS,
+    SMTP_NOOP_AFTER_SECONDS, SMTP_TIMEOUT_SECONDS
+)
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Authenticated SMTP sessions are kept open and reused across messages, so the TCP, STARTTLS
+# and LOGIN handshakes are paid once per session instead of once per email. At most
+# SMTP_POOL_SIZE sessions exist at a time; worker threads wait for a free one.
+
+
+class _Session:
+    __slots__ = ("smtp", "messages_sent", "last_used")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+def _default_factory():
+    server = smtplib.SMTP(EMAIL_SERVER, int(EMAIL_PORT), timeout=SMTP_TIMEOUT_SECONDS)
+    try:
+        server.starttls()
+        server.login(EMAIL_USERNAME, EMAIL_PASSWORD)
+    except Exception:
+        _close(server)
+        raise
+    return server
+
+
+_factory: Callable[[], smtplib.SMTP] = _default_factory
+_idle = deque()  # sessions ready for reuse, most recently used last
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, SMTP_POOL_SIZE))
+_stats = {"connections": 0, "sent": 0, "reused": 0, "reconnects": 0, "retired": 0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] += 1
+
+
+def _close(server) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+def _alive(server) -> bool:
+    try:
+        return server.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def _session_lost(error: Exception) -> bool:
+    """True if the error means the connection is gone (dropped, timed out or closed by a 421), not that the message was refused."""
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return isinstance(error, (smtplib.SMTPServerDisconnected, OSError))
+
+
+def _checkout() -> _Session:
+    """Takes an idle session that is still usable, or logs in a new one."""
+    while True:
+        with _lock:
+            session = _idle.pop() if _idle else None
+        if session is None:
+            break
+        idle_for = time.monotonic() - session.last_used
+        if idle_for > SMTP_IDLE_TIMEOUT_SECONDS:
+            _close(session.smtp)
+            continue
+        if idle_for > SMTP_NOOP_AFTER_SECONDS and not _alive(session.smtp):
+            logger.debug(f"Idle SMTP session failed NOOP after {idle_for:.0f}s; opening a new one.")
+            _close(session.smtp)
+            _count("reconnects")
+            continue
+        _count("reused")
+        return session
+
+    logger.debug(f"Opening SMTP session to {EMAIL_SERVER}:{EMAIL_PORT}")
+    session = _Session(_factory())
+    _count("connections")
+    return session
+
+
+def _checkin(session: _Session, reusable: bool) -> None:
+    if reusable and session.messages_sent < SMTP_MAX_MESSAGES_PER_SESSION:
+        session.last_used = time.monotonic()
+        with _lock:
+            _idle.append(session)
+        return
+    if reusable:
+        logger.debug(f"SMTP session reached {session.messages_sent} messages; closing it.")
+        _count("retired")
+    _close(session.smtp)
+
+
+def send_message(msg: EmailMessage) -> None:
+    """
+    Sends a message over a pooled SMTP session. Safe to call from concurrent worker threads.
+
+    Sessions idle for more than SMTP_NOOP_AFTER_SECONDS are checked with NOOP before reuse
+    and replaced if the server dropped them; a session is closed after
+    SMTP_MAX_MESSAGES_PER_SESSION messages. If the connection is lost during the send
+    (disconnect, timeout, 421), the message is retried once on a fresh session.
+
+    Raises:
+        smtplib.SMTPException or OSError: If the message could not be sent.
+    """
+    with _slots:
+        for attempt in (1, 2):
+            session = _checkout()
+            try:
+                session.smtp.send_message(msg)
+            except Exception as e:
+                lost = _session_lost(e)
+                # smtplib resets the transaction after a refused recipient or DATA, so the session stays usable
+                _checkin(session, reusable=not lost and isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException)))
+                if lost and attempt == 1:
+                    logger.info(f"SMTP session lost while sending ({e}); retrying on a new session.")
+                    _count("reconnects")
+                    continue
+                raise
+            session.messages_sent += 1
+            _count("sent")
+            _checkin(session, reusable=True)
+            return
+
+
+@atexit.register
+def close_smtp_pool() -> None:
+    """Closes every idle session (QUIT). Sessions in use are closed when they are returned."""
+    with _lock:
+        sessions = list(_idle)
+        _idle.clear()
+    for session in sessions:
+        _close(session.smtp)
+
+
+def get_smtp_pool_stats() -> Dict[str, int]:
+    """
+    Returns SMTP session counts: connections opened, messages sent, sends that reused an open
+    session, sessions replaced after a dropped connection, and sessions closed at the message limit.
+    """
+    with _lock:
+        return dict(_stats, idle_sessions=len(_idle))
+
+
+def set_connection_factory(factory: Callable[[], smtplib.SMTP] = None) -> None:
+    """
+    Replaces the function that opens an authenticated SMTP session, closes the pool and resets
+    the stats. Passing None restores the default (smtplib.SMTP + STARTTLS + LOGIN); used by
+    harnesses that run against a stand-in server.
+    """
+    global _factory
+    close_smtp_pool()
+    with _lock:
+        _factory = factory or _default_factory
+        for name in _stats:
+            _stats[name] = 0
\ No newline at end of file
@@ -13,6 +13,10 @@ class EmailState:
     current_email: Dict[str, Any] = field(default_factory=dict) # The email currently being processed
     current_email_id: Optional[str] = None # Added for convenience and clarity
 
+    # Per-email values used by the response node (passed through state so the compiled graph can be reused)
+    your_name: Optional[str] = None # Signature name for the generated reply
+    recipient_name: Optional[str] = None # Name used to greet the original sender
+
     # Fields to store outputs from agents
     classification: Optional[str] = None   # Renamed from sentiment to classification for clarity
     summary: Optional[str] = None     # Summary from summarization_agent
@@ -23,5 +27,6 @@ class EmailState:
 
     # Flags for human review and sending status
     requires_human_review: bool = False
+    duplicate_of: Optional[str] = None # Email ID this email exactly duplicates (core/dedup_index.py); it is not processed again
     # Removed: response_sent: bool = False (Handled by response_status_action string in main.py logging)
     # Removed: response_drafted: bool = False (Handled by response_status_action string in main.py logging)
\ No newline at end of file
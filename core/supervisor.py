@@ -1,17 +1,57 @@
 from langgraph.graph import START, END, StateGraph
-from agents import filtering_agent, summarization_agent, response_agent, human_review_agent
+from agents import filtering_agent, summarization_agent, response_agent, human_review_agent, combined_agent, prefilter_agent
+from agents.rate_limiter import QuotaExceededError
+from core.dedup_index import check_duplicate, record_result
+from core.thread_index import attach_thread_context, update_thread_summary
 from core.state import EmailState
 from utils.logger import get_logger
-from functools import partial
+from utils.token_budget import pop_token_usage, usage_key
+from config import AGENT_PIPELINE_MODE, PREFILTER_ENABLED, FILTER_BATCH_SIZE, FILTER_BATCH_WAIT_SECONDS, DEDUP_ENABLED, THREAD_INDEX_ENABLED
 from datetime import datetime
+import threading
 
 logger = get_logger(__name__)
 
+# Compiled workflows keyed on their shape (node names + edges). Compiling is
+# far more expensive than invoking, so each shape is only built once per process.
+_COMPILED_WORKFLOWS = {}
+_COMPILED_WORKFLOWS_LOCK = threading.Lock()
+
+# Classifications for which no summary/response is produced and the workflow ends early
+SKIPPED_CLASSIFICATIONS = ["spam", "promotional", "auto_reply"]
+
 # --- LangGraph Nodes ---
 
+def prefilter_node(state: EmailState) -> EmailState:
+    """Local header/keyword pre-filter; confidently spam/bulk/auto-reply emails never reach Gemini."""
+    email_data = state.current_email
+    email_id = email_data.get('id', 'N/A')
+    state.metadata[email_id] = state.metadata.get(email_id, {})
+    if not PREFILTER_ENABLED or state.classification:
+        return state
+    try:
+        # Emails already checked by classify_batch are not counted in the pre-filter stats again
+        checked = (email_data.get("prefilter") or {}).get("counted", False)
+        result = prefilter_agent.prefilter_email(email_data, record_stats=not checked)
+        state.metadata[email_id]["prefilter"] = result
+        if result["label"]:
+            logger.info(f"[Pre-filter] Email ID {email_id} classified as {result['label']} "
+                        f"(confidence {result['confidence']:.2f}: {result['reason']}). Skipping LLM.")
+            state.classification = result["label"]
+            state.metadata[email_id]["classification"] = result["label"]
+    except Exception as e:
+        # The pre-filter is an optimization only; on failure the email simply goes to the LLM classifier.
+        logger.warning(f"[Pre-filter] Error for email ID {email_id}: {e}", exc_info=True)
+    return state
+
 def filter_node(state: EmailState) -> EmailState:
     email_data = state.current_email
     email_id = email_data.get('id', 'N/A')
+    if state.classification:
+        logger.info(f"[Filtering] Using batch classification for ID {email_id}: {state.classification}")
+        state.metadata[email_id] = state.metadata.get(email_id, {})
+        state.metadata[email_id]["classification"] = state.classification
+        return state
     logger.info(f"[Filtering] Started for email ID: {email_id}")
     try:
         classification = filtering_agent.filter_email(email_data)
@@ -33,9 +73,12 @@ def summarize_node(state: EmailState) -> EmailState:
     email_id = email_data.get('id', 'N/A')
     logger.info(f"[Summarization] Started for email ID: {email_id}")
     try:
-        if state.classification == "spam" or state.processing_error:
+        if state.classification in SKIPPED_CLASSIFICATIONS or state.processing_error:
             state.summary = "Summary skipped due to classification or previous error."
             logger.info(f"[Summarization] Skipped for email ID: {email_id}")
+        elif state.summary:
+            logger.info(f"[Summarization] Reusing the summary of a near-duplicate for email ID: {email_id}")
+            state.metadata[email_id]["summary"] = state.summary
         else:
             summary = summarization_agent.summarize_email(email_data)
             logger.info(f"[Summarization] Completed for ID: {email_id}")
@@ -49,13 +92,39 @@ def summarize_node(state: EmailState) -> EmailState:
         state.processing_error = f"Summarization failed: {str(e)}"
     return state
 
-def respond_node(state: EmailState, your_name: str, recipient_name: str) -> EmailState:
+def classify_summarize_node(state: EmailState) -> EmailState:
+    """Fused workflow: classification and summary from a single Gemini call."""
+    email_data = state.current_email
+    email_id = email_data.get('id', 'N/A')
+    state.metadata[email_id] = state.metadata.get(email_id, {})
+    if state.classification and state.summary:
+        logger.info(f"[Classify+Summarize] Reusing the results of a near-duplicate for email ID: {email_id}")
+        return state
+    logger.info(f"[Classify+Summarize] Started for email ID: {email_id}")
+    try:
+        result = combined_agent.classify_and_summarize(email_data)
+        state.classification = result["classification"]
+        state.summary = result["summary"]
+        state.metadata[email_id]["classification"] = state.classification
+        state.metadata[email_id]["summary"] = state.summary
+        state.processing_error = None
+        logger.info(f"[Classify+Summarize] Completed for ID {email_id} with classification: {state.classification}")
+    except Exception as e:
+        logger.error(f"[Classify+Summarize] Error for email ID {email_id}: {e}", exc_info=True)
+        state.classification = "unknown"
+        state.metadata[email_id]["classification"] = "error_during_filtering"
+        state.processing_error = f"Classification/summarization failed: {str(e)}"
+    return state
+
+def respond_node(state: EmailState) -> EmailState:
     email_data = state.current_email
     email_id = email_data.get('id', 'N/A')
     email_summary = state.summary
+    your_name = state.your_name
+    recipient_name = state.recipient_name
     logger.info(f"[Response] Started for email ID: {email_id}")
 
-    if state.classification in ["spam", "promotional"] or state.processing_error:
+    if state.classification in SKIPPED_CLASSIFICATIONS or state.processing_error:
         state.generated_response_body = "Not applicable. Email skipped or failed previous step."
         state.metadata[email_id]["response_status"] = "skipped"
         logger.info(f"[Response] Skipped for email ID {email_id} due to classification or previous error.")
@@ -75,7 +144,7 @@ def respond_node(state: EmailState, your_name: str, recipient_name: str) -> Emai
 
         requires_review = (
             state.classification == "needs_review" or
-            ("?" in response_text and state.classification != "spam")
+            ("?" in response_text and state.classification not in SKIPPED_CLASSIFICATIONS)
         )
         state.requires_human_review = requires_review
 
@@ -104,8 +173,13 @@ def respond_node(state: EmailState, your_name: str, recipient_name: str) -> Emai
 
 # --- Routing Logic ---
 
+def route_after_prefilter(state: EmailState) -> str:
+    if state.classification in SKIPPED_CLASSIFICATIONS:
+        return "end_workflow"
+    return "classify"
+
 def route_after_filtering(state: EmailState) -> str:
-    if state.classification in ["spam", "promotional"]:
+    if state.classification in SKIPPED_CLASSIFICATIONS:
         logger.info(f"[Supervisor] Email ID {state.current_email_id} classified as {state.classification}. Ending workflow.")
         return "end_workflow"
     elif state.processing_error:
@@ -116,25 +190,38 @@ def route_after_filtering(state: EmailState) -> str:
 
 # --- Supervisor LangGraph ---
 
-def supervisor_langgraph(selected_email: dict, your_name: str, recipient_name: str) -> EmailState:
-    email_id = selected_email.get("id", "N/A")
-
-    initial_state = EmailState(
-        current_email=selected_email,
-        current_email_id=email_id,
-        emails=[selected_email],
-        metadata={email_id: {}}
-    )
+STANDARD_WORKFLOW_SHAPE = (
+    ("nodes", ("prefilter", "filter", "summarize", "respond")),
+    ("entry", "prefilter"),
+    ("conditional", "prefilter", (("classify", "filter"), ("end_workflow", END))),
+    ("conditional", "filter", (("summarize", "summarize"), ("end_workflow", END))),
+    ("edge", "summarize", "respond"),
+    ("edge", "respond", END),
+)
 
+def build_workflow() -> StateGraph:
+    """
+    Builds the (uncompiled) email processing StateGraph.
+    Per-email values such as your_name/recipient_name are read from the state,
+    so the same graph can serve every email.
+    """
     workflow = StateGraph(EmailState)
 
+    workflow.add_node("prefilter", prefilter_node)
     workflow.add_node("filter", filter_node)
     workflow.add_node("summarize", summarize_node)
+    workflow.add_node("respond", respond_node)
 
-    respond_partial_node = partial(respond_node, your_name=your_name, recipient_name=recipient_name)
-    workflow.add_node("respond", respond_partial_node)
+    workflow.set_entry_point("prefilter")
 
-    workflow.set_entry_point("filter")
+    workflow.add_conditional_edges(
+        "prefilter",
+        route_after_prefilter,
+        {
+            "classify": "filter",
+            "end_workflow": END
+        }
+    )
 
     workflow.add_conditional_edges(
         "filter",
@@ -147,7 +234,208 @@ def supervisor_langgraph(selected_email: dict, your_name: str, recipient_name: s
     workflow.add_edge("summarize", "respond")
     workflow.add_edge("respond", END)
 
-    app = workflow.compile()
+    return workflow
+
+FUSED_WORKFLOW_SHAPE = (
+    ("nodes", ("prefilter", "classify_summarize", "respond")),
+    ("entry", "prefilter"),
+    ("conditional", "prefilter", (("classify", "classify_summarize"), ("end_workflow", END))),
+    ("conditional", "classify_summarize", (("summarize", "respond"), ("end_workflow", END))),
+    ("edge", "respond", END),
+)
+
+def build_fused_workflow() -> StateGraph:
+    """
+    Builds the fused variant: one combined classify+summarize call, then the response.
+    Saves a Gemini round-trip (and the repeated subject/body input) per email.
+    """
+    workflow = StateGraph(EmailState)
+
+    workflow.add_node("prefilter", prefilter_node)
+    workflow.add_node("classify_summarize", classify_summarize_node)
+    workflow.add_node("respond", respond_node)
+
+    workflow.set_entry_point("prefilter")
+
+    workflow.add_conditional_edges(
+        "prefilter",
+        route_after_prefilter,
+        {
+            "classify": "classify_summarize",
+            "end_workflow": END
+        }
+    )
+
+    workflow.add_conditional_edges(
+        "classify_summarize",
+        route_after_filtering,
+        {
+            "summarize": "respond",
+            "end_workflow": END
+        }
+    )
+    workflow.add_edge("respond", END)
+
+    return workflow
+
+WORKFLOW_VARIANTS = {
+    "standard": (STANDARD_WORKFLOW_SHAPE, build_workflow),
+    "fused": (FUSED_WORKFLOW_SHAPE, build_fused_workflow),
+}
+
+def get_compiled_workflow(shape=STANDARD_WORKFLOW_SHAPE, builder=build_workflow):
+    """
+    Returns the compiled workflow for the given shape, compiling it on first use.
+
+    Arguments:
+        shape (tuple): Hashable description of the workflow layout, used as the cache key.
+        builder (callable): Function returning the uncompiled StateGraph for this shape.
+
+    Returns:
+        CompiledStateGraph: The cached compiled workflow.
+    """
+    app = _COMPILED_WORKFLOWS.get(shape)
+    if app is not None:
+        return app
+
+    with _COMPILED_WORKFLOWS_LOCK:
+        app = _COMPILED_WORKFLOWS.get(shape)
+        if app is None:
+            logger.info("[Supervisor] Compiling workflow graph (first use of this shape).")
+            app = builder().compile()
+            _COMPILED_WORKFLOWS[shape] = app
+    return app
+
+def clear_workflow_cache() -> None:
+    """Drops all cached compiled workflows (mainly useful for benchmarks)."""
+    with _COMPILED_WORKFLOWS_LOCK:
+        _COMPILED_WORKFLOWS.clear()
+
+def classify_batch(emails: list) -> list:
+    """
+    Classifies a whole fetched batch up front: the dedup index first (duplicates of recent
+    emails reuse their classification), then the local pre-filter, then one batched Gemini
+    classification for everything still unsettled. The returned labels can be passed to
+    supervisor_langgraph(classification=...) so the per-email graphs skip classification;
+    each email's dedup result is kept on it under "dedup" so it is not checked again.
+
+    Returns:
+        list: One classification per email (in input order).
+    """
+    labels = [None] * len(emails)
+    settled = set()
+    if DEDUP_ENABLED:
+        for index, email_data in enumerate(emails):
+            duplicate = email_data["dedup"] = check_duplicate(email_data)
+            if duplicate:
+                labels[index] = duplicate["classification"]
+                settled.add(index)
+
+    if PREFILTER_ENABLED:
+        for index, email_data in enumerate(emails):
+            if index in settled:
+                continue
+            try:
+                result = prefilter_agent.prefilter_email(email_data)
+                email_data["prefilter"] = dict(result, counted=True)
+                labels[index] = result["label"]
+            except Exception as e:
+                logger.warning(f"[Pre-filter] Error for email ID {email_data.get('id', 'N/A')}: {e}", exc_info=True)
+
+    pending = [index for index, label in enumerate(labels) if not label and index not in settled]
+    if pending:
+        logger.info(f"[Supervisor] Batch-classifying {len(pending)} emails.")
+        try:
+            batch_labels = filtering_agent.filter_emails_batch([emails[index] for index in pending])
+            for index, label in zip(pending, batch_labels):
+                labels[index] = label
+        except Exception as e:
+            # Leave them unclassified; each email's filter node will classify it individually.
+            logger.error(f"[Supervisor] Batch classification failed: {e}", exc_info=True)
+    return labels
+
+def classify_stream(emails, batch_size: int = FILTER_BATCH_SIZE, max_wait: float = FILTER_BATCH_WAIT_SECONDS):
+    """
+    Streaming counterpart of classify_batch: groups incoming emails into windows of
+    `batch_size`, classifies each window as soon as it is full (or the stream ends) and
+    yields (email, classification) pairs in input order.
+
+    When `emails` comes from core.engine.prefetch, a partial window is classified as soon
+    as no further email arrives within `max_wait` seconds, so a slow fetch doesn't hold
+    back the emails already in hand.
+    """
+    wait = getattr(emails, "wait", None)
+    window = []
+    for email_data in emails:
+        window.append(email_data)
+        if len(window) >= batch_size or (wait is not None and not wait(max_wait)):
+            yield from zip(window, classify_batch(window))
+            window = []
+    if window:
+        yield from zip(window, classify_batch(window))
+
+def summarizer_output(state: EmailState):
+    """The state's summary if the summarizer actually produced it, else None (skipped, failed or placeholder summaries)."""
+    summary = state.summary or ""
+    if state.processing_error or state.classification in SKIPPED_CLASSIFICATIONS or summary.startswith("Summary generation failed"):
+        return None
+    return summary or None
+
+def supervisor_langgraph(selected_email: dict, your_name: str, recipient_name: str, mode: str = None,
+                         classification: str = None) -> EmailState:
+    email_id = selected_email.get("id", "N/A")
+    usage_key(selected_email)  # assigned before any copy of the email is made, so all agents report under one key
+    mode = mode or AGENT_PIPELINE_MODE
+    if mode not in WORKFLOW_VARIANTS:
+        logger.warning(f"[Supervisor] Unknown pipeline mode '{mode}'. Falling back to 'standard'.")
+        mode = "standard"
+
+    # Exact duplicates of a recent email are not processed again; near-duplicates reuse its classification (and summary).
+    # Emails that went through classify_batch were already checked there.
+    if "dedup" in selected_email:
+        duplicate = selected_email["dedup"]
+    else:
+        duplicate = check_duplicate(selected_email) if DEDUP_ENABLED else None
+    if duplicate and duplicate["kind"] == "exact":
+        logger.info(f"[Supervisor] Email ID {email_id} duplicates email ID {duplicate['email_id']}. Skipping workflow.")
+        return EmailState(
+            current_email=selected_email,
+            current_email_id=email_id,
+            emails=[selected_email],
+            metadata={email_id: {"duplicate": duplicate}},
+            classification=duplicate["classification"] or "duplicate",
+            summary=duplicate["summary"],
+            generated_response_body=f"Not applicable. Duplicate of email ID {duplicate['email_id']}.",
+            duplicate_of=duplicate["email_id"]
+        )
+    summary = None
+    if duplicate:
+        classification = classification or duplicate["classification"]
+        # Its summary only fits if the email ends up with the same classification
+        if classification == duplicate["classification"]:
+            summary = duplicate["summary"]
+        logger.info(f"[Supervisor] Email ID {email_id} is a near-duplicate of email ID {duplicate['email_id']} "
+                    f"({duplicate['distance']} bits apart); "
+                    f"{'reusing its classification' if classification == duplicate['classification'] else 'keeping the batch classification'}"
+                    f"{' and summary' if summary else ''}.")
+
+    # Replies in a known thread carry the cached thread summary and their new text for the agents
+    if THREAD_INDEX_ENABLED:
+        selected_email = attach_thread_context(selected_email)
+
+    initial_state = EmailState(
+        current_email=selected_email,
+        current_email_id=email_id,
+        emails=[selected_email],
+        metadata={email_id: {"duplicate": duplicate} if duplicate else {}},
+        your_name=your_name,
+        recipient_name=recipient_name,
+        classification=classification,
+        summary=summary
+    )
+
+    shape, builder = WORKFLOW_VARIANTS[mode]
+    app = get_compiled_workflow(shape, builder)
 
     try:
         # The output of invoke() is a dictionary, not the dataclass instance.
@@ -157,8 +445,8 @@ def supervisor_langgraph(selected_email: dict, your_name: str, recipient_name: s
         final_state_instance = EmailState(**final_state_dict)
 
     except Exception as e:
-        if "quota" in str(e).lower() or "429" in str(e):
-            logger.warning(f"[Supervisor] Quota exceeded for email ID {email_id}. Skipping.")
+        if isinstance(e, QuotaExceededError):
+            logger.warning(f"[Supervisor] Quota still exceeded after retries for email ID {email_id}. Skipping.")
             final_state_instance = EmailState(
                 current_email=selected_email,
                 current_email_id=email_id,
@@ -178,4 +466,17 @@ def supervisor_langgraph(selected_email: dict, your_name: str, recipient_name: s
                 processing_error=f"LangGraph execution failed: {str(e)}"
             )
 
+    summary = summarizer_output(final_state_instance)
+    if DEDUP_ENABLED:
+        record_result(selected_email, final_state_instance.classification, summary,
+                      failed=bool(final_state_instance.processing_error) or final_state_instance.classification == "unknown")
+    if THREAD_INDEX_ENABLED and summary:
+        update_thread_summary(selected_email, summary)
+
+    prompt_tokens = pop_token_usage(selected_email)
+    final_state_instance.metadata.setdefault(email_id, {})["prompt_tokens"] = prompt_tokens
+    if prompt_tokens:
+        logger.info(f"[Supervisor] Prompt tokens sent for email ID {email_id}: {prompt_tokens} "
+                    f"(total {sum(prompt_tokens.values())}).")
+
     return final_state_instance
\ No newline at end of file
@@ -0,0 +1,178 @@
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from config import THREAD_DB_PATH, THREAD_MAX_AGE_SECONDS
+from utils.logger import get_logger
+from utils.token_budget import strip_quoted_text
+
+logger = get_logger(__name__)
+
+# Conversation threads keyed on Message-ID / In-Reply-To / References, each with a rolling
+# summary of the conversation so far. A reply in a known thread is summarized and answered
+# from its new text (the quoted history stripped) plus the cached summary, instead of
+# re-reading the whole quoted history every time.
+
+MESSAGE_ID_PATTERN = re.compile(r"<[^<>\s]+>")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS thread_messages (
+    message_id TEXT PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_thread_messages_thread ON thread_messages(thread_id);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    summary TEXT,
+    message_count INTEGER DEFAULT 0,
+    last_message_id TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_updated ON threads(updated_at);
+"""
+
+
+def parse_message_ids(value: Optional[str]) -> List[str]:
+    """The <...> message ids in a Message-ID, In-Reply-To or References header value, in order."""
+    return MESSAGE_ID_PATTERN.findall(value or "")
+
+
+class ThreadIndex:
+    """
+    Persistent thread index (SQLite, WAL). Threads and summaries untouched for
+    THREAD_MAX_AGE_SECONDS are pruned.
+    """
+
+    def __init__(self, path: str = THREAD_DB_PATH, max_age_seconds: float = THREAD_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.lock = threading.Lock()
+        self._last_prune = 0.0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def resolve(self, message_id: Optional[str], in_reply_to: Optional[str], references: List[str]) -> Optional[Dict[str, object]]:
+        """
+        Finds (or starts) the thread of a message and registers the message in it.
+
+        Returns:
+            dict or None: {"thread_id", "summary" (the cached rolling summary or None), "message_count"},
+            or None if the message has no usable ids.
+        """
+        own = parse_message_ids(message_id)
+        parents = references + [parent for parent in parse_message_ids(in_reply_to) if parent not in references]
+        candidates = own + parents[::-1]  # the message itself, then its closest ancestors first
+        if not candidates:
+            return None
+        now = time.time()
+        with self.lock:
+            self._prune(now)
+            thread_id = None
+            for candidate in candidates:
+                row = self.conn.execute("SELECT thread_id FROM thread_messages WHERE message_id = ?", (candidate,)).fetchone()
+                if row:
+                    thread_id = row[0]
+                    break
+            # A new thread is named after its root: the first reference, else the parent, else the message itself
+            thread_id = thread_id or (parents[0] if parents else own[0])
+            for known in own + parents:
+                self.conn.execute("INSERT OR IGNORE INTO thread_messages (message_id, thread_id, created_at) VALUES (?, ?, ?)",
+                                  (known, thread_id, now))
+            row = self.conn.execute("SELECT summary, message_count FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+            self.conn.commit()
+        summary, message_count = row if row else (None, 0)
+        return {"thread_id": thread_id, "summary": summary, "message_count": message_count}
+
+    def update_summary(self, thread_id: str, summary: str, message_id: Optional[str] = None) -> None:
+        """Replaces the thread's rolling summary with one that covers its latest message."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO threads (thread_id, summary, message_count, last_message_id, updated_at) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET summary = excluded.summary, message_count = message_count + 1, "
+                "last_message_id = excluded.last_message_id, updated_at = excluded.updated_at",
+                (thread_id, summary, message_id, time.time())
+            )
+            self.conn.commit()
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        cutoff = now - self.max_age_seconds
+        self.conn.execute("DELETE FROM threads WHERE updated_at < ?", (cutoff,))
+        self.conn.execute("DELETE FROM thread_messages WHERE created_at < ? AND thread_id NOT IN (SELECT thread_id FROM threads)", (cutoff,))
+        self.conn.commit()
+
+
+_index: Optional[ThreadIndex] = None
+_index_lock = threading.Lock()
+_stats = {"threaded": 0, "with_summary": 0, "summaries_updated": 0, "body_chars": 0, "delta_chars": 0}
+_stats_lock = threading.Lock()
+
+
+def get_thread_index() -> ThreadIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ThreadIndex()
+        return _index
+
+
+def attach_thread_context(email: dict) -> dict:
+    """
+    Resolves an email's thread. For a reply in a thread with a cached summary, returns a copy of
+    the email with "thread_id", "thread_summary" and "thread_delta" (the body without its quoted
+    history) for the summarization and response agents; otherwise the email with just its
+    "thread_id" (or unchanged when it has no message ids). Index errors are logged and ignored.
+    """
+    try:
+        thread = get_thread_index().resolve(email.get("message_id"), email.get("in_reply_to"), email.get("references") or [])
+    except Exception as e:
+        logger.warning(f"Thread index lookup failed for email ID {email.get('id', 'N/A')}: {e}", exc_info=True)
+        return email
+    if thread is None:
+        return email
+
+    with _stats_lock:
+        _stats["threaded"] += 1
+    email = dict(email, thread_id=thread["thread_id"])
+    body = email.get("body") or ""
+    delta = strip_quoted_text(body)
+    if not thread["summary"] or not delta:
+        return email
+
+    with _stats_lock:
+        _stats["with_summary"] += 1
+        _stats["body_chars"] += len(body)
+        _stats["delta_chars"] += len(delta)
+    logger.debug(f"Email ID {email.get('id', 'N/A')} continues thread {thread['thread_id']} "
+                 f"({thread['message_count']} earlier messages); {len(delta)} of {len(body)} body characters are new.")
+    return dict(email, thread_summary=thread["summary"], thread_delta=delta)
+
+
+def update_thread_summary(email: dict, summary: str) -> None:
+    """Caches `summary` as the rolling summary of the email's thread (no-op for emails without a thread)."""
+    if not email.get("thread_id") or not summary:
+        return
+    try:
+        get_thread_index().update_summary(email["thread_id"], summary, email.get("message_id"))
+    except Exception as e:
+        logger.warning(f"Could not update the summary of thread {email['thread_id']}: {e}", exc_info=True)
+        return
+    with _stats_lock:
+        _stats["summaries_updated"] += 1
+
+
+def get_thread_stats() -> Dict[str, int]:
+    """
+    Emails with thread ids, replies answered from a cached thread summary, summaries cached,
+    and the body vs new-text characters of those replies.
+    """
+    with _stats_lock:
+        return dict(_stats)
\ No newline at end of file
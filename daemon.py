@@ -0,0 +1,191 @@
+"""
+Long-running, non-interactive alternative to main.py.
+
+Keeps one authenticated IMAP connection open, waits for new mail with IDLE (NOOP polling
+when the server has no IDLE) and feeds new messages through a bounded queue into the same
+processing pipeline main.py uses. New messages are tracked with the incremental UID sync
+(core/imap_sync.py); the sync position only moves past an email once it has been processed
+and recorded, so nothing is fetched twice or lost across restarts.
+
+Usage:
+    python daemon.py [--send] [--mark-seen]
+
+Replies go to your Gmail as drafts unless --send is given. SIGINT/SIGTERM stop the watcher,
+finish the emails already queued and exit; a second signal exits immediately.
+"""
+import argparse
+import imaplib
+import queue
+import random
+import signal
+import threading
+
+from config import (
+    EMAIL_USERNAME, EMAIL_APP_PASSWORD, IMAP_SERVER, IMAP_PORT, YOUR_NAME,
+    MAX_CONCURRENT_EMAILS, AGENT_PIPELINE_MODE, FILTER_BATCH_SIZE,
+    DAEMON_QUEUE_SIZE, DAEMON_MAX_EMAILS_PER_POLL, IMAP_IDLE_TIMEOUT_SECONDS,
+    IMAP_POLL_INTERVAL_SECONDS, DAEMON_RECONNECT_MAX_SECONDS, OUTBOUND_QUEUE_ENABLED
+)
+from utils.logger import get_logger
+from utils.records_manager import initialize_records, close_records
+from core.email_imap import fetch_from_mailbox
+from core.imap_sync import DeferredSyncState, sync_key
+from core.imap_idle import wait_for_new_mail, supports_idle
+from core.supervisor import classify_batch
+from core.engine import process_concurrently
+from core.outbound_queue import OutboundQueue
+from main import process_email, log_or_queue_record, record_send_status, log_run_summary
+
+logger = get_logger(__name__)
+
+
+class MailboxWatcher(threading.Thread):
+    """
+    Owns the IMAP connection: polls for new UIDs, puts the parsed emails on `email_queue`
+    and waits for the next change. Connection errors trigger a reconnect with jittered
+    exponential backoff. Emails are fetched before they are queued, so puts block rather
+    than drop when the queue is full. The new sync position is held in `sync_state` until
+    the consumer reports each email done (see email_done).
+    """
+
+    def __init__(self, email_queue: queue.Queue, stop_event: threading.Event, mark_as_seen: bool = False):
+        super().__init__(name="imap-watcher", daemon=True)
+        self.email_queue = email_queue
+        self.stop_event = stop_event
+        self.mark_as_seen = mark_as_seen
+        self.sync_state = DeferredSyncState()
+        self.sync_key = sync_key(EMAIL_USERNAME, "inbox")
+
+    def email_done(self, email_data: dict):
+        """Called once an email is processed and its record written; lets the sync position move past it."""
+        self.sync_state.done(self.sync_key, email_data["id"])
+
+    def _connect(self):
+        mail = imaplib.IMAP4_SSL(IMAP_SERVER, IMAP_PORT)
+        mail.login(EMAIL_USERNAME, EMAIL_APP_PASSWORD)
+        mode = "IDLE" if supports_idle(mail) else f"NOOP polling every {IMAP_POLL_INTERVAL_SECONDS:.0f}s"
+        logger.info(f"Connected to {IMAP_SERVER} as {EMAIL_USERNAME}; waiting for mail with {mode}.")
+        return mail
+
+    def _poll(self, mail) -> int:
+        emails = fetch_from_mailbox(
+            mail, EMAIL_USERNAME, max_emails=DAEMON_MAX_EMAILS_PER_POLL,
+            mark_as_seen=self.mark_as_seen, sync_mode="incremental", sync_store=self.sync_state
+        )
+        self.sync_state.track(self.sync_key, [email_data["id"] for email_data in emails])
+        for email_data in emails:
+            self.email_queue.put(email_data)
+        if emails:
+            logger.info(f"Queued {len(emails)} new emails ({self.email_queue.qsize()} waiting).")
+        return len(emails)
+
+    def run(self):
+        backoff = 1.0
+        while not self.stop_event.is_set():
+            mail = None
+            try:
+                mail = self._connect()
+                backoff = 1.0
+                while not self.stop_event.is_set():
+                    if self._poll(mail) >= DAEMON_MAX_EMAILS_PER_POLL:
+                        continue  # more backlog waiting; poll again before idling
+                    wait_for_new_mail(mail, IMAP_IDLE_TIMEOUT_SECONDS, IMAP_POLL_INTERVAL_SECONDS, self.stop_event)
+            except (imaplib.IMAP4.error, OSError) as e:
+                delay = min(backoff, DAEMON_RECONNECT_MAX_SECONDS) * random.uniform(0.5, 1.0)
+                logger.warning(f"IMAP connection lost ({e}); reconnecting in {delay:.1f}s.")
+                self.stop_event.wait(delay)
+                backoff = min(backoff * 2, DAEMON_RECONNECT_MAX_SECONDS)
+            except Exception as e:
+                logger.critical(f"Unexpected error in the IMAP watcher: {e}", exc_info=True)
+                self.stop_event.wait(DAEMON_RECONNECT_MAX_SECONDS)
+            finally:
+                if mail:
+                    try:
+                        mail.logout()
+                    except Exception as e:
+                        logger.debug(f"Error during IMAP logout: {e}")
+        logger.info("IMAP watcher stopped.")
+
+
+def next_batch(email_queue: queue.Queue, size: int, timeout: float = 1.0) -> list:
+    """Waits up to `timeout` for one email, then takes whatever else is already queued (up to `size`)."""
+    try:
+        batch = [email_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    while len(batch) < size:
+        try:
+            batch.append(email_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def install_signal_handlers(stop_event: threading.Event):
+    def handle(signum, frame):
+        if stop_event.is_set():
+            raise SystemExit(f"Received signal {signum} again; exiting without finishing queued emails.")
+        logger.info(f"Received signal {signum}; finishing queued emails before exiting.")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+
+def run_daemon(dry_run_send: bool = True, mark_as_seen: bool = False):
+    initialize_records()
+    email_queue = queue.Queue(maxsize=max(1, DAEMON_QUEUE_SIZE))
+    stop_event = threading.Event()
+    install_signal_handlers(stop_event)
+
+    watcher = MailboxWatcher(email_queue, stop_event, mark_as_seen)
+    watcher.start()
+    outbound = OutboundQueue(on_done=record_send_status).start() if OUTBOUND_QUEUE_ENABLED else None
+    logger.info(f"Daemon started (dry run: {dry_run_send}, up to {MAX_CONCURRENT_EMAILS} emails at a time).")
+
+    batch_size = max(1, FILTER_BATCH_SIZE)
+    sr_no_counter = 0
+    while True:
+        batch = next_batch(email_queue, batch_size)
+        if not batch:
+            if stop_event.is_set() and not watcher.is_alive():
+                break
+            continue
+
+        if FILTER_BATCH_SIZE > 1 and AGENT_PIPELINE_MODE == "standard":
+            classifications = classify_batch(batch)
+        else:
+            classifications = [None] * len(batch)
+
+        first_index = sr_no_counter
+
+        def worker(indexed_email):
+            index, email_data_raw = indexed_email
+            return process_email(email_data_raw, first_index + index, YOUR_NAME, dry_run_send, classifications[index])
+
+        results = process_concurrently(enumerate(batch), worker, max_workers=MAX_CONCURRENT_EMAILS)
+        for email_data_raw, record_data_to_log in zip(batch, results):
+            sr_no_counter += 1
+            record_data_to_log['SR No'] = sr_no_counter
+            log_or_queue_record(record_data_to_log, outbound)
+            # A queued reply is safe in the outbound spool, so the email counts as done here
+            watcher.email_done(email_data_raw)
+
+    if outbound:
+        logger.info(f"Waiting for {outbound.get_stats()['pending']} queued replies/drafts to be sent...")
+        outbound.close()
+    close_records()
+    logger.info(f"Daemon stopped after processing {sr_no_counter} emails.")
+    log_run_summary(outbound)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process new mail as it arrives (IMAP IDLE).")
+    parser.add_argument("--send", action="store_true", help="Send replies directly instead of drafting them to your Gmail.")
+    parser.add_argument("--mark-seen", action="store_true", help="Mark fetched emails as seen on the IMAP server.")
+    args = parser.parse_args()
+    run_daemon(dry_run_send=not args.send, mark_as_seen=args.mark_seen)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,29 +1,41 @@
-import json
-import os
-import time
 from datetime import datetime
-from pathlib import Path
+from typing import Optional
 
 # Config
 from config import (
     EMAIL_USERNAME, EMAIL_APP_PASSWORD, IMAP_SERVER,
-    YOUR_NAME, YOUR_GMAIL_ADDRESS_FOR_DRAFTS
+    YOUR_NAME, YOUR_GMAIL_ADDRESS_FOR_DRAFTS, MAX_CONCURRENT_EMAILS,
+    AGENT_PIPELINE_MODE, FILTER_BATCH_SIZE, PREFETCH_BUFFER_SIZE, OUTBOUND_QUEUE_ENABLED
 )
 
 # Utils
 from utils.logger import get_logger
-from utils.records_manager import log_email_record, initialize_csv, RECORDS_CSV_PATH, CSV_HEADERS
+from utils.records_manager import log_email_record, initialize_records, close_records, RECORDS_CSV_PATH
+from utils.records_writer import get_records_writer_stats
 from core.email_sender import extract_name_from_email
 
 # Core components
-from core.email_ingestion import fetch_email
-from core.supervisor import supervisor_langgraph
-from core.email_sender import send_email, send_draft_to_gmail
+from core.email_ingestion import iter_emails
+from core.supervisor import supervisor_langgraph, classify_stream, SKIPPED_CLASSIFICATIONS
+from core.engine import process_concurrently, prefetch
+from core.smtp_pool import get_smtp_pool_stats
+from core.outbound_queue import OutboundQueue, send_job, job_status
 from core.state import EmailState
+from agents.model_registry import get_registry_stats
+from agents.rate_limiter import get_rate_limiter_stats
+from agents.llm_cache import get_llm_cache_stats
+from agents.prefilter_agent import get_prefilter_stats
+from agents.model_router import get_router_stats
+from core.dedup_index import get_dedup_stats
+from core.thread_index import get_thread_stats
 
 logger = get_logger(__name__)
 
-def handle_email_sending(final_state: EmailState, user_name: str, dry_run: bool) -> str:
+def prepare_outbound_job(final_state: EmailState, user_name: str, dry_run: bool) -> Optional[dict]:
+    """
+    Builds the reply (or draft to your Gmail) for a processed email, in the job format of
+    core.outbound_queue. Returns None when there is nothing to send.
+    """
     email_data = final_state.current_email
     generated_response = final_state.generated_response_body
     original_sender_email = email_data.get("sender_email", "unknown@example.com")
@@ -31,7 +43,7 @@ def handle_email_sending(final_state: EmailState, user_name: str, dry_run: bool)
 
     if not generated_response or final_state.processing_error:
         logger.warning(f"Skipping send/draft for email ID {final_state.current_email_id} due to no response or error.")
-        return "Skipped (No Response/Error)"
+        return None
 
     email_for_sending = {
         "subject": original_subject,
@@ -41,18 +53,124 @@ def handle_email_sending(final_state: EmailState, user_name: str, dry_run: bool)
 
     if dry_run or final_state.requires_human_review:
         logger.info(f"Email ID {final_state.current_email_id} flagged for human review or in dry-run mode. Sending draft to '{YOUR_GMAIL_ADDRESS_FOR_DRAFTS}'.")
-        if send_draft_to_gmail(email_for_sending, user_name, YOUR_GMAIL_ADDRESS_FOR_DRAFTS):
-            return "Drafted"
-        else:
-            logger.error(f"Failed to send draft for email ID {final_state.current_email_id}.")
-            return "Draft Failed"
+        kind = "draft"
     else:
         logger.info(f"Email ID {final_state.current_email_id} is ready to be sent. Replying to '{original_sender_email}'.")
-        if send_email(email_for_sending, user_name):
-            return "Sent Directly"
+        kind = "reply"
+    return {
+        "kind": kind,
+        "email": email_for_sending,
+        "user_name": user_name,
+        "draft_address": YOUR_GMAIL_ADDRESS_FOR_DRAFTS,
+        "email_id": final_state.current_email_id
+    }
+
+def handle_email_sending(final_state: EmailState, user_name: str, dry_run: bool) -> str:
+    """Sends the reply or draft inline and returns the 'Response Status' (used when OUTBOUND_QUEUE_ENABLED is off)."""
+    job = prepare_outbound_job(final_state, user_name, dry_run)
+    if job is None:
+        return "Skipped (No Response/Error)"
+    sent = send_job(job)
+    if not sent:
+        logger.error(f"Failed to send {job['kind']} for email ID {final_state.current_email_id}.")
+    return job_status(job, sent)
+
+def process_email(email_data_raw: dict, index: int, your_name: str, dry_run_send: bool, classification: str = None) -> dict:
+    """
+    Runs one email through the supervisor workflow and the send/draft step.
+    Safe to call from worker threads; returns the record to log (without 'SR No',
+    which the caller assigns in input order). A classification from the batch
+    classifier, if given, skips the per-email classification call.
+
+    With OUTBOUND_QUEUE_ENABLED the reply is not sent here: the record's 'Response Status'
+    is "Queued" and its 'Outbound Job' holds the job for log_or_queue_record.
+    """
+    email_id = email_data_raw.get("id", f"simulated_{index+1}")
+    sender_email = email_data_raw.get("sender_email", "unknown@example.com")
+    sender_name = email_data_raw.get("sender_name", extract_name_from_email(sender_email))
+    subject = email_data_raw.get("subject", "No Subject")
+
+    logger.info(f"\n--- Processing Email {index+1} (ID: {email_id}) ---")
+    logger.info(f"Subject: {subject}")
+    logger.info(f"From: {sender_name} <{sender_email}>")
+
+    outbound_job = None
+    try:
+        recipient_name_for_llm = extract_name_from_email(sender_email)
+
+        final_state: EmailState = supervisor_langgraph(
+            selected_email=email_data_raw,
+            your_name=your_name,
+            recipient_name=recipient_name_for_llm,
+            classification=classification
+        )
+
+        logger.debug(f"Email ID {email_id} final state: Classification='{final_state.classification}', "
+                     f"Summary length={len(final_state.summary or '')}, "
+                     f"Response length={len(final_state.generated_response_body or '')}, "
+                     f"Requires Review={final_state.requires_human_review}, "
+                     f"Error='{final_state.processing_error}'")
+
+        if final_state.duplicate_of:
+            response_status_action = f"Skipped (Duplicate of {final_state.duplicate_of})"
+        elif final_state.processing_error:
+            response_status_action = "Error During Processing"
+            logger.error(f"Skipping send/draft for email ID {email_id} due to prior processing error: {final_state.processing_error}")
+        elif final_state.classification in SKIPPED_CLASSIFICATIONS:
+            response_status_action = f"Skipped ({final_state.classification.replace('_', ' ').capitalize()})"
+            logger.info(f"Skipping send/draft for email ID {email_id} as it was classified as '{final_state.classification}'.")
+        elif OUTBOUND_QUEUE_ENABLED:
+            outbound_job = prepare_outbound_job(final_state, your_name, dry_run_send)
+            response_status_action = "Queued" if outbound_job else "Skipped (No Response/Error)"
         else:
-            logger.error(f"Failed to send direct reply for email ID {final_state.current_email_id}.")
-            return "Send Failed"
+            response_status_action = handle_email_sending(final_state, your_name, dry_run_send)
+
+    except Exception as e:
+        logger.critical(f"A critical error occurred while processing email ID {email_id}: {e}", exc_info=True)
+        final_state = EmailState(
+            current_email=email_data_raw,
+            current_email_id=email_id,
+            classification="error",
+            summary="Processing failed due to critical error.",
+            generated_response_body="Error occurred during processing.",
+            processing_error=f"Critical error: {str(e)}"
+        )
+        response_status_action = "Critical Error"
+
+    return {
+        'Timestamp': email_data_raw.get('timestamp') or datetime.now().isoformat(),
+        'Sender Email': sender_email,
+        'Sender Name': sender_name,
+        'Recipient Email': EMAIL_USERNAME,
+        'Original Subject': subject,
+        'Original Content': email_data_raw.get('body', ''),
+        'Classification': final_state.classification,
+        'Summary': final_state.summary,
+        'Generated Response': final_state.generated_response_body,
+        'Requires Human Review': final_state.requires_human_review,
+        'Response Status': response_status_action,
+        'Processing Error': final_state.processing_error,
+        'Record Save Time': datetime.now().isoformat(),
+        'Message ID': email_data_raw.get('message_id') or email_id,
+        'Outbound Job': outbound_job
+    }
+
+def record_send_status(job: dict, status: str):
+    """OutboundQueue callback: logs the email's record once its reply or draft is sent (or has failed)."""
+    record = dict(job["record"], **{'Response Status': status, 'Record Save Time': datetime.now().isoformat()})
+    log_email_record(record, RECORDS_CSV_PATH)
+
+def log_or_queue_record(record_data_to_log: dict, outbound: Optional[OutboundQueue]):
+    """
+    Logs a processed email's record, or, if it has a reply to send, hands the reply to the
+    outbound queue; the record is then logged by record_send_status with the final status.
+    Records are therefore written in completion order; 'SR No' keeps the processing order.
+    """
+    outbound_job = record_data_to_log.pop('Outbound Job', None)
+    if outbound_job and outbound:
+        outbound.submit(dict(outbound_job, record=record_data_to_log))
+    else:
+        log_email_record(record_data_to_log, RECORDS_CSV_PATH)
 
 def main():
     logger.info("Starting email automation main script.")
@@ -62,12 +180,13 @@ def main():
         print("Exiting script.")
         return
 
-    initialize_csv(RECORDS_CSV_PATH)
+    initialize_records()
 
     simulate_fetch = input("Use simulated emails from sample_emails.json? (y/n): ").strip().lower() == "y"
+    archive_path = input("Path to an mbox/Maildir/.eml archive to process instead of IMAP (leave blank for IMAP): ").strip() if not simulate_fetch else ""
     email_limit = int(input("How many emails to process (max)? (e.g., 1): ") or "1")
     dry_run_send = input("Send all responses as DRAFTS to your Gmail address (dry run)? (y/n): ").strip().lower() == "y"
-    mark_as_seen = input("Mark fetched emails as 'seen' on IMAP server (only for real fetch)? (y/n): ").strip().lower() == "y" if not simulate_fetch else False
+    mark_as_seen = input("Mark fetched emails as 'seen' on IMAP server (only for real fetch)? (y/n): ").strip().lower() == "y" if not (simulate_fetch or archive_path) else False
 
     your_name = YOUR_NAME
     gmail_draft_address = YOUR_GMAIL_ADDRESS_FOR_DRAFTS
@@ -75,89 +194,87 @@ def main():
     logger.info(f"Drafts will be sent to: {gmail_draft_address}")
 
     logger.info("Fetching emails...")
-    emails_to_process = fetch_email(
-        simulate=simulate_fetch,
-        limit=email_limit,
-        mark_as_seen=mark_as_seen
+    # Emails stream in while earlier ones are processed; the prefetch buffer bounds how far the fetch runs ahead.
+    email_stream = prefetch(
+        iter_emails(simulate=simulate_fetch, limit=email_limit, mark_as_seen=mark_as_seen, archive_path=archive_path),
+        buffer_size=PREFETCH_BUFFER_SIZE
     )
 
-    if not emails_to_process:
-        logger.info("No emails found to process. Exiting.")
-        return
+    # Classify each window of emails as it arrives (pre-filter + batched Gemini call), then fan out summarize/respond per email.
+    if FILTER_BATCH_SIZE > 1 and AGENT_PIPELINE_MODE == "standard":
+        classified_emails = classify_stream(email_stream, FILTER_BATCH_SIZE)
+    else:
+        classified_emails = ((email_data_raw, None) for email_data_raw in email_stream)
 
-    logger.info(f"Fetched {len(emails_to_process)} emails.")
-    sr_no_counter = 0
+    def worker(indexed_email):
+        index, (email_data_raw, classification) = indexed_email
+        return process_email(email_data_raw, index, your_name, dry_run_send, classification)
 
-    for i, email_data_raw in enumerate(emails_to_process):
-        sr_no_counter += 1
-        email_id = email_data_raw.get("id", f"simulated_{i+1}")
-        sender_email = email_data_raw.get("sender_email", "unknown@example.com")
-        sender_name = email_data_raw.get("sender_name", extract_name_from_email(sender_email))
-        subject = email_data_raw.get("subject", "No Subject")
-
-        logger.info(f"\n--- Processing Email {sr_no_counter} (ID: {email_id}) ---")
-        logger.info(f"Subject: {subject}")
-        logger.info(f"From: {sender_name} <{sender_email}>")
-
-        try:
-            recipient_name_for_llm = extract_name_from_email(sender_email)
-
-            final_state: EmailState = supervisor_langgraph(
-                selected_email=email_data_raw,
-                your_name=your_name,
-                recipient_name=recipient_name_for_llm
-            )
-
-            logger.debug(f"Email ID {email_id} final state: Classification='{final_state.classification}', "
-                         f"Summary length={len(final_state.summary or '')}, "
-                         f"Response length={len(final_state.generated_response_body or '')}, "
-                         f"Requires Review={final_state.requires_human_review}, "
-                         f"Error='{final_state.processing_error}'")
-
-            if final_state.processing_error:
-                response_status_action = "Error During Processing"
-                logger.error(f"Skipping send/draft for email ID {email_id} due to prior processing error: {final_state.processing_error}")
-            elif final_state.classification in ["spam", "promotional"]:
-                response_status_action = f"Skipped ({final_state.classification.capitalize()})"
-                logger.info(f"Skipping send/draft for email ID {email_id} as it was classified as '{final_state.classification}'.")
-            else:
-                response_status_action = handle_email_sending(final_state, your_name, dry_run_send)
-
-        except Exception as e:
-            logger.critical(f"A critical error occurred while processing email ID {email_id}: {e}", exc_info=True)
-            final_state = EmailState(
-                current_email=email_data_raw,
-                current_email_id=email_id,
-                classification="error",
-                summary="Processing failed due to critical error.",
-                generated_response_body="Error occurred during processing.",
-                processing_error=f"Critical error: {str(e)}"
-            )
-            response_status_action = "Critical Error"
-
-        record_data_to_log = {
-            'SR No': sr_no_counter,
-            'Timestamp': email_data_raw.get('timestamp') or datetime.now().isoformat(),
-            'Sender Email': sender_email,
-            'Sender Name': sender_name,
-            'Recipient Email': EMAIL_USERNAME,
-            'Original Subject': subject,
-            'Original Content': email_data_raw.get('body', ''),
-            'Classification': final_state.classification,
-            'Summary': final_state.summary,
-            'Generated Response': final_state.generated_response_body,
-            'Requires Human Review': final_state.requires_human_review,
-            'Response Status': response_status_action,
-            'Processing Error': final_state.processing_error,
-            'Record Save Time': datetime.now().isoformat()
-        }
+    # Replies are sent by background threads, so the next emails don't wait on SMTP.
+    outbound = OutboundQueue(on_done=record_send_status).start() if OUTBOUND_QUEUE_ENABLED else None
 
-        log_email_record(record_data_to_log, RECORDS_CSV_PATH)
+    # Emails run concurrently but results come back in input order, so SR numbers stay deterministic.
+    results = process_concurrently(enumerate(classified_emails), worker, max_workers=MAX_CONCURRENT_EMAILS)
+    sr_no_counter = 0
+    try:
+        for sr_no_counter, record_data_to_log in enumerate(results, start=1):
+            record_data_to_log['SR No'] = sr_no_counter
+            log_or_queue_record(record_data_to_log, outbound)
+    finally:
+        if outbound:
+            logger.info(f"Waiting for {outbound.get_stats()['pending']} queued replies/drafts to be sent...")
+            outbound.close()
+        close_records()
+
+    if not sr_no_counter:
+        logger.info("No emails found to process. Exiting.")
+        return
 
-        if i < len(emails_to_process) - 1:
-            time.sleep(10)
+    logger.info(f"All {sr_no_counter} selected emails processed. Automation workflow finished.")
+    log_run_summary(outbound)
 
-    logger.info("All selected emails processed. Automation workflow finished.")
+def log_run_summary(outbound: Optional[OutboundQueue] = None):
+    registry_stats = get_registry_stats()
+    logger.info(f"Model clients: {registry_stats['created']} created, {registry_stats['reused']} reused "
+                f"({registry_stats['active_clients']} active).")
+    for model, stats in get_rate_limiter_stats().items():
+        logger.info(f"Rate limiter [{model}]: {stats['calls']} calls, {stats['throttled']} throttled (429), "
+                    f"{stats['retries']} retries, {stats['wait_seconds']:.1f}s waiting, "
+                    f"settled at {stats['current_rpm']:.1f} requests/minute.")
+    cache_stats = get_llm_cache_stats()
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    hit_rate = cache_stats['hits'] / lookups if lookups else 0.0
+    logger.info(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({hit_rate:.0%} hit rate), "
+                f"{cache_stats['expired']} expired, {cache_stats['evicted']} evicted.")
+    prefilter_stats = get_prefilter_stats()
+    logger.info(f"Pre-filter: {prefilter_stats['skipped']} of {prefilter_stats['checked']} emails skipped the LLM "
+                f"({prefilter_stats['skipped_fraction']:.0%}) {prefilter_stats['by_label']}.")
+    dedup_stats = get_dedup_stats()
+    if dedup_stats['checked']:
+        logger.info(f"Dedup: {dedup_stats['exact']} exact duplicates skipped, {dedup_stats['near']} near-duplicates "
+                    f"({dedup_stats['summaries_reused']} reused a summary) of {dedup_stats['checked']} emails.")
+    thread_stats = get_thread_stats()
+    if thread_stats['with_summary']:
+        logger.info(f"Threads: {thread_stats['with_summary']} replies used a cached thread summary, sending "
+                    f"{thread_stats['delta_chars']} of {thread_stats['body_chars']} body characters.")
+    router_stats = get_router_stats()
+    for model, stats in router_stats["models"].items():
+        logger.info(f"Model [{model}]: {stats['calls']} calls, {stats['failures']} failed, "
+                    f"avg latency {stats['avg_seconds']:.2f}s, {stats['cache_hits']} served from cache.")
+    for agent, stats in router_stats["agents"].items():
+        logger.info(f"Routing [{agent}]: {stats['escalations']} of {stats['calls']} calls escalated "
+                    f"({stats['escalation_rate']:.0%}).")
+    smtp_stats = get_smtp_pool_stats()
+    if smtp_stats['sent'] or smtp_stats['connections']:
+        logger.info(f"SMTP: {smtp_stats['sent']} messages over {smtp_stats['connections']} sessions "
+                    f"({smtp_stats['reused']} sends reused a session, {smtp_stats['reconnects']} reconnects).")
+    if outbound:
+        outbound_stats = outbound.get_stats()
+        logger.info(f"Outbound queue: {outbound_stats['sent']} sent, {outbound_stats['failed']} failed, "
+                    f"{outbound_stats['retries']} retries, {outbound_stats['recovered']} recovered from the spool.")
+    for target, writer_stats in get_records_writer_stats().items():
+        logger.info(f"Records [{target}]: {writer_stats['rows']} written in {writer_stats['flushes']} batches "
+                    f"({writer_stats['errors']} failed batches, {writer_stats['spilled']} saved to the spill file).")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,111 @@
+import pytest
+
+from core.dedup_index import DedupIndex
+
+BODY = ("Hello team, the shipment for order 48213 arrived this morning but two of the cartons were "
+        "crushed and the pallet wrap was torn. Could you arrange a replacement for the damaged units "
+        "and let me know whether you need photos of the packaging for the carrier claim? We would "
+        "also like to confirm the delivery window for the next consignment, since our warehouse is "
+        "closed on Friday afternoon. Thanks for your help.")
+
+
+def email(email_id, body=BODY, message_id=None, sender="buyer@example.com", **extra):
+    return dict({"id": email_id, "subject": "Damaged cartons", "body": body, "sender_email": sender,
+                 "message_id": message_id}, **extra)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DedupIndex(str(tmp_path / "dedup.sqlite3"), window_seconds=3600, max_distance=3)
+    yield index
+    index.conn.close()
+
+
+def row(index, row_id):
+    return index.conn.execute("SELECT classification, summary FROM seen_emails WHERE id = ?", (row_id,)).fetchone()
+
+
+def test_new_email_is_registered(index):
+    first = email("1", message_id="<a@example.com>")
+    assert index.check(first) is None
+    assert first["dedup_row"] is not None
+
+
+def test_same_message_id_is_an_exact_duplicate(index):
+    first = email("1", message_id="<a@example.com>")
+    index.check(first)
+    index.complete(first, "urgent", "Two cartons crushed.")
+    again = email("2", body="different text", message_id="<a@example.com>")
+    match = index.check(again)
+    assert match["kind"] == "exact"
+    assert (match["email_id"], match["classification"], match["summary"]) == ("1", "urgent", "Two cartons crushed.")
+    assert "dedup_row" not in again  # exact duplicates are not registered again
+
+
+def test_same_text_with_message_ids_and_parents_is_an_exact_duplicate(index):
+    first = email("1", message_id="<a@example.com>", in_reply_to="<p@example.com>")
+    index.check(first)
+    index.complete(first, "urgent", "Two cartons crushed.")
+    assert index.check(email("2", message_id="<b@example.com>", in_reply_to="<p@example.com>"))["kind"] == "exact"
+    # The same text replying to another message is a new message that reads the same
+    follow_up = index.check(email("3", message_id="<c@example.com>", in_reply_to="<q@example.com>"))
+    assert follow_up["kind"] == "near" and follow_up["summary"] is None
+
+
+def test_same_text_without_message_ids_only_reuses_the_classification(index):
+    first = email("1")
+    index.check(first)
+    index.complete(first, "urgent", "Two cartons crushed.")
+    match = index.check(email("2"))
+    assert (match["kind"], match["classification"], match["summary"]) == ("near", "urgent", None)
+
+
+def test_near_duplicate_reuses_the_summary_only_for_the_same_identifiers(index):
+    first = email("1", message_id="<a@example.com>")
+    index.check(first)
+    index.complete(first, "urgent", "Order 48213: two cartons crushed.")
+
+    reworded = email("2", body=BODY.replace(" Thanks for your help.", ""), message_id="<b@example.com>")
+    match = index.check(reworded)
+    assert match["kind"] == "near" and 0 < match["distance"] <= 3
+    assert match["summary"] == "Order 48213: two cartons crushed."
+
+    other_order = email("3", body=BODY.replace("48213", "51002"), message_id="<c@example.com>")
+    match = index.check(other_order)
+    assert match["kind"] == "near" and match["summary"] is None
+
+
+def test_other_senders_are_never_duplicates(index):
+    first = email("1")
+    index.check(first)
+    index.complete(first, "urgent", None)
+    assert index.check(email("2", sender="someone@else.example")) is None
+
+
+def test_complete_and_forget_act_on_the_registered_row(index):
+    # Email ids repeat (simulated runs, UIDVALIDITY resets), so rows are keyed on the row id
+    first = email("1", message_id="<a@example.com>")
+    second = email("1", body="A different question about invoices.", message_id="<b@example.com>")
+    index.check(first)
+    index.check(second)
+    index.complete(second, "general", "Invoice question.")
+    assert row(index, first["dedup_row"]) == (None, None)
+    assert row(index, second["dedup_row"]) == ("general", "Invoice question.")
+
+    index.forget(first)
+    assert row(index, first["dedup_row"]) is None
+    assert index.check(email("2", message_id="<a@example.com>")) is None  # processed normally again
+
+
+def test_forget_keeps_completed_rows(index):
+    first = email("1", message_id="<a@example.com>")
+    index.check(first)
+    index.complete(first, "urgent", None)
+    index.forget(first)
+    assert row(index, first["dedup_row"]) == ("urgent", None)
+
+
+def test_unregistered_emails_are_ignored(index):
+    index.complete(email("9"), "urgent", None)
+    index.forget(email("9"))
+    assert index.conn.execute("SELECT COUNT(*) FROM seen_emails").fetchone()[0] == 0
\ No newline at end of file
@@ -0,0 +1,81 @@
+from core.imap_bodystructure import is_attachment, iter_fetch_items, parse_bodystructure, select_text_parts
+
+MIXED_RESPONSE = [
+    b'1 (UID 57 BODYSTRUCTURE ((("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 120 4 NIL NIL NIL)'
+    b'("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "BASE64" 300 5 NIL NIL NIL) "ALTERNATIVE")'
+    b'("APPLICATION" "PDF" ("NAME" "invoice.pdf") NIL NIL "BASE64" 5000 NIL ("ATTACHMENT" ("FILENAME" "invoice.pdf")) NIL) "MIXED"))'
+]
+
+
+def structure_of(msg_data):
+    return next(iter_fetch_items(msg_data))[b"BODYSTRUCTURE"]
+
+
+def test_single_part_message_is_part_1():
+    parts = parse_bodystructure(structure_of([b'1 (UID 3 BODYSTRUCTURE ("TEXT" "PLAIN" ("CHARSET" "us-ascii") NIL NIL "7BIT" 42 2))']))
+    assert parts == [{
+        "part": "1", "content_type": "text/plain", "charset": "us-ascii", "encoding": "7bit",
+        "size": 42, "disposition": None, "filename": None
+    }]
+
+
+def test_nested_multipart_gets_dotted_part_numbers():
+    parts = parse_bodystructure(structure_of(MIXED_RESPONSE))
+    assert [(part["part"], part["content_type"]) for part in parts] == [
+        ("1.1", "text/plain"), ("1.2", "text/html"), ("2", "application/pdf")
+    ]
+    plain, html, pdf = parts
+    assert plain["encoding"] == "quoted-printable" and plain["size"] == 120
+    assert html["encoding"] == "base64"
+    assert pdf["disposition"] == "attachment" and pdf["filename"] == "invoice.pdf"
+
+
+def test_text_parts_and_attachments():
+    parts = parse_bodystructure(structure_of(MIXED_RESPONSE))
+    assert [part["part"] for part in select_text_parts(parts)] == ["1.1"]
+    assert [is_attachment(part) for part in parts] == [False, False, True]
+
+
+def test_html_is_used_when_there_is_no_plain_text():
+    parts = parse_bodystructure(structure_of([
+        b'1 (UID 4 BODYSTRUCTURE (("TEXT" "HTML" ("CHARSET" "utf-8") NIL NIL "7BIT" 30 1 NIL NIL NIL)'
+        b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "7BIT" 10 1 NIL ("ATTACHMENT" ("FILENAME" "notes.txt")) NIL) "MIXED"))'
+    ]))
+    assert [part["part"] for part in select_text_parts(parts)] == ["1"]
+
+
+def test_attached_message_is_a_single_leaf():
+    parts = parse_bodystructure(structure_of([
+        b'1 (UID 5 BODYSTRUCTURE (("TEXT" "PLAIN" NIL NIL NIL "7BIT" 10 1)'
+        b'("MESSAGE" "RFC822" NIL NIL NIL "7BIT" 500 (NIL "Fwd" NIL NIL NIL NIL NIL NIL NIL NIL)'
+        b' ("TEXT" "PLAIN" NIL NIL NIL "7BIT" 200 8) 12 NIL ("ATTACHMENT" NIL) NIL) "MIXED"))'
+    ]))
+    assert [(part["part"], part["content_type"], part["disposition"]) for part in parts] == [
+        ("1", "text/plain", None), ("2", "message/rfc822", "attachment")
+    ]
+
+
+def test_literals_and_escaped_strings():
+    items = next(iter_fetch_items([
+        (b'1 (UID 9 BODYSTRUCTURE ("APPLICATION" "PDF" ("NAME" {11}', b"invoice.pdf"),
+        b') NIL "say \\"hi\\"" "BASE64" 10 NIL NIL NIL))',
+    ]))
+    assert items[b"UID"] == b"9"
+    [part] = parse_bodystructure(items[b"BODYSTRUCTURE"])
+    assert part["filename"] == "invoice.pdf"
+    assert items[b"BODYSTRUCTURE"][4] == b'say "hi"'
+
+
+def test_one_dict_per_message():
+    items = list(iter_fetch_items([
+        (b'1 (UID 10 BODY[HEADER] {10}', b"Subject:\r\n"),
+        b')',
+        (b'2 (UID 11 BODY[HEADER] {9}', b"From: x\r\n"),
+        b')',
+    ]))
+    assert [(item[b"UID"], item[b"BODY[HEADER]"]) for item in items] == [(b"10", b"Subject:\r\n"), (b"11", b"From: x\r\n")]
+
+
+def test_malformed_structures_yield_no_parts():
+    assert parse_bodystructure(None) == []
+    assert parse_bodystructure([]) == []
\ No newline at end of file
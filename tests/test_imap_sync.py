@@ -0,0 +1,77 @@
+import json
+
+from core.imap_sync import DeferredSyncState, SyncStateFile, selected_mailbox_info
+
+KEY = "me@example.com:inbox"
+
+
+class MemoryStore:
+    def __init__(self, states=None):
+        self.states = dict(states or {})
+        self.saves = []
+
+    def load(self, key):
+        return self.states.get(key)
+
+    def save(self, key, state):
+        self.states[key] = state
+        self.saves.append(state["last_uid"])
+
+
+def state(last_uid):
+    return {"uidvalidity": 7, "last_uid": last_uid, "highestmodseq": None}
+
+
+def test_position_is_held_until_its_emails_are_done():
+    store = MemoryStore({KEY: state(10)})
+    sync = DeferredSyncState(store)
+    sync.save(KEY, state(13))
+    sync.track(KEY, [b"11", b"12", b"13"])
+    assert sync.load(KEY) == state(13)  # the next poll continues after the queued emails
+    sync.done(KEY, "11")
+    sync.done(KEY, "13")
+    assert store.saves == []
+    sync.done(KEY, "12")
+    assert store.saves == [13]
+    assert sync.load(KEY) == state(13)
+
+
+def test_positions_are_written_in_order():
+    store = MemoryStore()
+    sync = DeferredSyncState(store)
+    sync.save(KEY, state(2))
+    sync.track(KEY, [1, 2])
+    sync.save(KEY, state(4))
+    sync.track(KEY, [3, 4])
+    for uid in (3, 4, 1):
+        sync.done(KEY, uid)
+    assert store.saves == []  # UID 2 is still being processed
+    sync.done(KEY, 2)
+    assert store.saves == [2, 4]
+
+
+def test_position_without_new_emails_is_written_at_once():
+    store = MemoryStore()
+    sync = DeferredSyncState(store)
+    sync.save(KEY, state(5))
+    sync.track(KEY, [])
+    assert store.saves == [5]
+
+
+def test_sync_state_file_round_trip(tmp_path):
+    path = tmp_path / "sync.json"
+    store = SyncStateFile(str(path))
+    assert store.load(KEY) is None
+    store.save(KEY, state(3))
+    store.save("other:inbox", state(9))
+    assert store.load(KEY) == state(3)
+    assert json.loads(path.read_text())["other:inbox"]["last_uid"] == 9
+
+
+def test_select_response_codes_are_read_without_consuming_them():
+    class Connection:
+        untagged_responses = {"EXISTS": [b"3"], "UIDVALIDITY": [b"7"], "UIDNEXT": [b"201"], "HIGHESTMODSEQ": [b"9041"]}
+
+    mail = Connection()
+    assert selected_mailbox_info(mail) == {"UIDVALIDITY": 7, "UIDNEXT": 201, "HIGHESTMODSEQ": 9041}
+    assert selected_mailbox_info(mail)["UIDVALIDITY"] == 7
\ No newline at end of file
@@ -0,0 +1,88 @@
+import json
+import threading
+
+from core.outbound_queue import OutboundQueue
+
+
+def reply_job(number):
+    return {"kind": "reply", "email": {"subject": f"Order {number}", "response": "Thanks", "from": "a@example.com"},
+            "user_name": "Support", "draft_address": "me@example.com"}
+
+
+class Recorder:
+    def __init__(self):
+        self.statuses = []
+        self.lock = threading.Lock()
+
+    def __call__(self, job, status):
+        with self.lock:
+            self.statuses.append((job["email"]["subject"], status))
+
+
+def test_jobs_are_sent_and_unspooled(tmp_path):
+    done = Recorder()
+    outbound = OutboundQueue(done, send=lambda job: True, spool_dir=str(tmp_path), workers=2).start()
+    for number in range(5):
+        outbound.submit(reply_job(number))
+    outbound.close()
+    assert sorted(done.statuses) == [(f"Order {number}", "Sent Directly") for number in range(5)]
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_failed_sends_are_retried_then_reported(tmp_path):
+    attempts = []
+    done = Recorder()
+    outbound = OutboundQueue(done, send=lambda job: attempts.append(job["id"]) or len(attempts) >= 2,
+                             spool_dir=str(tmp_path), max_attempts=3, retry_base_seconds=0.01).start()
+    outbound.submit(reply_job(1))
+    outbound.close()
+    assert len(attempts) == 2
+    assert done.statuses == [("Order 1", "Sent Directly")]
+    assert outbound.get_stats()["retries"] == 1
+
+    outbound = OutboundQueue(done, send=lambda job: False, spool_dir=str(tmp_path), max_attempts=2,
+                             retry_base_seconds=0.01).start()
+    outbound.submit(dict(reply_job(2), kind="draft"))
+    outbound.close()
+    assert done.statuses[-1] == ("Order 2", "Draft Failed")
+
+
+def test_jobs_left_by_a_stopped_run_are_sent_on_the_next_start(tmp_path):
+    attempted = threading.Event()
+    stopped = OutboundQueue(Recorder(), send=lambda job: attempted.set(), spool_dir=str(tmp_path),
+                            max_attempts=5, retry_base_seconds=60).start()
+    stopped.submit(reply_job(1))
+    assert attempted.wait(5)
+    stopped.close(wait=False)  # interrupts the retry wait; the job stays in the spool
+    [spooled] = tmp_path.glob("*.json")
+    assert json.loads(spooled.read_text())["attempts"] == 1
+
+    done = Recorder()
+    recovered = OutboundQueue(done, send=lambda job: True, spool_dir=str(tmp_path)).start()
+    recovered.close()
+    assert done.statuses == [("Order 1", "Sent Directly")]
+    assert recovered.get_stats()["recovered"] == 1
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_sent_job_is_not_sent_again_when_only_its_status_was_missing(tmp_path):
+    job = dict(reply_job(1), id="crashed", attempts=1, status="Sent Directly")
+    (tmp_path / "crashed.json").write_text(json.dumps(job))
+    sends = []
+    done = Recorder()
+    outbound = OutboundQueue(done, send=lambda job: sends.append(job) or True, spool_dir=str(tmp_path)).start()
+    outbound.close()
+    assert sends == []
+    assert done.statuses == [("Order 1", "Sent Directly")]
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_spool_file_is_kept_when_the_status_cannot_be_recorded(tmp_path):
+    def failing_record(job, status):
+        raise OSError("disk full")
+
+    outbound = OutboundQueue(failing_record, send=lambda job: True, spool_dir=str(tmp_path)).start()
+    outbound.submit(reply_job(1))
+    outbound.close()
+    [spooled] = tmp_path.glob("*.json")
+    assert json.loads(spooled.read_text())["status"] == "Sent Directly"
\ No newline at end of file
@@ -0,0 +1,123 @@
+import pytest
+
+from agents import rate_limiter
+from agents.rate_limiter import ModelRateLimiter, QuotaExceededError, TokenBucket
+
+
+class FakeTime:
+    """Stands in for the time module: sleep() advances monotonic() instantly."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    return fake
+
+
+def test_bucket_allows_a_burst_then_waits_for_the_refill(clock):
+    bucket = TokenBucket(60)
+    assert bucket.acquire(60) == 0.0
+    assert bucket.acquire(1) == pytest.approx(1.0)
+
+
+def test_bucket_refills_with_elapsed_time(clock):
+    bucket = TokenBucket(60)
+    bucket.acquire(60)
+    clock.now += 30
+    assert bucket.acquire(30) == 0.0
+
+
+def test_bucket_clamps_requests_larger_than_its_capacity(clock):
+    bucket = TokenBucket(60)
+    assert bucket.acquire(1000) == 0.0
+    assert bucket.tokens == 0.0
+
+
+def test_set_rate_caps_the_stored_tokens(clock):
+    bucket = TokenBucket(60)
+    bucket.set_rate(10)
+    assert bucket.capacity == 10.0
+    assert bucket.tokens == 10.0
+
+
+def test_throttling_halves_the_rate_down_to_the_floor(clock):
+    limiter = ModelRateLimiter("test-model", 64, 100000)
+    limiter.on_throttled()
+    assert limiter.current_rpm == 32
+    assert limiter.requests.rate_per_minute == 32
+    for _ in range(10):
+        limiter.on_throttled()
+    assert limiter.current_rpm == limiter.min_rpm == 4
+    assert limiter.stats["throttled"] == 11
+
+
+def test_successes_raise_the_rate_back_to_the_ceiling(clock):
+    limiter = ModelRateLimiter("test-model", 10, 100000)
+    limiter.on_throttled()
+    assert limiter.current_rpm == 5
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.current_rpm == 8
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.current_rpm == 10
+    assert limiter.requests.rate_per_minute == 10
+
+
+class FlakyModel:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("429 Resource exhausted: retry in 3s")
+        return f"answer to {prompt}"
+
+
+def test_invoke_retries_quota_errors(clock, monkeypatch):
+    model = FlakyModel(failures=2)
+    monkeypatch.setattr(rate_limiter, "get_model", lambda name, temperature: model)
+    monkeypatch.setitem(rate_limiter._limiters, "flaky-model", ModelRateLimiter("flaky-model", 600, 1000000))
+
+    assert rate_limiter.invoke_with_rate_limit("hi", "flaky-model", 0.0) == "answer to hi"
+    assert model.calls == 3
+    limiter = rate_limiter.get_rate_limiter("flaky-model")
+    assert limiter.stats["retries"] == 2
+    assert limiter.current_rpm == 151  # halved twice, then one success
+    assert all(delay >= 3 for delay in clock.slept[-2:])  # the server's retry hint is honoured
+
+
+def test_invoke_gives_up_after_the_retries(clock, monkeypatch):
+    model = FlakyModel(failures=1000)
+    monkeypatch.setattr(rate_limiter, "get_model", lambda name, temperature: model)
+    monkeypatch.setattr(rate_limiter, "GEMINI_MAX_RETRIES", 2)
+    monkeypatch.setitem(rate_limiter._limiters, "exhausted-model", ModelRateLimiter("exhausted-model", 600, 1000000))
+
+    with pytest.raises(QuotaExceededError):
+        rate_limiter.invoke_with_rate_limit("hi", "exhausted-model", 0.0)
+    assert model.calls == 3
+
+
+def test_other_errors_are_not_retried(clock, monkeypatch):
+    class BrokenModel:
+        def invoke(self, prompt):
+            raise ValueError("bad request")
+
+    monkeypatch.setattr(rate_limiter, "get_model", lambda name, temperature: BrokenModel())
+    monkeypatch.setitem(rate_limiter._limiters, "broken-model", ModelRateLimiter("broken-model", 600, 1000000))
+    with pytest.raises(ValueError):
+        rate_limiter.invoke_with_rate_limit("hi", "broken-model", 0.0)
\ No newline at end of file
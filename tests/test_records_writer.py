@@ -0,0 +1,112 @@
+import json
+import time
+
+import pytest
+
+from utils import records_writer
+from utils.records_writer import RecordsWriter
+
+
+class FlakySink:
+    """Fails the first `failures` writes (like "database is locked"), then keeps the rows."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.rows = []
+        self.closed = False
+
+    def write_rows(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("database is locked")
+        self.rows.extend(rows)
+
+    def flush(self, fsync):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def records(count, start=0):
+    return [{"SR No": number} for number in range(start, start + count)]
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(records_writer, "RETRY_BASE_SECONDS", 0.01)
+
+
+def test_full_batch_is_written_by_the_flusher():
+    sink = FlakySink()
+    writer = RecordsWriter(sink, max_rows=3, max_delay=60)
+    for record in records(3):
+        writer.write(record)
+    wait_for(lambda: len(sink.rows) == 3)
+    assert writer.get_stats()["flushes"] == 1
+    writer.close()
+
+
+def test_partial_batch_is_written_after_max_delay():
+    sink = FlakySink()
+    writer = RecordsWriter(sink, max_rows=100, max_delay=0.05)
+    writer.write({"SR No": 1})
+    wait_for(lambda: sink.rows == [{"SR No": 1}])
+    writer.close()
+
+
+def test_failed_batches_are_retried_in_order():
+    sink = FlakySink(failures=2)
+    writer = RecordsWriter(sink, max_rows=2, max_delay=0.01)
+    for record in records(2):
+        writer.write(record)
+    wait_for(lambda: len(sink.rows) == 2)
+    for record in records(2, start=2):
+        writer.write(record)
+    writer.close()
+    assert sink.rows == records(4)
+    stats = writer.get_stats()
+    assert stats["errors"] == 2 and stats["spilled"] == 0 and stats["buffered"] == 0
+
+
+def test_flush_keeps_rows_buffered_when_the_sink_fails():
+    sink = FlakySink(failures=1)
+    writer = RecordsWriter(sink, max_rows=100, max_delay=60)
+    writer.write({"SR No": 1})
+    assert writer.flush() is False
+    assert writer.get_stats()["buffered"] == 1
+    assert writer.flush() is True
+    assert sink.rows == [{"SR No": 1}]
+    writer.close()
+
+
+def test_close_spills_rows_it_cannot_write(tmp_path, monkeypatch):
+    monkeypatch.setattr(records_writer, "RETRY_BASE_SECONDS", 30.0)
+    spill_path = tmp_path / "unwritten.jsonl"
+    sink = FlakySink(failures=1000)
+    writer = RecordsWriter(sink, max_rows=100, max_delay=60, spill_path=spill_path)
+    for record in records(3):
+        writer.write(record)
+    writer.flush()  # fails and schedules a 30 s retry, which close() must not wait for
+    started = time.monotonic()
+    writer.close()
+    assert time.monotonic() - started < 5
+    assert [json.loads(line) for line in spill_path.read_text().splitlines()] == records(3)
+    assert writer.get_stats()["spilled"] == 3
+    assert sink.closed
+
+
+def test_close_is_idempotent_and_rejects_later_writes():
+    writer = RecordsWriter(FlakySink(), max_rows=10, max_delay=60)
+    writer.write({"SR No": 1})
+    writer.close()
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write({"SR No": 2})
\ No newline at end of file
@@ -0,0 +1,369 @@
+"""
+Columnar archive of processing records for reporting (RECORDS_ARCHIVE_ENABLED), written
+alongside the records store by the records writer. Requires pyarrow.
+
+Records are split into two Parquet datasets partitioned by processing day:
+    <RECORDS_ARCHIVE_DIR>/records/date=YYYY-MM-DD/*.parquet   small columns: sender, domain,
+                                                              classification, review and error flags, ...
+    <RECORDS_ARCHIVE_DIR>/bodies/date=YYYY-MM-DD/*.parquet    Original Content, Summary and
+                                                              Generated Response (zstd), joined on record_id
+so rollups over millions of records only read the small columns.
+
+Usage:
+    python -m utils.records_archive classifications [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--daily]
+    python -m utils.records_archive domains [--since ...] [--until ...] [--top 20]
+    python -m utils.records_archive daily [--since ...] [--until ...]
+    python -m utils.records_archive build [--csv records/records.csv]
+    python -m utils.records_archive compact [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+"""
+import argparse
+import os
+import uuid
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import RECORDS_ARCHIVE_DIR, RECORDS_ARCHIVE_ROW_GROUP_ROWS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Record field -> (column, type name); the body columns go to the bodies dataset
+RECORD_COLUMNS = [
+    ('SR No', 'sr_no', 'int64'),
+    ('Timestamp', 'timestamp', 'string'),
+    ('Sender Email', 'sender_email', 'string'),
+    ('Sender Name', 'sender_name', 'string'),
+    ('Recipient Email', 'recipient_email', 'string'),
+    ('Original Subject', 'subject', 'string'),
+    ('Classification', 'classification', 'string'),
+    ('Requires Human Review', 'requires_human_review', 'bool_'),
+    ('Response Status', 'response_status', 'string'),
+    ('Processing Error', 'processing_error', 'string'),
+    ('Record Save Time', 'record_save_time', 'string'),
+    ('Message ID', 'message_id', 'string'),
+]
+BODY_COLUMNS = [
+    ('Original Content', 'content'),
+    ('Summary', 'summary'),
+    ('Generated Response', 'generated_response'),
+]
+DATASETS = ("records", "bodies")
+COMPRESSION = {"records": "snappy", "bodies": "zstd"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ImportError("The records archive needs pyarrow (pip install pyarrow).") from None
+
+
+def _schemas():
+    pa = _pyarrow()
+    records = pa.schema(
+        [("record_id", pa.string())]
+        + [(column, getattr(pa, type_name)()) for _, column, type_name in RECORD_COLUMNS]
+        + [("sender_domain", pa.string()), ("has_error", pa.bool_())]
+    )
+    bodies = pa.schema([("record_id", pa.string())] + [(column, pa.large_string()) for _, column in BODY_COLUMNS])
+    return records, bodies
+
+
+def _day(record: Dict[str, Any]) -> str:
+    """Processing day of a record (Record Save Time, else the email's Timestamp, else today)."""
+    for field in ('Record Save Time', 'Timestamp'):
+        value = record.get(field)
+        if value:
+            try:
+                return datetime.fromisoformat(str(value)).date().isoformat()
+            except ValueError:
+                continue
+    return date.today().isoformat()
+
+
+def _value(type_name: str, value: Any):
+    if value is None or value == '':
+        return None
+    if type_name == 'bool_':
+        return value in (True, 1, '1', 'True', 'true')
+    if type_name == 'int64':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def _split(records: List[Dict[str, Any]]):
+    """Column dicts for the records and bodies tables of one day's rows."""
+    record_columns = {"record_id": [], "sender_domain": [], "has_error": []}
+    body_columns = {"record_id": []}
+    for record in records:
+        record_id = uuid.uuid4().hex
+        record_columns["record_id"].append(record_id)
+        body_columns["record_id"].append(record_id)
+        for field, column, type_name in RECORD_COLUMNS:
+            record_columns.setdefault(column, []).append(_value(type_name, record.get(field)))
+        sender = str(record.get('Sender Email') or '')
+        record_columns["sender_domain"].append(sender.rpartition('@')[2].lower() or None)
+        record_columns["has_error"].append(bool(record.get('Processing Error')))
+        for field, column in BODY_COLUMNS:
+            body_columns.setdefault(column, []).append(_value('string', record.get(field)))
+    return record_columns, body_columns
+
+
+class _DayFiles:
+    """The open records/bodies Parquet files of one day; written as .tmp and renamed on close, so readers never see a partial file."""
+
+    def __init__(self, archive_dir: Path, day: str, schemas):
+        pa = _pyarrow()
+        name = f"part-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        self.paths = []
+        self.writers = []
+        for dataset, schema in zip(DATASETS, schemas):
+            path = archive_dir / dataset / f"date={day}" / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            self.paths.append((tmp_path, path))
+            self.writers.append(pa.parquet.ParquetWriter(str(tmp_path), schema, compression=COMPRESSION[dataset]))
+
+    def write(self, tables) -> None:
+        for writer, table in zip(self.writers, tables):
+            writer.write_table(table)
+
+    def close(self, fsync: bool = False) -> None:
+        for writer in self.writers:
+            writer.close()
+        for tmp_path, path in self.paths:
+            if fsync:
+                with open(tmp_path, 'rb') as file:
+                    os.fsync(file.fileno())
+            tmp_path.replace(path)
+
+
+class ArchiveSink:
+    """
+    Records writer sink (utils/records_writer.py) that appends records to the day-partitioned
+    archive, in row groups of up to RECORDS_ARCHIVE_ROW_GROUP_ROWS. flush(), run by the records
+    writer after every batch, closes the open part files, so archived rows can be queried (and
+    survive a crash) as soon as their batch is written; the writer batches archive rows for up to
+    RECORDS_ARCHIVE_FLUSH_SECONDS. A quiet mailbox still collects a small part file per flush;
+    compact_archive (the "compact" command) merges them. Without flushes (build_archive) a day's
+    file stays open until records for a later day arrive, or close().
+    """
+
+    def __init__(self, archive_dir: Path = RECORDS_ARCHIVE_DIR, row_group_rows: int = RECORDS_ARCHIVE_ROW_GROUP_ROWS):
+        self.archive_dir = Path(archive_dir)
+        self.row_group_rows = max(1, row_group_rows)
+        self.schemas = _schemas()
+        self.files: Dict[str, _DayFiles] = {}
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for record in rows:
+            by_day.setdefault(_day(record), []).append(record)
+        for day, records in by_day.items():
+            for start in range(0, len(records), self.row_group_rows):
+                self._write_day(day, records[start:start + self.row_group_rows])
+        # Records arrive in processing order, so an earlier day is finished once a later one shows up
+        latest = max(self.files, default=None)
+        for day in [day for day in self.files if day < latest]:
+            self._close_day(day)
+
+    def flush(self, fsync: bool) -> None:
+        # Parquet files are only readable once closed (the footer is written last); the next batch starts new part files
+        for day in list(self.files):
+            self._close_day(day, fsync)
+
+    def close(self) -> None:
+        self.flush(fsync=False)
+
+    def _write_day(self, day: str, records: List[Dict[str, Any]]) -> None:
+        pa = _pyarrow()
+        record_columns, body_columns = _split(records)
+        tables = [pa.Table.from_pydict(columns, schema=schema) for columns, schema in zip((record_columns, body_columns), self.schemas)]
+        if day not in self.files:
+            self.files[day] = _DayFiles(self.archive_dir, day, self.schemas)
+        self.files[day].write(tables)
+
+    def _close_day(self, day: str, fsync: bool = False) -> None:
+        files = self.files.pop(day, None)
+        if files:
+            files.close(fsync)
+
+
+def _dataset(name: str, archive_dir: Path = RECORDS_ARCHIVE_DIR):
+    _pyarrow()
+    import pyarrow.dataset as ds
+    path = Path(archive_dir) / name
+    if not path.exists():
+        raise FileNotFoundError(f"No archived records at {path}; enable RECORDS_ARCHIVE_ENABLED or run the 'build' command.")
+    return ds.dataset(str(path), format="parquet", partitioning="hive", exclude_invalid_files=True)
+
+
+def read_records(columns: List[str], since: str = None, until: str = None, archive_dir: Path = RECORDS_ARCHIVE_DIR):
+    """
+    Reads the given small columns (plus the "date" partition column on request) for the days in
+    [since, until). Only the matching day partitions and columns are read.
+
+    Returns:
+        pyarrow.Table
+    """
+    import pyarrow.dataset as ds
+    dataset = _dataset("records", archive_dir)
+    date_field = ds.field("date").cast("string")
+    condition = None
+    if since:
+        condition = date_field >= since
+    if until:
+        condition = (date_field < until) if condition is None else condition & (date_field < until)
+    return dataset.to_table(columns=columns, filter=condition)
+
+
+def read_bodies(record_ids: List[str], archive_dir: Path = RECORDS_ARCHIVE_DIR):
+    """Reads the body columns of the given records. Returns a pyarrow.Table."""
+    import pyarrow.dataset as ds
+    return _dataset("bodies", archive_dir).to_table(filter=ds.field("record_id").isin(record_ids))
+
+
+def _rates(table, keys: List[str]):
+    """Emails, review rate and error rate per value of `keys`, largest groups first."""
+    pa = _pyarrow()
+    import pyarrow.compute as pc
+    table = table.append_column("reviewed", pc.cast(pc.fill_null(table["requires_human_review"], False), pa.int8()))
+    table = table.append_column("errored", pc.cast(table["has_error"], pa.int8()))
+    grouped = table.group_by(keys).aggregate([("reviewed", "count"), ("reviewed", "mean"), ("errored", "mean")])
+    return grouped.rename_columns(keys + ["emails", "review_rate", "error_rate"])
+
+
+def classification_mix(since: str = None, until: str = None, daily: bool = False, archive_dir: Path = RECORDS_ARCHIVE_DIR):
+    """Records per classification (per day and classification with daily=True)."""
+    keys = ["date", "classification"] if daily else ["classification"]
+    table = read_records(keys, since, until, archive_dir)
+    counts = table.group_by(keys).aggregate([([], "count_all")]).rename_columns(keys + ["emails"])
+    return counts.sort_by([(key, "ascending") for key in keys[:-1]] + [("emails", "descending")])
+
+
+def domain_rates(since: str = None, until: str = None, archive_dir: Path = RECORDS_ARCHIVE_DIR):
+    """Emails, review rate and error rate per sender domain."""
+    table = read_records(["sender_domain", "requires_human_review", "has_error"], since, until, archive_dir)
+    return _rates(table, ["sender_domain"]).sort_by([("emails", "descending")])
+
+
+def daily_rates(since: str = None, until: str = None, archive_dir: Path = RECORDS_ARCHIVE_DIR):
+    """Emails, review rate and error rate per processing day."""
+    table = read_records(["date", "requires_human_review", "has_error"], since, until, archive_dir)
+    return _rates(table, ["date"]).sort_by([("date", "ascending")])
+
+
+def build_archive(records, archive_dir: Path = RECORDS_ARCHIVE_DIR) -> int:
+    """Archives an iterable of records (e.g. the existing store or records.csv). Returns the number archived."""
+    sink = ArchiveSink(archive_dir)
+    count = 0
+    batch = []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= sink.row_group_rows:
+                sink.write_rows(batch)
+                count += len(batch)
+                batch = []
+        sink.write_rows(batch)
+        count += len(batch)
+    finally:
+        sink.close()
+    return count
+
+
+def compact_archive(archive_dir: Path = RECORDS_ARCHIVE_DIR, since: str = None, until: str = None,
+                    row_group_rows: int = RECORDS_ARCHIVE_ROW_GROUP_ROWS) -> int:
+    """
+    Merges the part files of each day in [since, until) into one file per dataset, in row groups
+    of up to `row_group_rows`. Files still being written (.tmp) are left alone, so this can run
+    while the pipeline archives. The merged file is renamed into place before the parts are
+    removed: a concurrent reader may briefly count those rows twice, but never misses any.
+
+    Returns:
+        int: The number of part files merged away.
+    """
+    pa = _pyarrow()
+    merged = 0
+    for dataset, schema in zip(DATASETS, _schemas()):
+        for day_dir in sorted((Path(archive_dir) / dataset).glob("date=*")):
+            day = day_dir.name.partition("=")[2]
+            if (since and day < since) or (until and day >= until):
+                continue
+            parts = sorted(day_dir.glob("*.parquet"))
+            if len(parts) < 2:
+                continue
+            path = day_dir / f"part-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            tmp_path = path.with_name(path.name + ".tmp")
+            pending, pending_rows = [], 0
+            with pa.parquet.ParquetWriter(str(tmp_path), schema, compression=COMPRESSION[dataset]) as writer:
+                for part in parts:
+                    table = pa.parquet.ParquetFile(str(part)).read().cast(schema)
+                    pending.append(table)
+                    pending_rows += table.num_rows
+                    if pending_rows >= row_group_rows:
+                        writer.write_table(pa.concat_tables(pending), row_group_size=row_group_rows)
+                        pending, pending_rows = [], 0
+                if pending:
+                    writer.write_table(pa.concat_tables(pending), row_group_size=row_group_rows)
+            tmp_path.replace(path)
+            for part in parts:
+                part.unlink()
+            merged += len(parts)
+            logger.info(f"Compacted {len(parts)} {dataset} part files for {day}.")
+    return merged
+
+
+def _print_table(table, limit: Optional[int] = None) -> None:
+    rows = table.to_pylist()[:limit] if limit else table.to_pylist()
+    columns = table.column_names
+    print("  ".join(f"{column:>24}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{row[column]:>24.3f}" if isinstance(row[column], float) else f"{str(row[column]):>24}" for column in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", default=str(RECORDS_ARCHIVE_DIR))
+    commands = parser.add_subparsers(dest="command", required=True)
+    classifications = commands.add_parser("classifications", help="Classification mix")
+    classifications.add_argument("--daily", action="store_true", help="Break the mix down per day")
+    domains = commands.add_parser("domains", help="Emails, review rate and error rate per sender domain")
+    domains.add_argument("--top", type=int, default=20)
+    daily = commands.add_parser("daily", help="Emails, review rate and error rate per day")
+    build = commands.add_parser("build", help="Archive the existing records (from the records backend or a CSV file)")
+    build.add_argument("--csv", help="Read this records.csv instead of the configured records backend")
+    compact = commands.add_parser("compact", help="Merge each day's small part files into one")
+    for command in (classifications, domains, daily, compact):
+        command.add_argument("--since", help="First day (YYYY-MM-DD)")
+        command.add_argument("--until", help="Day after the last one (YYYY-MM-DD)")
+    args = parser.parse_args()
+    archive_dir = Path(args.archive_dir)
+
+    if args.command == "classifications":
+        _print_table(classification_mix(args.since, args.until, args.daily, archive_dir))
+    elif args.command == "domains":
+        _print_table(domain_rates(args.since, args.until, archive_dir), limit=args.top)
+    elif args.command == "daily":
+        _print_table(daily_rates(args.since, args.until, archive_dir))
+    elif args.command == "compact":
+        print(f"Merged {compact_archive(archive_dir, args.since, args.until)} part files in {archive_dir}.")
+    else:
+        if args.csv:
+            import csv
+            with open(args.csv, "r", newline="", encoding="utf-8") as f:
+                count = build_archive(csv.DictReader(f), archive_dir)
+        else:
+            from utils.records_manager import iter_records
+            count = build_archive(iter_records(), archive_dir)
+        print(f"Archived {count} records into {archive_dir}.")
+        compact_archive(archive_dir)  # fold in the part files the pipeline wrote before the build
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,16 +1,20 @@
 # utils/record_manager.py
 import csv
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime
 import os
 import logging
+from config import RECORDS_BACKEND, RECORDS_ARCHIVE_ENABLED, RECORDS_ARCHIVE_ROW_GROUP_ROWS, RECORDS_ARCHIVE_FLUSH_SECONDS
 
 logger = logging.getLogger(__name__)
 
 # Define the directory where records will be saved
 RECORDS_DIR = Path(__file__).parent.parent / "records"
 RECORDS_CSV_PATH = RECORDS_DIR / "records.csv"
+RECORDS_DB_PATH = RECORDS_DIR / "records.sqlite3"
+RECORDS_SPILL_PATH = RECORDS_DIR / "unwritten_records.jsonl"  # records that could not be written by shutdown
+ARCHIVE_SPILL_PATH = RECORDS_DIR / "unwritten_archive.jsonl"
 
 # Define CSV headers - make sure these match the keys you'll use in log_email_record
 CSV_HEADERS = [
@@ -20,6 +24,8 @@ CSV_HEADERS = [
     'Processing Error', 'Record Save Time'
 ]
 
+_archive_available = RECORDS_ARCHIVE_ENABLED
+
 def initialize_csv(csv_path: Path = RECORDS_CSV_PATH):
     """
     Ensures the CSV file exists with headers in the specified records directory.
@@ -34,17 +40,77 @@ def initialize_csv(csv_path: Path = RECORDS_CSV_PATH):
     else:
         logger.debug(f"{csv_path} already exists.")
 
+def initialize_records():
+    """
+    Prepares the configured records backend (RECORDS_BACKEND). The first time the SQLite store
+    is created, an existing records.csv is imported into it so earlier records are kept.
+    """
+    if RECORDS_BACKEND != "sqlite":
+        initialize_csv(RECORDS_CSV_PATH)
+        return
+    from utils.records_store import get_records_store
+    is_new = not RECORDS_DB_PATH.exists()
+    store = get_records_store()
+    if is_new and RECORDS_CSV_PATH.exists():
+        imported = store.import_csv(RECORDS_CSV_PATH)
+        logger.info(f"Imported {imported} records from {RECORDS_CSV_PATH} into {RECORDS_DB_PATH}.")
+
 def log_email_record(record_data: Dict[str, Any], csv_path: Path = RECORDS_CSV_PATH):
     """
-    Appends a single email processing record to the CSV file.
-    The record_data dict should have keys matching CSV_HEADERS.
+    Queues a single email processing record for the records backend: the SQLite store, or the
+    CSV file at csv_path when RECORDS_BACKEND is "csv". Records are buffered and written in
+    batches by a background flusher (utils/records_writer.py); safe to call from any thread.
+    The record_data dict should have keys matching CSV_HEADERS ('Message ID' is also kept by the store).
+    With RECORDS_ARCHIVE_ENABLED the record is also appended to the Parquet archive.
     """
-    initialize_csv(csv_path) # Ensure headers are present
+    _get_writer(csv_path).write(record_data)
+    archive_writer = _get_archive_writer()
+    if archive_writer:
+        archive_writer.write(record_data)
+
+def _get_writer(csv_path: Path):
+    from utils.records_writer import get_records_writer, CsvSink, SqliteSink
+    if RECORDS_BACKEND == "sqlite":
+        from utils.records_store import get_records_store
+        return get_records_writer("sqlite", lambda: SqliteSink(get_records_store()), spill_path=RECORDS_SPILL_PATH)
+    return get_records_writer(Path(csv_path), lambda: CsvSink(csv_path, CSV_HEADERS), spill_path=RECORDS_SPILL_PATH)
 
-    # Prepare data for DictWriter, filling missing fields or ensuring order
-    row_to_write = {header: record_data.get(header, '') for header in CSV_HEADERS}
+def _get_archive_writer():
+    global _archive_available
+    if not _archive_available:
+        return None
+    from utils.records_writer import get_records_writer
+    try:
+        from utils.records_archive import ArchiveSink
+        # Larger, slower batches than the store: each one becomes a closed part file per day
+        return get_records_writer("archive", ArchiveSink, spill_path=ARCHIVE_SPILL_PATH,
+                                  max_rows=RECORDS_ARCHIVE_ROW_GROUP_ROWS, max_delay=RECORDS_ARCHIVE_FLUSH_SECONDS)
+    except ImportError as e:
+        logger.warning(f"{e} Records will not be archived.")
+        _archive_available = False
+        return None
 
-    with open(csv_path, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
-        writer.writerow(row_to_write)
-    logger.info(f"Logged record for email ID {record_data.get('SR No', 'N/A')} from {record_data.get('Sender Email', 'N/A')}")
\ No newline at end of file
+def flush_records():
+    """Writes every buffered record to the records backend."""
+    from utils.records_writer import flush_records_writers
+    flush_records_writers()
+
+def close_records():
+    """Writes every buffered record and closes the record writers (also done at exit)."""
+    from utils.records_writer import close_records_writers
+    close_records_writers()
+
+def iter_records(fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the saved records, oldest first, as dicts keyed by CSV header, from whichever
+    backend is configured. `fields` limits the columns read from the SQLite store.
+    """
+    flush_records()
+    if RECORDS_BACKEND == "sqlite":
+        from utils.records_store import get_records_store
+        yield from get_records_store().iter_records(fields=fields)
+        return
+    if not RECORDS_CSV_PATH.exists():
+        return
+    with open(RECORDS_CSV_PATH, 'r', newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""
+SQLite records store (RECORDS_BACKEND=sqlite, records/records.sqlite3), replacing the
+append-only records.csv.
+
+Records keep the CSV column names at the API boundary (the keys of CSV_HEADERS plus
+'Message ID'), so callers and exports look the same as before. The database runs in WAL
+mode, so readers never block the pipeline's writes, and inserts are batched into one
+transaction per call.
+
+Usage:
+    python -m utils.records_store export [--output records.csv] [--since ISO] [--until ISO]
+                                         [--sender ADDRESS] [--classification LABEL]
+    python -m utils.records_store import-csv [records/records.csv]
+    python -m utils.records_store counts [--by Classification] [--since ISO] [--until ISO]
+"""
+import argparse
+import csv
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from config import RECORDS_FSYNC
+from utils.logger import get_logger
+from utils.records_manager import CSV_HEADERS, RECORDS_CSV_PATH, RECORDS_DB_PATH
+
+logger = get_logger(__name__)
+
+# Record field -> column. 'Message ID' is not in records.csv; it is kept for de-duplication and lookups.
+COLUMNS = {
+    'SR No': 'sr_no',
+    'Timestamp': 'timestamp',
+    'Sender Email': 'sender_email',
+    'Sender Name': 'sender_name',
+    'Recipient Email': 'recipient_email',
+    'Original Subject': 'subject',
+    'Original Content': 'content',
+    'Classification': 'classification',
+    'Summary': 'summary',
+    'Generated Response': 'generated_response',
+    'Requires Human Review': 'requires_human_review',
+    'Response Status': 'response_status',
+    'Processing Error': 'processing_error',
+    'Record Save Time': 'record_save_time',
+    'Message ID': 'message_id'
+}
+FIELDS = {column: field for field, column in COLUMNS.items()}
+# Columns that can be filtered or grouped on; all of them are indexed
+GROUP_COLUMNS = ("sender_email", "classification", "response_status", "requires_human_review")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sr_no INTEGER,
+    timestamp TEXT,
+    sender_email TEXT COLLATE NOCASE,
+    sender_name TEXT,
+    recipient_email TEXT,
+    subject TEXT,
+    content TEXT,
+    classification TEXT,
+    summary TEXT,
+    generated_response TEXT,
+    requires_human_review INTEGER,
+    response_status TEXT,
+    processing_error TEXT,
+    record_save_time TEXT,
+    message_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_sender ON records(sender_email);
+CREATE INDEX IF NOT EXISTS idx_records_classification ON records(classification);
+CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records(timestamp);
+CREATE INDEX IF NOT EXISTS idx_records_message_id ON records(message_id);
+CREATE INDEX IF NOT EXISTS idx_records_response_status ON records(response_status);
+CREATE INDEX IF NOT EXISTS idx_records_review ON records(requires_human_review);
+"""
+# PRAGMA user_version of a database whose timestamps are normalized (see normalize_timestamp)
+SCHEMA_VERSION = 1
+
+
+def normalize_timestamp(value: Any) -> Optional[str]:
+    """
+    Returns a timestamp as UTC ISO 8601 text with one fixed layout ('2025-01-01T09:30:00+00:00'),
+    so stored timestamps and the since/until filters compare correctly as text whatever
+    offset they came with. Accepts ISO 8601 (a date alone means its midnight) and RFC 2822
+    dates; naive times are taken as local time. Values that don't parse are kept as text.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            try:
+                parsed = parsedate_to_datetime(text)
+            except (TypeError, ValueError):
+                return text
+    return parsed.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+def _to_column(column: str, value: Any):
+    if value is None or value == '':
+        return None
+    if column == 'requires_human_review':
+        return int(value in (True, 1, '1', 'True', 'true'))
+    if column == 'timestamp':
+        return normalize_timestamp(value)
+    if column == 'sr_no':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def _to_field(column: str, value: Any):
+    if column == 'requires_human_review' and value is not None:
+        return bool(value)
+    return value
+
+
+class RecordsStore:
+    """
+    Email processing records in SQLite. One connection per store, guarded by a lock, so the
+    store can be shared by worker threads; other processes can read and write the same file
+    (WAL mode, with a busy timeout for concurrent writers).
+    """
+
+    def __init__(self, path: Path = RECORDS_DB_PATH, busy_timeout_ms: int = 10000, fsync: bool = RECORDS_FSYNC):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=busy_timeout_ms / 1000)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable at each WAL checkpoint (a power loss can drop the last transactions); FULL syncs every commit
+        self.conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self.conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._normalize_timestamps()
+
+    def _normalize_timestamps(self) -> None:
+        """One-off upgrade of a database written before timestamps were normalized on insert."""
+        rows = self.conn.execute("SELECT id, timestamp FROM records WHERE timestamp IS NOT NULL").fetchall()
+        updates = [(normalized, row_id) for row_id, value in rows if (normalized := normalize_timestamp(value)) != value]
+        with self.conn:
+            self.conn.executemany("UPDATE records SET timestamp = ? WHERE id = ?", updates)
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if updates:
+            logger.info(f"Normalized {len(updates)} record timestamps to UTC.")
+
+    def insert_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Inserts records (dicts keyed by CSV header) in one transaction. Returns the number inserted."""
+        columns = list(COLUMNS.values())
+        rows = [tuple(_to_column(column, record.get(FIELDS[column])) for column in columns) for record in records]
+        if not rows:
+            return 0
+        sql = f"INSERT INTO records ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        with self.lock, self.conn:
+            self.conn.executemany(sql, rows)
+        return len(rows)
+
+    def _where(self, sender: str = None, classification: str = None, since: str = None, until: str = None,
+               message_id: str = None):
+        clauses, params = [], []
+        for column, value in (("sender_email", sender), ("classification", classification), ("message_id", message_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(normalize_timestamp(since))
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(normalize_timestamp(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def iter_records(self, sender: str = None, classification: str = None, since: str = None, until: str = None,
+                     message_id: str = None, fields: Optional[List[str]] = None, limit: int = None,
+                     batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yields records (dicts keyed by CSV header) matching every given filter, in the order
+        they were written. With the outbound queue a record is written once its reply is
+        sent, so this is completion order; sort on 'SR No' within a run for processing order.
+        `since`/`until` are normalized like the stored timestamps (see normalize_timestamp);
+        `fields` limits the columns read, which keeps large bodies out of memory for aggregate work.
+        """
+        columns = [COLUMNS[field] for field in fields] if fields else list(COLUMNS.values())
+        where, params = self._where(sender, classification, since, until, message_id)
+        sql = f"SELECT id, {', '.join(columns)} FROM records{where}{' AND' if where else ' WHERE'} id > ? ORDER BY id LIMIT ?"
+        # Keyset pagination, so the lock is not held while the caller works through the results
+        last_id, remaining = 0, limit
+        while remaining is None or remaining > 0:
+            page_size = batch_size if remaining is None else min(batch_size, remaining)
+            with self.lock:
+                rows = self.conn.execute(sql, params + [last_id, page_size]).fetchall()
+            for row in rows:
+                yield {FIELDS[column]: _to_field(column, value) for column, value in zip(columns, row[1:])}
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def query(self, **filters) -> List[Dict[str, Any]]:
+        """List form of iter_records."""
+        return list(self.iter_records(**filters))
+
+    def counts(self, by: str = "classification", since: str = None, until: str = None) -> Dict[Any, int]:
+        """Number of records per value of a field ('Classification', 'Sender Email', ...), e.g. the classification mix."""
+        column = COLUMNS.get(by, by)
+        if column not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group records by '{by}'; use one of {[FIELDS[c] for c in GROUP_COLUMNS]}")
+        where, params = self._where(since=since, until=until)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {column}, COUNT(*) FROM records{where} GROUP BY {column} ORDER BY COUNT(*) DESC", params
+            ).fetchall()
+        return {_to_field(column, value): count for value, count in rows}
+
+    def count(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def export_csv(self, output, **filters) -> int:
+        """Writes matching records in the records.csv layout (CSV_HEADERS). `output` is a path or a text file. Returns the row count."""
+        own_file = not hasattr(output, "write")
+        f = open(output, "w", newline="", encoding="utf-8") if own_file else output
+        try:
+            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS, extrasaction="ignore")
+            writer.writeheader()
+            written = 0
+            for record in self.iter_records(**filters):
+                writer.writerow({header: '' if record.get(header) is None else record[header] for header in CSV_HEADERS})
+                written += 1
+            return written
+        finally:
+            if own_file:
+                f.close()
+
+    def import_csv(self, csv_path: Path = RECORDS_CSV_PATH, batch_size: int = 1000) -> int:
+        """Loads an existing records.csv into the store, in batches. Returns the number of rows imported."""
+        imported = 0
+        with open(csv_path, "r", newline="", encoding="utf-8") as f:
+            batch = []
+            for row in csv.DictReader(f):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    imported += self.insert_many(batch)
+                    batch = []
+            imported += self.insert_many(batch)
+        return imported
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+_store: Optional[RecordsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_records_store() -> RecordsStore:
+    """Returns the process-wide store at RECORDS_DB_PATH, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecordsStore(RECORDS_DB_PATH)
+            logger.info(f"Records store opened at {RECORDS_DB_PATH}.")
+        return _store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=str(RECORDS_DB_PATH), help="SQLite records database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write records as CSV (records.csv layout)")
+    export.add_argument("--output", help="CSV file to write (default: stdout)")
+    import_parser = commands.add_parser("import-csv", help="Load an existing records.csv")
+    import_parser.add_argument("csv_path", nargs="?", default=str(RECORDS_CSV_PATH))
+    counts = commands.add_parser("counts", help="Record counts per classification, sender, status or review flag")
+    counts.add_argument("--by", default="Classification")
+    for command in (export, counts):
+        command.add_argument("--since", help="ISO timestamp or date, local time unless it has an offset (inclusive)")
+        command.add_argument("--until", help="ISO timestamp or date, local time unless it has an offset (exclusive)")
+    export.add_argument("--sender")
+    export.add_argument("--classification")
+    args = parser.parse_args()
+
+    store = RecordsStore(args.db)
+    if args.command == "export":
+        filters = dict(sender=args.sender, classification=args.classification, since=args.since, until=args.until)
+        written = store.export_csv(args.output or sys.stdout, **filters)
+        print(f"Exported {written} records.", file=sys.stderr)
+    elif args.command == "import-csv":
+        print(f"Imported {store.import_csv(Path(args.csv_path))} records into {args.db}.")
+    else:
+        for value, count in store.counts(args.by, args.since, args.until).items():
+            print(f"{count:>8}  {value}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
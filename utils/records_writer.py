@@ -0,0 +1,258 @@
+import atexit
+import csv
+import json
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from config import RECORDS_FLUSH_ROWS, RECORDS_FLUSH_SECONDS, RECORDS_FSYNC
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Records are buffered in memory and written in batches by a background flusher, so the
+# workers producing them never open a file or run a transaction themselves.
+
+RETRY_BASE_SECONDS = 0.5  # first retry after a failed batch; doubles per consecutive failure
+RETRY_MAX_SECONDS = 30.0
+
+
+class CsvSink:
+    """Appends rows to a records CSV through one file handle that stays open until close()."""
+
+    def __init__(self, csv_path: Path, headers: List[str]):
+        self.csv_path = Path(csv_path)
+        self.headers = headers
+        self.csv_path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.csv_path.exists() or self.csv_path.stat().st_size == 0
+        self.file = open(self.csv_path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=headers, extrasaction='ignore')
+        if is_new:
+            self.writer.writeheader()
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self.writer.writerows({header: row.get(header, '') for header in self.headers} for row in rows)
+
+    def flush(self, fsync: bool) -> None:
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class SqliteSink:
+    """Inserts rows into the records store, one transaction per flushed batch (fsync is set by the store's synchronous mode)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        self.store.insert_many(rows)
+
+    def flush(self, fsync: bool) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RecordsWriter:
+    """
+    Thread-safe buffered writer for processing records. Any number of threads can call
+    write(); rows are kept in memory and written to the sink in order by a background
+    thread once `max_rows` are buffered or the oldest buffered row is `max_delay` seconds old.
+
+    A batch the sink rejects (e.g. "database is locked", a full disk) goes back to the head of
+    the buffer and is retried with exponential backoff. close() (also run at exit) makes one
+    final attempt to write whatever is still buffered, without waiting out any backoff, so
+    Ctrl+C or SIGTERM never hangs on a failing sink; rows it cannot write are appended as JSON
+    lines to `spill_path` instead of being dropped. A crash can lose at most the rows buffered since the
+    last flush; with `fsync` each flushed batch is also forced to disk.
+    """
+
+    def __init__(self, sink, max_rows: int = RECORDS_FLUSH_ROWS, max_delay: float = RECORDS_FLUSH_SECONDS,
+                 fsync: bool = RECORDS_FSYNC, name: str = "records", spill_path: Optional[Path] = None):
+        self.sink = sink
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max(0.0, max_delay)
+        self.fsync = fsync
+        self.spill_path = Path(spill_path) if spill_path else None
+        self._buffer: List[Dict[str, Any]] = []
+        self._oldest = 0.0
+        self._closed = False
+        self._failures = 0  # consecutive failed batches
+        self._retry_at = 0.0
+        self._condition = threading.Condition()
+        self._io_lock = threading.Lock()  # keeps batches in order when close() or flush() races the flusher
+        self._stats = {"rows": 0, "flushes": 0, "errors": 0, "spilled": 0}
+        self._thread = threading.Thread(target=self._run, name=f"{name}-flusher", daemon=True)
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("RecordsWriter is closed")
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(record)
+            # The first row starts the max_delay clock and a full buffer is due now; wake the flusher for both
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_rows:
+                self._condition.notify()
+
+    def flush(self) -> bool:
+        """
+        Writes every buffered row now, on the calling thread. If the sink fails the rows stay
+        buffered (ahead of newer ones) for a later retry and False is returned.
+        """
+        with self._io_lock:
+            with self._condition:
+                rows, self._buffer = self._buffer, []
+                oldest = self._oldest
+            if self._write(rows):
+                return True
+            with self._condition:
+                self._buffer[:0] = rows
+                self._oldest = oldest
+                self._failures += 1
+                backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (self._failures - 1))
+                self._retry_at = time.monotonic() + backoff
+            logger.warning(f"Keeping {len(self._buffer)} records buffered; retrying in {backoff:.1f}s.")
+            return False
+
+    def close(self) -> None:
+        """Stops the flusher, makes one last attempt to write the remaining rows (spilling them if it fails) and closes the sink. Safe to call more than once."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        with self._io_lock:
+            with self._condition:
+                rows, self._buffer = self._buffer, []
+            if not self._write(rows):
+                self._spill(rows)
+        try:
+            self.sink.close()
+        except Exception as e:
+            logger.error(f"Could not close the records sink: {e}", exc_info=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._condition:
+            return dict(self._stats, buffered=len(self._buffer))
+
+    def _write(self, rows: List[Dict[str, Any]]) -> bool:
+        if not rows:
+            return True
+        try:
+            self.sink.write_rows(rows)
+            self.sink.flush(self.fsync)
+        except Exception as e:
+            logger.error(f"Could not write {len(rows)} records: {e}", exc_info=True)
+            with self._condition:
+                self._stats["errors"] += 1
+            return False
+        with self._condition:
+            self._stats["rows"] += len(rows)
+            self._stats["flushes"] += 1
+            self._failures = 0
+            self._retry_at = 0.0
+        logger.debug(f"Wrote {len(rows)} records.")
+        return True
+
+    def _spill(self, rows: List[Dict[str, Any]]) -> None:
+        if self.spill_path is None:
+            logger.error(f"Dropping {len(rows)} records that could not be written.")
+            return
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as file:
+                for row in rows:
+                    file.write(json.dumps(row, default=str) + "\n")
+        except Exception as e:
+            logger.error(f"Dropping {len(rows)} records that could not be written or spilled to {self.spill_path}: {e}", exc_info=True)
+            return
+        with self._condition:
+            self._stats["spilled"] += len(rows)
+        logger.error(f"Saved {len(rows)} records that could not be written to {self.spill_path}.")
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed:
+                    now = time.monotonic()
+                    if not self._buffer:
+                        self._condition.wait()
+                        continue
+                    # Due when the batch is full or its oldest row too old, but not before a pending retry
+                    due = now if len(self._buffer) >= self.max_rows else self._oldest + self.max_delay
+                    due = max(due, self._retry_at)
+                    if due <= now:
+                        break
+                    self._condition.wait(due - now)
+                if self._closed:
+                    return
+            self.flush()
+
+
+_writers: Dict[Any, RecordsWriter] = {}
+_writers_lock = threading.Lock()
+_closed_stats: Dict[str, Dict[str, int]] = {}  # per key, from writers already closed
+
+
+def _exit_on_signal(signum, frame):
+    # Unwinds like Ctrl+C, so finally blocks and the atexit flush run before the process exits
+    raise SystemExit(128 + signum)
+
+
+def get_records_writer(key, make_sink, spill_path: Optional[Path] = None, max_rows: int = RECORDS_FLUSH_ROWS,
+                       max_delay: float = RECORDS_FLUSH_SECONDS) -> RecordsWriter:
+    """
+    Returns the shared writer for `key` (e.g. the CSV path), creating it with `make_sink()` on
+    first use; rows it cannot write by close() are saved to `spill_path`. The first writer also makes SIGTERM exit through the normal shutdown path when no
+    other handler is installed, so buffered records are written before the process stops.
+    """
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = RecordsWriter(make_sink(), max_rows=max_rows, max_delay=max_delay, spill_path=spill_path)
+            if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+                signal.signal(signal.SIGTERM, _exit_on_signal)
+        return writer
+
+
+def flush_records_writers() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+@atexit.register
+def close_records_writers() -> None:
+    """Writes all buffered records and closes the writers; later records get fresh writers."""
+    with _writers_lock:
+        writers = list(_writers.items())
+        _writers.clear()
+    for key, writer in writers:
+        writer.close()
+        with _writers_lock:
+            totals = _closed_stats.setdefault(str(key), {"rows": 0, "flushes": 0, "errors": 0, "spilled": 0})
+            for name in totals:
+                totals[name] += writer.get_stats()[name]
+
+
+def get_records_writer_stats() -> Dict[str, Dict[str, int]]:
+    """Returns rows written, flushes, failed flushes, rows spilled and rows still buffered per writer key, over the life of the process."""
+    with _writers_lock:
+        writers = list(_writers.items())
+        stats = {key: dict(totals, buffered=0) for key, totals in _closed_stats.items()}
+    for key, writer in writers:
+        totals = stats.setdefault(str(key), {"rows": 0, "flushes": 0, "errors": 0, "spilled": 0, "buffered": 0})
+        for name, value in writer.get_stats().items():
+            totals[name] += value
+    return stats
\ No newline at end of file
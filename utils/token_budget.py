@@ -0,0 +1,163 @@
+import itertools
+import re
+import threading
+from typing import Dict, List, Tuple
+from config import AGENT_TOKEN_BUDGETS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Reply headers that start the quoted history of a forwarded/replied thread
+QUOTE_HEADER_PATTERN = re.compile(
+    r"^(On .{0,200}wrote:\s*$|-{2,}\s*Original Message\s*-{2,}|-{2,}\s*Forwarded message\s*-{2,}|From:\s.+\n(Sent|Date):\s)",
+    re.IGNORECASE | re.MULTILINE
+)
+SIGNATURE_PATTERN = re.compile(r"^(--\s*$|Sent from my \w+|Get Outlook for \w+)", re.IGNORECASE | re.MULTILINE)
+DISCLAIMER_MARKERS = (
+    "confidentiality notice", "this email and any attachments", "this e-mail and any attachments",
+    "if you are not the intended recipient", "intended solely for the use", "disclaimer:",
+    "please consider the environment before printing"
+)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_usage: Dict[int, Dict[str, int]] = {}
+_usage_lock = threading.Lock()
+_usage_keys = itertools.count(1)
+
+
+def _get_encoding():
+    """
+    Loads the tiktoken encoding once. tiktoken downloads its BPE file on first use, so
+    when that isn't possible we fall back to a ~4 characters/token approximation.
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken encoding unavailable ({e}); using an approximate token count.")
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens]).rstrip() + " [...]"
+    if len(text) <= max_tokens * 4:
+        return text
+    return text[:max_tokens * 4].rsplit(" ", 1)[0].rstrip() + " [...]"
+
+
+def strip_quoted_text(body: str) -> str:
+    """Drops the quoted history of a reply/forward ("On ... wrote:", "> " lines, Original Message blocks)."""
+    match = QUOTE_HEADER_PATTERN.search(body)
+    if match and match.start() > 0:
+        body = body[:match.start()]
+    return "\n".join(line for line in body.splitlines() if not line.lstrip().startswith(">")).strip()
+
+
+def strip_signature(body: str) -> str:
+    match = SIGNATURE_PATTERN.search(body)
+    if match and match.start() > 0:
+        body = body[:match.start()]
+    return body.strip()
+
+
+def strip_disclaimers(body: str) -> str:
+    paragraphs = re.split(r"\n\s*\n", body)
+    kept = [p for p in paragraphs if not any(marker in p.lower() for marker in DISCLAIMER_MARKERS)]
+    return "\n\n".join(kept).strip()
+
+
+def fit_to_budget(body: str, max_tokens: int) -> Tuple[str, int]:
+    """
+    Shrinks an email body to at most `max_tokens`: first quoted replies, then signatures,
+    then disclaimers are removed, and only then is the remaining text truncated by tokens.
+    Bodies already within budget are returned unchanged.
+
+    Returns:
+        Tuple[str, int]: The fitted body and its token count.
+    """
+    tokens = count_tokens(body)
+    if tokens <= max_tokens:
+        return body, tokens
+
+    for trim in (strip_quoted_text, strip_signature, strip_disclaimers):
+        trimmed = trim(body)
+        if trimmed:
+            body = trimmed
+        tokens = count_tokens(body)
+        if tokens <= max_tokens:
+            return body, tokens
+
+    body = truncate_to_tokens(body, max_tokens)
+    return body, count_tokens(body)
+
+
+def budget_body(email: dict, agent: str, body: str = None) -> str:
+    """Returns the email body (or `body`, e.g. the new text of a thread reply) fitted to the agent's token budget (config.AGENT_TOKEN_BUDGETS)."""
+    body = (email.get("body", "") if body is None else body) or ""
+    budget = AGENT_TOKEN_BUDGETS.get(agent)
+    if not budget:
+        return body
+    fitted, tokens = fit_to_budget(body, budget)
+    if len(fitted) < len(body):
+        logger.debug(f"Trimmed body of email ID {email.get('id', 'N/A')} for {agent} to {tokens} tokens (budget {budget}).")
+    return fitted
+
+
+def usage_key(email: dict) -> int:
+    """
+    Process-unique key for an email's token usage, stored on the email under "usage_key" on first
+    use (so copies made later share it). Email ids alone can repeat, e.g. across mailboxes or runs.
+    """
+    key = email.get("usage_key")
+    if key is None:
+        key = email["usage_key"] = next(_usage_keys)
+    return key
+
+
+def _add_usage(email: dict, agent: str, tokens: int) -> None:
+    with _usage_lock:
+        usage = _usage.setdefault(usage_key(email), {})
+        usage[agent] = usage.get(agent, 0) + tokens
+
+
+def record_prompt_tokens(email: dict, agent: str, prompt: str) -> int:
+    """Records how many tokens the agent's prompt for this email contains, for per-email reporting."""
+    tokens = count_tokens(prompt)
+    _add_usage(email, agent, tokens)
+    return tokens
+
+
+def record_batch_prompt_tokens(emails: List[dict], agent: str, prompt: str, items: List[str]) -> int:
+    """
+    Splits the tokens of a prompt shared by several emails across them: each email is charged
+    for its own item (`items`, in the same order) plus an equal share of the shared instructions.
+    """
+    total = count_tokens(prompt)
+    item_tokens = [count_tokens(item) for item in items]
+    shared, remainder = divmod(max(0, total - sum(item_tokens)), max(1, len(emails)))
+    for index, (email, tokens) in enumerate(zip(emails, item_tokens)):
+        _add_usage(email, agent, tokens + shared + (1 if index < remainder else 0))
+    return total
+
+
+def pop_token_usage(email: dict) -> Dict[str, int]:
+    """Returns (and forgets) the prompt token counts recorded for an email, keyed by agent."""
+    with _usage_lock:
+        return _usage.pop(usage_key(email), {})
\ No newline at end of file